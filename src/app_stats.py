@@ -1,10 +1,26 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+import numpy as np
+import hashlib
+import html
 import json
 import os
+import sys
+import threading
+import time
+from collections import Counter
 from datetime import timedelta
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import bulk_load
+import parsed_store
+import rollups
+import search_index
+import sqlite_store
+from data_manager import STORAGE
+from vocab import Vocabulary, KIND_OF_COLUMN
+
 # --- 0. 页面配置与深色 CSS ---
 st.set_page_config(
     page_title= "HappyFruit!",
@@ -64,6 +80,7 @@ st.markdown("""
     }
     .thought-content { font-size: 0.95em; color: #E0E0E0; line-height: 1.5; margin-bottom: 8px; }
     .thought-meta { display: flex; justify-content: space-between; font-size: 0.8em; color: #616161; }
+    .thought-content mark { background: rgba(255, 128, 171, 0.25); color: #FF80AB; padding: 0 1px; }
     
     .tag { padding: 1px 5px; border-radius: 3px; margin-right: 4px; font-size: 0.8em; border: 1px solid transparent;}
     .tag-dom { background: #1A237E; color: #9FA8DA; border-color: #3949AB; }
@@ -74,117 +91,458 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 1. 数据加载 ---
-@st.cache_data
-def load_data():
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    data_path = os.path.join(os.path.dirname(current_dir), "data", "parsed_logs.jsonl")
-    if not os.path.exists(data_path): return pd.DataFrame()
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "data")
+ENTRIES_PATH = os.path.join(DATA_DIR, "parsed_entries.jsonl")  # 规范化格式：每条记录一行
+ROWS_PATH = os.path.join(DATA_DIR, "parsed_logs.jsonl")        # 旧格式：(类别 x 领域) 每个组合一行
+ENTRIES_CHECKPOINT = os.path.splitext(ENTRIES_PATH)[0] + ".checkpoint.json"  # 由 process_logs 写
 
+# 列表型的标签列 (每条记录可能有多个)
+LIST_COLS = ('category', 'domain')
+
+def _parse_lines(blob):
     data = []
-    with open(data_path, "r", encoding="utf-8") as f:
-        for line in f:
-            try: data.append(json.loads(line))
-            except: continue
-    
-    if not data: return pd.DataFrame()
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df['date'] = df['timestamp'].dt.date
-    for c in ['category', 'action', 'domain', 'reference', 'thoughts']:
+    for line in blob.split(b"\n"):
+        try: data.append(json.loads(line))
+        except ValueError: continue  # json.JSONDecodeError：空行、写到一半的行
+    return data
+
+# 用文件开头和已读部分最后一段字节的哈希判断文件是否被改写 (与 process_logs 的断点一致)
+FINGERPRINT_BYTES = 4096
+
+class _JsonlCache:
+    """
+    一个解析结果文件的增量读取状态：上次的 DataFrame、读到的字节位置、文件标识 (设备, inode, 大小, mtime)。
+    - 标识没变：直接返回上次的结果；
+    - 文件只是变长了 (已读部分的首尾指纹不变)：只解析新追加的部分，拼接到后面；
+    - 其它情况 (截断、重写)：全量重新读取。
+    同一份对象被所有会话共享 (st.cache_resource)，用锁保护。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.key = None
+        self.offset = 0
+        self.fingerprint = None
+        self.df = pd.DataFrame()
+        self.vocab = Vocabulary()  # 只读；拼接时沿用同一份，临时编号前后一致
+
+    def _fingerprint(self, f, end):
+        f.seek(0)
+        head = f.read(min(end, FINGERPRINT_BYTES))
+        f.seek(max(0, end - FINGERPRINT_BYTES))
+        return hashlib.sha1(head + f.read(end - max(0, end - FINGERPRINT_BYTES))).hexdigest()
+
+    def load(self):
+        with self.lock:
+            return self._load()
+
+    def _load(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self.reset()
+            return self.df
+        key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if key == self.key:
+            return self.df
+
+        with open(self.path, "rb") as f:
+            grown = (self.key is not None and key[:2] == self.key[:2] and stat.st_size >= self.offset
+                     and self._fingerprint(f, self.offset) == self.fingerprint)
+            if not grown:
+                self.reset()
+            # 只读到最后一个完整的行，写到一半的行留到下次
+            end = _complete_end(f, stat.st_size)
+            if self.offset == 0 and end == stat.st_size:
+                source = self.path  # 整个文件：交给 pyarrow 按块读，不先读进内存
+            else:
+                f.seek(self.offset)
+                source = f.read(max(0, end - self.offset))
+            tail = self._to_frame(source)
+            if tail is None:
+                # 新追加的部分与已有记录衔接不上 (见 _to_frame)，全量重新读取
+                self.reset()
+                return self._load()
+            self.offset = max(self.offset, end)
+            self.fingerprint = self._fingerprint(f, self.offset)
+        self.key = key
+        if not tail.empty:
+            self.df = _append_frame(self.df, tail, self.vocab)
+        return self.df
+
+    def _to_frame(self, source):
+        """新读到的部分 -> 编码好的 DataFrame；衔接不上时返回 None"""
+        rows = self.path == ROWS_PATH
+        df = read_frame(source, self.vocab, rows)
+        if rows and not df.empty and not self.df.empty:
+            # 旧格式一条记录占多行：新行的第一条不晚于已有最后一条时，可能读到了一条记录的中间
+            if df['timestamp'].iloc[0] <= self.df['timestamp'].iloc[-1]:
+                return None
+        return df
+
+def _complete_end(f, size):
+    """文件中最后一个换行符之后的位置"""
+    pos = size
+    while pos > 0:
+        step = min(pos, 64 * 1024)
+        f.seek(pos - step)
+        i = f.read(step).rfind(b"\n")
+        if i >= 0:
+            return pos - step + i + 1
+        pos -= step
+    return 0
+
+def read_frame(source, vocab=None, rows=False, bulk=True):
+    """
+    读取解析结果 (source 为文件路径或 bytes)，返回每条记录一行的 DataFrame，
+    列与 load_data 相同，df.attrs['vocab'] 为编号对应的词表。rows=True 为旧格式。
+    装了 pyarrow 时用 bulk_load 批量读取；没装、或者文件里有坏行时逐行读取。
+    """
+    if vocab is None:
+        vocab = Vocabulary()  # 只读：词表里没有的词只在内存里临时编号，不写回文件
+    df = bulk_load.read_frame(source, vocab, rows) if bulk and bulk_load.is_available() else None
+    if df is None:
+        if not isinstance(source, (bytes, bytearray)):
+            with open(source, "rb") as f:
+                source = f.read()
+        data = _parse_lines(source)
+        if not data: return pd.DataFrame()
+        if rows:
+            df = aggregate_entries(pd.DataFrame(data))
+        else:
+            df = pd.DataFrame(data).rename(columns={'categories': 'category', 'domains': 'domain'})
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        return _finish_frame(_encode_tags(df, vocab))
+    if df.empty: return df
+    df.attrs['vocab'] = _tag_terms(vocab)
+    df['action'] = pd.Categorical.from_codes(df['action'], categories=df.attrs['vocab']['action'])
+    return _finish_frame(df)
+
+def _append_frame(df, tail, vocab):
+    """把新读到的记录拼接到 df 后面"""
+    if df.empty: return tail
+    # action 的类别可能变多了：按编号重建 Categorical
+    terms = _tag_terms(vocab)
+    codes = np.concatenate([df['action'].cat.codes.to_numpy(), tail['action'].cat.codes.to_numpy()])
+    out = pd.concat([df, tail.drop(columns='action')], ignore_index=True)
+    out['action'] = pd.Categorical.from_codes(codes, categories=terms['action'])
+    out.attrs['vocab'] = terms
+    if tail['ts'].iloc[0] < df['ts'].iloc[-1]:
+        out = _sort_frame(out)  # 补录了更早的记录
+    return out
+
+@st.cache_resource
+def _jsonl_cache(path):
+    return _JsonlCache(path)
+
+def _tag_terms(vocab):
+    """列名 -> 词表 (编号即下标)，存进 df.attrs['vocab']，渲染时用来把编号换回字符串"""
+    return {col: list(vocab.terms[kind]) for col, kind in KIND_OF_COLUMN.items()}
+
+def _encode_tags(df, vocab=None):
+    """把字符串标签换成词表编号：category / domain 为编号列表，action 为 Categorical"""
+    if vocab is None:
+        vocab = Vocabulary()  # 只读：词表里没有的词只在内存里临时编号，不写回文件
+    for col in LIST_COLS:
+        kind = KIND_OF_COLUMN[col]
+        df[col] = [vocab.codes(kind, tags or []) for tags in df[col]]
+    actions = [vocab.code('actions', a) for a in df['action']]
+    df.attrs['vocab'] = _tag_terms(vocab)
+    df['action'] = pd.Categorical.from_codes(actions, categories=df.attrs['vocab']['action'])
+    return df
+
+def tag_names(df, col_name, codes):
+    """渲染时把编号换回字符串"""
+    terms = df.attrs['vocab'][col_name]
+    return [terms[c] for c in codes]
+
+def load_data():
+    """
+    返回每条记录一行、按时间排好序的 DataFrame：category / domain 为词表编号列表，action 为 Categorical，
+    ts 为 int64 秒数 (按日期取一段用 slice_range)，其余为字符串；df.attrs['vocab'] 为编号对应的词表。
+    优先读规范化格式；只有旧格式时按时间戳重新聚合。
+    文件只是追加了新内容时只解析新增的部分 (见 _JsonlCache)，返回的 DataFrame 被共享，不要原地修改。
+    HAPPYFRUIT_STORAGE=sqlite 时从数据库读取。
+    """
+    if STORAGE == "sqlite":
+        return _load_sqlite_range(None, None, sqlite_store.version())
+    if os.path.exists(ENTRIES_PATH):
+        return _jsonl_cache(ENTRIES_PATH).load()
+    if os.path.exists(ROWS_PATH):
+        return _jsonl_cache(ROWS_PATH).load()
+    return pd.DataFrame()
+
+def _finish_frame(df):
+    """加上 ts 列 (int64 秒数，本地时间按 UTC 折算，与 parsed_store 一致)，并保证按 ts 排好序"""
+    if 'ts' not in df.columns:
+        df['ts'] = df['timestamp'].to_numpy().astype('datetime64[s]').astype(np.int64)
+    for c in ['reference', 'thoughts', 'raw_content']:
         if c in df.columns: df[c] = df[c].fillna("")
+    return _sort_frame(df)
+
+def _sort_frame(df):
+    ts = df['ts'].to_numpy()
+    if len(ts) > 1 and (ts[1:] < ts[:-1]).any():
+        attrs = df.attrs
+        df = df.iloc[np.argsort(ts, kind='stable')].reset_index(drop=True)
+        df.attrs = attrs
     return df
 
+def slice_range(df, start, end):
+    """
+    df (按 ts 排好序) 中 [start, end] (含首尾两天) 的记录：
+    在 ts 上二分查找首尾位置，返回连续的一段 (iloc 切片，不复制数据)。
+    """
+    if df.empty: return df
+    ts = df['ts'].to_numpy()
+    lo = np.searchsorted(ts, rollups.day_number(start) * rollups.DAY_SECONDS, side='left')
+    hi = np.searchsorted(ts, (rollups.day_number(end) + 1) * rollups.DAY_SECONDS, side='left')
+    return df.iloc[lo:hi]
+
+def frame_bounds(df):
+    """df (按 ts 排好序) 的 (最早日期, 最晚日期)；没有记录时返回 None"""
+    if df.empty: return None
+    ts = df['ts'].to_numpy()
+    return rollups.day_date(ts[0] // rollups.DAY_SECONDS), rollups.day_date(ts[-1] // rollups.DAY_SECONDS)
+
+# 大屏用到的列 (列式存储只读这些)
+STORE_COLUMNS = ['categories', 'domains', 'action', 'thoughts']
+
+@st.cache_data
+def _load_store_range(start, end, store_version):
+    """store_version 只用作缓存键：存储更新后自动失效"""
+    table = parsed_store.read_range(start, end, STORE_COLUMNS)
+    terms = _tag_terms(Vocabulary())
+    ts = table.column('ts').to_numpy()
+    df = pd.DataFrame({
+        'timestamp': pd.to_datetime(ts, unit='s'),
+        'ts': ts,
+        'category': table.column('categories').to_pandas(),
+        'domain': table.column('domains').to_pandas(),
+        'action': pd.Categorical.from_codes(table.column('action').to_numpy(), categories=terms['action']),
+        'thoughts': table.column('thoughts').to_pandas(),
+    })
+    df.attrs['vocab'] = terms
+    return _finish_frame(df)
+
+@st.cache_data
+def _load_sqlite_range(start, end, db_version):
+    """只查询日期范围内的记录 (走 ts 索引)；db_version 只用作缓存键"""
+    rows, tags = sqlite_store.read_range(start, end)
+    if not rows: return pd.DataFrame()
+    df = pd.DataFrame(rows, columns=['entry_id', 'timestamp', 'action', 'reference', 'thoughts', 'raw_content'])
+    for col in LIST_COLS:
+        df[col] = [tags.get(i, {}).get(col, []) for i in df['entry_id']]
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return _finish_frame(_encode_tags(df.drop(columns='entry_id')))
+
+def get_date_bounds():
+    """返回 (最早日期, 最晚日期)；没有数据时返回 None"""
+    if STORAGE == "sqlite":
+        return sqlite_store.date_bounds()
+    if _store_in_sync():
+        return parsed_store.date_bounds()
+    return frame_bounds(load_data())
+
+def load_range(start, end):
+    """
+    读取 [start, end] 的记录。
+    SQLite 存储时在 SQL 里按日期过滤；有同步的列式存储时只读取重叠的月份分区和需要的列；
+    否则在读到的 JSONL 记录上二分查找 (见 slice_range)。
+    """
+    if STORAGE == "sqlite":
+        return _load_sqlite_range(start, end, sqlite_store.version())
+    if _store_in_sync():
+        return _load_store_range(start, end, parsed_store.version())
+    return slice_range(load_data(), start, end)
+
+def data_version():
+    """大屏读取的数据的版本 (数据变了就变)，加上汇总表版本，用作统计结果的缓存键"""
+    if STORAGE == "sqlite":
+        return ('sqlite', sqlite_store.version())
+    if _store_in_sync():
+        return ('store', parsed_store.version(), _rollups_version())
+    for path in (ENTRIES_PATH, ROWS_PATH):
+        if os.path.exists(path):
+            cache = _jsonl_cache(path)
+            cache.load()  # 文件没变时只 stat 一次
+            return ('jsonl', path, cache.key, _rollups_version())
+    return ('empty',)
+
+def _entries_checkpoint():
+    """parsed_entries.jsonl 的解析断点 (由 process_logs 写)；文件不存在或与断点对不上 (正在写) 时返回 None"""
+    try:
+        with open(ENTRIES_CHECKPOINT, "r", encoding="utf-8") as f: state = json.load(f)
+        if os.path.getsize(ENTRIES_PATH) != state['output_size']: return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return state
+
+def _store_in_sync():
+    """
+    列式存储可用并且与 parsed_entries.jsonl 同步。
+    上次 process_logs 没加 --columnar 时存储是旧的，这时大屏改读 JSONL。
+    """
+    if STORAGE == "sqlite" or not parsed_store.is_ready(): return False
+    state = _entries_checkpoint()
+    return state is not None and parsed_store.in_sync(state, Vocabulary())
+
+def _rollups_version():
+    """
+    与大屏读取的数据同步的汇总表版本号；没有汇总表、或者不同步 (比如 process_logs 正在写) 时返回 None。
+    汇总表、列式存储和解析结果的断点由同一次 process_logs 写出，断点一致就说明三者一致。
+    """
+    if STORAGE == "sqlite": return None
+    meta = rollups.load_meta()
+    if not meta or not rollups.is_ready(): return None
+    # 旧格式按时间戳合并记录，与汇总表的计数不一定相同，只认规范化格式的断点
+    state = _entries_checkpoint()
+    return meta['version'] if state and meta.get('sync_state') == state else None
+
+@st.cache_resource
+def _load_rollups(version):
+    """version 只用作缓存键"""
+    return rollups.load()
+
+def cube_from_frame(df):
+    """由读到的记录现算按天计数 (没有汇总表时用)，与 rollups 汇总表的结果相同"""
+    terms = df.attrs['vocab']
+    if df.empty: return rollups.DayCube.empty(terms)
+    days = df['ts'].to_numpy() // rollups.DAY_SECONDS
+    tags = {}
+    for col in rollups.RECORD_KEYS:
+        if col in LIST_COLS:
+            flat = pd.Series(df[col].to_numpy()).explode()
+            flat = flat[flat.notna()]
+            tags[col] = (days[flat.index.to_numpy()], flat.to_numpy(dtype=np.int64))
+        else:
+            codes = df[col].cat.codes.to_numpy().astype(np.int64)
+            keep = codes >= 0
+            tags[col] = (days[keep], codes[keep])
+    return rollups.DayCube.from_arrays(days, tags, terms)
+
+def load_cube(start, end, df):
+    """[start, end] 的按天计数：有同步的汇总表时直接切片，否则由 df 现算"""
+    version = _rollups_version()
+    cube = _load_rollups(version) if version is not None else None
+    if cube is not None: return cube.slice(start, end)
+    return cube_from_frame(df)
+
 # --- 2. 数据处理 ---
 def aggregate_entries(df):
+    """
+    把旧格式 (类别 x 领域 笛卡尔积) 按时间戳聚合回每条记录一行：
+    标签去重、保留出现顺序；其余列取第一个非空字符串。按时间排序。
+    """
     if df.empty: return pd.DataFrame()
-    def agg_set(x): return list(set([i for i in x if i]))
-    def agg_first(x): return next((i for i in x if i), "")
-    return df.groupby('timestamp').agg({
-        'category': agg_set, 'domain': agg_set, 'action': agg_first, 'thoughts': agg_first
-    }).reset_index()
-
-def get_kpi_data(df, df_agg):
-    total = len(df_agg)
-    days = df['date'].nunique()
-    
-    exploded_dom = df_agg.explode('domain')
-    top_dom = "-"
-    if not exploded_dom.empty:
-        v = exploded_dom[exploded_dom['domain']!=""]
-        if not v.empty: top_dom = v['domain'].value_counts().idxmax()
-        
-    all_act = pd.concat([df['category'], df['action']])
-    all_act = all_act[all_act!=""]
-    top_act = all_act.value_counts().idxmax() if not all_act.empty else "-"
+    out = pd.DataFrame(index=pd.Index(np.sort(df['timestamp'].unique()), name='timestamp'))
+    for col in LIST_COLS:
+        tags = df[['timestamp', col]]
+        tags = tags[tags[col].map(lambda t: isinstance(t, str) and t != "")].drop_duplicates()
+        tags = tags.sort_values('timestamp', kind='stable')
+        # 排好序后每个时间戳是连续的一段，按段切开
+        keys = tags['timestamp'].to_numpy()
+        cuts = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        groups = np.split(tags[col].to_numpy(dtype=object), cuts)
+        lists = dict(zip(keys[np.r_[0, cuts]] if len(keys) else [], (g.tolist() for g in groups)))
+        out[col] = [lists.get(t, []) for t in out.index.to_numpy()]
+    for col in ('action', 'thoughts', 'reference', 'raw_content'):
+        values = df[col].where(df[col].map(lambda v: isinstance(v, str) and v != ""))
+        out[col] = values.groupby(df['timestamp']).first().reindex(out.index).fillna("")
+    return out.reset_index()
+
+def get_kpi_data(df, cube=None):
+    """(累计记录, 活跃天数, 最多的领域, 最多的类别或动作)；由按天计数求和得到，cube 不给时由 df 现算"""
+    if cube is None: cube = cube_from_frame(df)
+    total = int(cube.entries.sum())
+    days = int(np.count_nonzero(cube.entries))
+
+    dom_totals = cube.counts['domain'].sum(axis=0)
+    top_dom = cube.terms['domain'][dom_totals.argmax()] if dom_totals.any() else "-"
+
+    # 类别和动作按名字合在一起数
+    acts = Counter()
+    for col in ('category', 'action'):
+        totals = cube.counts[col].sum(axis=0)
+        for code in np.flatnonzero(totals):
+            acts[cube.terms[col][code]] += int(totals[code])
+    top_act = acts.most_common(1)[0][0] if acts else "-"
+    return total, days, top_dom, top_act
+
+def get_kpi_data_sql(start, end):
+    """与 get_kpi_data 相同的指标，计数直接在 SQLite 里用索引完成"""
+    total, days = sqlite_store.count_range(start, end)
+    doms = sqlite_store.tag_counts('domain', start, end)
+    top_dom = doms[0][0] if doms else "-"
+
+    acts = Counter(dict(sqlite_store.tag_counts('category', start, end)))
+    acts.update(dict(sqlite_store.tag_counts('action', start, end)))
+    top_act = acts.most_common(1)[0][0] if acts else "-"
     return total, days, top_dom, top_act
 
 # --- 3. 核心绘图逻辑 ---
 
-def generate_perfect_heatmap(df, col_name, color_scale='Blues'):
-    if df.empty: return None, 0
+# 热力图最多显示几行标签 (其余合并成一行 "其他")，以及发给浏览器的格子数上限
+HEATMAP_TOP_K = 30
+HEATMAP_MAX_CELLS = 3000
 
-    df_clean = df[df[col_name] != ""].copy()
-    if df_clean.empty: return None, 0
+# 设置这个环境变量后，每张图生成时在控制台打印耗时和大小
+RENDER_STATS = bool(os.environ.get("HAPPYFRUIT_RENDER_STATS"))
 
-    # 1. 确定粒度 (使用日历日期计算)
-    min_date = df['timestamp'].dt.date.min()
-    max_date = df['timestamp'].dt.date.max()
-    
-    # 计算日历天数差 (包含首尾)
-    days_span = (max_date - min_date).days + 1
-    
-    if days_span > 196:
-        freq = 'M'
-        date_unit_text = "/每月"
-        full_range = pd.period_range(start=min_date, end=max_date, freq='M')
-        df_clean['period'] = df_clean['timestamp'].dt.to_period('M')
-        start_label = str(full_range[0])
-        end_label = str(full_range[-1])
-    elif days_span > 112:
-        freq = 'W-MON'
-        date_unit_text = "/每周"
-        full_range = pd.period_range(start=min_date, end=max_date, freq='W-MON')
-        df_clean['period'] = df_clean['timestamp'].dt.to_period('W-MON')
-        start_label = str(full_range[0]).split('/')[0]
-        end_label = str(full_range[-1]).split('/')[0]
-    elif days_span > 56:
-        freq = "4D"
-        date_unit_text = "/每四日"
-        df_clean['period'] = df_clean['timestamp'].dt.floor('4D').dt.strftime('%Y-%m-%d')
-        freq_range = pd.date_range(start=min_date, end=max_date, freq='4D')
-        full_range = [d.strftime('%Y-%m-%d') for d in freq_range]
-        start_label = full_range[0]
-        end_label = full_range[-1]
-    elif days_span > 28:
-        freq = "2D"
-        date_unit_text = "/每两日"
-        df_clean['period'] = df_clean['timestamp'].dt.floor('2D').dt.strftime('%Y-%m-%d')
-        # 生成骨架，从最小日期到最大日期的连续时间点，步长为2天
-        freq_range = pd.date_range(start=min_date, end=max_date, freq='2D')
-        # 转成字符串列表 (这是关键，必须和 period 列的格式一致)
-        full_range = [d.strftime('%Y-%m-%d') for d in freq_range]
-        # 3. 确定首尾标签
-        start_label = full_range[0]
-        end_label = full_range[-1]
-    else:
-        freq = 'D'
-        date_unit_text = "/每日"
-        full_range = pd.period_range(start=min_date, end=max_date, freq='D')
-        df_clean['period'] = df_clean['timestamp'].dt.to_period('D')
-        start_label = full_range[0].strftime("%m-%d")
-        end_label = full_range[-1].strftime("%m-%d")
-
-    # 2. 统计
-    counts = df_clean.groupby(['period', col_name]).size().reset_index(name='count')
-    matrix = counts.pivot(index=col_name, columns='period', values='count').fillna(0)
-    matrix = matrix.reindex(columns=full_range, fill_value=0)
-    
-    total_counts = matrix.sum(axis=1).sort_values(ascending=True)
-    matrix = matrix.loc[total_counts.index]
-    
-    z_data = matrix.values
-    y_labels = matrix.index.tolist()
-    nx = len(matrix.columns)
+def heatmap_matrix(cube, col_name, top_k=HEATMAP_TOP_K, max_cells=HEATMAP_MAX_CELLS):
+    """
+    按天计数 -> (矩阵 [标签 x 周期], 标签名, 起始标签, 结束标签, 单位, 合并掉的标签数)；没有标签时返回 None。
+    粒度按日历天数选择，每个周期的计数由按天的计数求和得到。
+    只保留范围内出现过的标签，按总次数从少到多排 (次数相同按名字)，最多的在最上面。
+    标签超过 top_k 行、或者格子数超过 max_cells 时，只保留次数最多的几个 (argpartition 部分排序)，
+    其余合并成最下面的一行 "其他"；top_k / max_cells 为 None 时不限制。
+    """
+    if len(cube) == 0: return None
+    freq = rollups.choose_period(len(cube))
+    keys, counts = cube.by_period(col_name, freq)
+    totals = counts.sum(axis=0)
+    terms = cube.terms[col_name]
+    codes = np.flatnonzero(totals)
+    if len(codes) == 0: return None
+
+    n_rows = len(codes)
+    if top_k is not None: n_rows = min(n_rows, top_k)
+    if max_cells is not None: n_rows = min(n_rows, max(max_cells // len(keys), 2))
+    other = None
+    if n_rows < len(codes):
+        keep = n_rows - 1  # 留一行给 "其他"
+        top = codes[np.argpartition(-totals[codes], keep - 1)[:keep]]
+        rest = np.setdiff1d(codes, top)
+        other = counts[:, rest].sum(axis=1)
+        codes = top
+
+    codes = sorted(codes, key=lambda c: (totals[c], terms[c]))
+    matrix = counts[:, codes].T
+    labels = [terms[c] for c in codes]
+    hidden = 0
+    if other is not None:
+        hidden = len(rest)
+        matrix = np.vstack([other, matrix])
+        labels = [f"其他 {hidden} 个"] + labels
+    start_label = rollups.period_label(keys[0], freq)
+    end_label = rollups.period_label(keys[-1], freq)
+    return matrix, labels, start_label, end_label, rollups.PERIOD_UNITS[freq], hidden
+
+def generate_perfect_heatmap(df, col_name, color_scale='Blues', cube=None,
+                             top_k=HEATMAP_TOP_K, max_cells=HEATMAP_MAX_CELLS):
+    """cube 为 load_cube 的结果，不给时由 df 现算；top_k / max_cells 见 heatmap_matrix"""
+    if df.empty: return None, 0
+    if cube is None: cube = cube_from_frame(df)
+
+    result = heatmap_matrix(cube, col_name, top_k, max_cells)
+    if result is None: return None, 0
+    z_data, y_labels, start_label, end_label, date_unit_text, _ = result
+    nx = z_data.shape[1]
     ny = len(y_labels)
     
     # 3. 尺寸
@@ -270,19 +628,18 @@ def generate_perfect_heatmap(df, col_name, color_scale='Blues'):
     
     return fig, total_height
 
-def generate_vitality_line(df_agg):
-    if df_agg.empty: return None
-    
-    daily = df_agg.groupby(df_agg['timestamp'].dt.date).size().reset_index(name='count')
-    min_d, max_d = daily['timestamp'].min(), daily['timestamp'].max()
+def generate_vitality_line(df, cube=None):
+    """cube 为 load_cube 的结果；不给时由 df 现算"""
+    if df.empty: return None
+    if cube is None: cube = cube_from_frame(df)
+    if len(cube) == 0: return None
+
+    min_d, max_d = cube.first_date(), cube.last_date()
     # plot_min = min_d - timedelta(days=1)
     # plot_max = max_d + timedelta(days=1)
     plot_min, plot_max = min_d, max_d
     
-    idx = pd.date_range(min_d, max_d)
-    daily.set_index('timestamp', inplace=True)
-    daily = daily.reindex(idx, fill_value=0).reset_index()
-    daily.columns = ['date', 'count']
+    daily = pd.DataFrame({'date': pd.date_range(min_d, max_d), 'count': cube.entries})
     
     fig = go.Figure(go.Scatter(
         x=daily['date'], y=daily['count'],
@@ -340,21 +697,170 @@ def generate_vitality_line(df_agg):
     )
     return fig
 
+def figure_stats(name, fig, seconds):
+    """
+    一张图的生成耗时、数据点数，以及发给浏览器的 JSON 大小。
+    序列化一遍和画图本身差不多贵，所以 JSON 大小只在设置了 RENDER_STATS 时才算 (否则为 None)。
+    """
+    stats = {'name': name, 'ms': round(seconds * 1000, 1), 'bytes': None, 'cells': 0}
+    if fig is not None:
+        for trace in fig.data:
+            z = getattr(trace, 'z', None)  # 热力图是 z，折线是 y
+            stats['cells'] += np.size(z if z is not None else trace.y)
+    if RENDER_STATS:
+        stats['bytes'] = len(fig.to_json()) if fig is not None else 0
+        print(f"[render] {name}: {stats['ms']} ms，{stats['bytes'] / 1024:.1f} KB，{stats['cells']} 个数据点")
+    return stats
+
+# --- 4. 统计结果 (每个 数据版本 x 日期范围 只算一次) ---
+
+# 热力图的列 -> 配色
+HEATMAP_COLORS = {'domain': 'Blues', 'action': 'Oranges', 'category': 'Greens'}
+
+# 碎碎念时间轴每页的条数
+TIMELINE_SIZE = 20
+
+class Analysis:
+    """
+    一个日期范围的全部统计结果：记录、按天计数、KPI、三张热力图、每日活力曲线，
+    以及有碎碎念的记录在 df 里的位置 (thought_rows，从新到旧，时间轴按页切片)。
+    构造时一次算完，之后只读；由 get_analysis 缓存，所有会话和每次重新运行共用。
+    """
+
+    def __init__(self, df, cube, start, end, show_all=False):
+        self.df = df
+        self.cube = cube
+        self.render_stats = []
+        if df.empty:
+            self.kpis = (0, 0, "-", "-")
+            self.heatmaps = {col: (None, 0) for col in HEATMAP_COLORS}
+            self.vitality = None
+            self.thought_rows = np.zeros(0, dtype=np.int64)
+            return
+        if STORAGE == "sqlite": self.kpis = get_kpi_data_sql(start, end)
+        else: self.kpis = get_kpi_data(df, cube)
+        # show_all=True 时显示全部标签，不做行数和格子数限制
+        budget = {'top_k': None, 'max_cells': None} if show_all else {}
+        self.heatmaps = {}
+        for col, color in HEATMAP_COLORS.items():
+            t0 = time.perf_counter()
+            self.heatmaps[col] = generate_perfect_heatmap(df, col, color, cube, **budget)
+            self.render_stats.append(figure_stats(col, self.heatmaps[col][0], time.perf_counter() - t0))
+        t0 = time.perf_counter()
+        self.vitality = generate_vitality_line(df, cube)
+        self.render_stats.append(figure_stats('vitality', self.vitality, time.perf_counter() - t0))
+        self.thought_rows = thought_positions(df)
+
+@st.cache_resource(max_entries=16)
+def _analysis(version, start, end, show_all):
+    """version 只用作缓存键 (见 data_version)"""
+    df = load_range(start, end)
+    cube = load_cube(start, end, df) if not df.empty else None
+    return Analysis(df, cube, start, end, show_all)
+
+def get_analysis(start, end, show_all=False):
+    return _analysis(data_version(), start, end, show_all)
+
+# --- 5. 碎碎念时间轴 (按页显示) ---
+
+def thought_positions(df):
+    """有碎碎念的记录在 df 里的位置，从新到旧 (df 已按时间排序)"""
+    has_thoughts = df['thoughts'].fillna('').astype(str).str.strip().str.len().to_numpy() > 0
+    return np.flatnonzero(has_thoughts)[::-1].copy()
+
+def timeline_page(rows, page, size=TIMELINE_SIZE):
+    """第 page 页 (从 0 开始) 的位置，直接切片"""
+    return rows[page * size:(page + 1) * size]
+
+def timeline_sample(rows, seed, size=TIMELINE_SIZE):
+    """按种子随机抽取 size 条 (不重复)，从新到旧排列；同一个种子每次结果相同"""
+    rng = np.random.default_rng(seed)
+    picked = rows[rng.choice(len(rows), min(size, len(rows)), replace=False)]
+    return np.sort(picked)[::-1]
+
+def timeline_html(df, positions):
+    """只取这一页的记录 (只取用到的列)，拼成一段 HTML"""
+    cols = [df[c].array[positions] for c in ('thoughts', 'timestamp', 'category', 'domain')]
+    cards = []
+    for thoughts, ts, cats, doms in zip(*cols):
+        tags = "".join(f'<span class="tag tag-cat">#{html.escape(c)}</span>' for c in tag_names(df, 'category', cats))
+        tags += "".join(f'<span class="tag tag-dom">@{html.escape(d)}</span>' for d in tag_names(df, 'domain', doms))
+        cards.append(f'<div class="thought-card"><div class="thought-content">{html.escape(str(thoughts))}</div>'
+                     f'<div class="thought-meta"><div>{tags}</div><div>{ts.strftime("%m-%d %H:%M")}</div></div></div>')
+    return "".join(cards)
+
+def render_timeline(analysis):
+    """最新 (翻页) 或随机 (换一批) 显示碎碎念，每次只渲染一页"""
+    rows = analysis.thought_rows
+    if len(rows) == 0:
+        st.caption("这段时间还没有碎碎念。")
+        return
+    mode = st.radio("顺序", ["最新", "随机"], horizontal=True, label_visibility="collapsed", key="timeline_mode")
+    if mode == "随机":
+        if 'timeline_seed' not in st.session_state:
+            st.session_state.timeline_seed = int(np.random.default_rng().integers(2**31))
+        if st.button("🎲 换一批", key="timeline_shuffle"):
+            st.session_state.timeline_seed += 1
+        positions = timeline_sample(rows, st.session_state.timeline_seed)
+        st.caption(f"从 {len(rows)} 条碎碎念里随机抽取 {len(positions)} 条")
+    else:
+        pages = (len(rows) + TIMELINE_SIZE - 1) // TIMELINE_SIZE
+        page = 1
+        if pages > 1:
+            # 换了日期范围后页数可能变少
+            if st.session_state.get('timeline_page', 1) > pages:
+                st.session_state.timeline_page = pages
+            page = st.number_input("页码", min_value=1, max_value=pages, step=1, key="timeline_page")
+        positions = timeline_page(rows, page - 1)
+        st.caption(f"共 {len(rows)} 条碎碎念，第 {page} / {pages} 页")
+    st.markdown(timeline_html(analysis.df, positions), unsafe_allow_html=True)
+
+# --- 6. 全文搜索 ---
+
+@st.cache_data(max_entries=64)
+def _search(query, index_version):
+    """index_version 只用作缓存键"""
+    return search_index.search(query)
+
+def render_search_results(query):
+    """搜索 raw_content 和 thoughts (候选很多时只看最新的一部分，见 search_index.search)，结果拼成一段 HTML 一次输出"""
+    meta = search_index.load_meta()
+    if not meta or meta.get('format') != search_index.INDEX_FORMAT:
+        st.caption("还没有搜索索引，请运行 `python src/process_logs.py --search` (view_stats.bat 会自动运行)。")
+        return
+    start = time.perf_counter()
+    results, total, unverified = _search(query, meta.get('version'))
+    elapsed = (time.perf_counter() - start) * 1000
+    st.caption(f"找到 {search_index.describe_total(total, unverified)} ({elapsed:.0f} ms)")
+    cards = []
+    for r in results:
+        content = search_index.highlight(r['raw_content'].strip(), query).replace("\n", "<br>")
+        cards.append(f'<div class="thought-card"><div class="thought-content">{content}</div>'
+                     f'<div class="thought-meta"><div></div><div>{r["ts"][:16]}</div></div></div>')
+    if cards:
+        st.markdown("".join(cards), unsafe_allow_html=True)
+
 # --- 主程序 ---
 def main():
     if 'focus_time' not in st.session_state: st.session_state.focus_time = None
-    df_raw = load_data()
+    bounds = get_date_bounds()
     
     c1, c2 = st.columns([2, 1])
     with c1: st.title("🍒 YourHappyFruit!")
     with c2:
-        if not df_raw.empty:
+        if bounds:
             st.markdown("###### 📅 选择时间范围", unsafe_allow_html=True)
-            min_d, max_d = df_raw['date'].min(), df_raw['date'].max()
+            min_d, max_d = bounds
             def_start = max(min_d, max_d - timedelta(days=30))
             dates = st.date_input("📅", (def_start, max_d), label_visibility="collapsed")
-            if len(dates)==2: df = df_raw[(df_raw['date']>=dates[0])&(df_raw['date']<=dates[1])] #如果 dates 有选择，按照选择过滤数据
-            else: df = df_raw
+            if len(dates)==2: start, end = dates #如果 dates 有选择，只读取所选范围
+            else: start, end = min_d, max_d
+            show_all = st.checkbox("热力图显示全部标签", value=False,
+                                   help=f"默认每张热力图最多 {HEATMAP_TOP_K} 行，其余合并为“其他”")
+            analysis = get_analysis(start, end, show_all)
+            if STORAGE != "sqlite" and parsed_store.is_ready() and not _store_in_sync():
+                st.caption("⚠️ 列式存储与解析结果不同步 (上次解析没有加 --columnar)，暂时直接读取 parsed_entries.jsonl")
+            df = analysis.df
         else:
             df = pd.DataFrame()
 
@@ -362,26 +868,19 @@ def main():
     main_col, side_col = st.columns([3, 1], gap="large")
 
     with side_col:
+        query = st.text_input("🔍 搜索", placeholder="🔍 搜索记录和碎碎念 (多个词用空格分开)",
+                              label_visibility="collapsed",
+                              help=f"按相关程度排序；匹配的记录很多时，只在最新的 {search_index.VERIFY_LIMIT:,} 条候选里查找、排序")
+        if query.strip():
+            st.markdown('<div class="chart-title">🔍 搜索结果</div>', unsafe_allow_html=True)
+            render_search_results(query)
         st.markdown('<div class="chart-title">📝 碎碎念时间轴</div>', unsafe_allow_html=True)
         if not df.empty:
-            df_agg = aggregate_entries(df)
-            timeline = df_agg.sort_values('timestamp', ascending=False).head(20)
-            for _, row in timeline.iterrows():
-                content = row['thoughts'] if row['thoughts'] else "*(无内容)*"
-                ts = row['timestamp'].strftime("%m-%d %H:%M")
-                tags = ""
-                for c in row['category']: tags += f'<span class="tag tag-cat">#{c}</span>'
-                for d in row['domain']: tags += f'<span class="tag tag-dom">@{d}</span>'
-                st.markdown(f"""
-                <div class="thought-card">
-                    <div class="thought-content">{content}</div>
-                    <div class="thought-meta"><div>{tags}</div><div>{ts}</div></div>
-                </div>""", unsafe_allow_html=True)
+            render_timeline(analysis)
 
     with main_col:
         if not df.empty:
-            df_agg_full = aggregate_entries(df)
-            total, days, top_d, top_act = get_kpi_data(df, df_agg_full)
+            total, days, top_d, top_act = analysis.kpis
             
             st.markdown(f"""
             <div class="kpi-container">
@@ -392,23 +891,23 @@ def main():
             </div>
             """, unsafe_allow_html=True)
             
-            fig_dom, h_dom = generate_perfect_heatmap(df, 'domain', 'Blues')
+            fig_dom, h_dom = analysis.heatmaps['domain']
             if fig_dom: 
                 st.markdown("#### 🌌 最近关注领域", unsafe_allow_html=True)
                 # st.plotly_chart(fig_dom, width='stretch', height=h_dom)
                 st.plotly_chart(fig_dom, width='stretch', height=h_dom, theme=None)
 
-            fig_act, h_act = generate_perfect_heatmap(df, 'action', 'Oranges')
+            fig_act, h_act = analysis.heatmaps['action']
             if fig_act: 
                 st.markdown('#### 🔨 最近活动', unsafe_allow_html=True)
                 st.plotly_chart(fig_act, width='stretch', height=h_act)
 
-            fig_cat, h_cat = generate_perfect_heatmap(df, 'category', 'Greens')
+            fig_cat, h_cat = analysis.heatmaps['category']
             if fig_cat: 
                 st.markdown('#### 🌳 最近忙于', unsafe_allow_html=True)
                 st.plotly_chart(fig_cat, width='stretch', height=h_cat)
 
-            fig_line = generate_vitality_line(df_agg_full)
+            fig_line = analysis.vitality
             if fig_line: 
                 st.markdown('#### 📈 每日活力', unsafe_allow_html=True)
                 st.plotly_chart(fig_line, width='stretch')
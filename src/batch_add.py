@@ -1,9 +1,11 @@
-import json
 import os
 import random
 import datetime
 import time
 
+from data_manager import LogWriter, DURABILITY_BATCH, ERROR_LOG, FAILED, SKIPPED, WRITTEN
+from dedup import DEDUP_WINDOW, to_epoch
+
 # --- 这里是你的工作区，请在这里填写要补录的内容 ---
 # 格式: ( "YYYY-MM-DD HH:MM", "YYYY-MM-DD HH:MM", "日志内容" )
 # 脚本会自动在 Start 和 End 之间生成一个随机时间
@@ -32,8 +34,8 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "data")
 LOG_FILE = os.path.join(DATA_DIR, "daily_log.jsonl")
 
-def random_timestamp(start_str, end_str):
-    """在两个时间字符串范围内生成随机时间戳"""
+def parse_time_range(start_str, end_str):
+    """把两个时间字符串解析成 (start_dt, end_dt)"""
     fmt = "%Y-%m-%d %H:%M"
     try:
         start_dt = datetime.datetime.strptime(start_str, fmt)
@@ -44,6 +46,16 @@ def random_timestamp(start_str, end_str):
         start_dt = datetime.datetime.strptime(start_str, fmt_date)
         # 如果只写日期，结束时间默认是当天的最后一秒
         end_dt = datetime.datetime.strptime(end_str, fmt_date) + datetime.timedelta(days=1) - datetime.timedelta(seconds=1)
+    return start_dt, end_dt
+
+def dedup_window(start_str, end_str):
+    """去重用的时间范围 (秒数)：同一范围内已经补录过同样内容就跳过，重复运行脚本不会重复添加"""
+    start_dt, end_dt = parse_time_range(start_str, end_str)
+    return tuple(to_epoch(dt.strftime("%Y-%m-%d %H:%M:%S")) for dt in (start_dt, end_dt))
+
+def random_timestamp(start_str, end_str):
+    """在两个时间字符串范围内生成随机时间戳"""
+    start_dt, end_dt = parse_time_range(start_str, end_str)
 
     # 计算总秒数差
     delta = end_dt - start_dt
@@ -70,8 +82,16 @@ def run_batch_add():
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
+    # 后台线程成批写入，整批只 fsync 一次；开启去重，是否因为重复被跳过要等写完才知道
+    writer = LogWriter(LOG_FILE, durability=DURABILITY_BATCH, dedup_window=DEDUP_WINDOW)
+    queued = []
+    results = {}  # id(entry) -> 写入结果 (后台线程回调)
+
+    def on_result(entry, result):
+        results[id(entry)] = result
+    try:
         for start_t, end_t, contents in ENTRIES_TO_ADD:
+            window = dedup_window(start_t, end_t)
             for content in contents:
                 # 生成随机时间
                 final_ts = random_timestamp(start_t, end_t)
@@ -83,11 +103,30 @@ def run_batch_add():
                 }
                 
                 # 写入
-                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-                print(f"[新增] {final_ts} | {content[:30]}...")
-                success_count += 1
+                writer.append(entry, window, on_result)
+                queued.append(entry)
+    finally:
+        # 等队列里的记录全部落盘
+        writer.close()
+
+    skipped_count = failed_count = 0
+    for entry in queued:
+        result = results.get(id(entry), FAILED)
+        if result == WRITTEN:
+            print(f"[新增] {entry['timestamp']} | {entry['raw_content'][:30]}...")
+            success_count += 1
+        elif result == SKIPPED:
+            print(f"[跳过] {entry['timestamp']} | {entry['raw_content'][:30]}...")
+            skipped_count += 1
+        else:
+            print(f"[失败] {entry['timestamp']} | {entry['raw_content'][:30]}...")
+            failed_count += 1
 
     print("-" * 30)
+    if skipped_count:
+        print(f"其中 {skipped_count} 条在同一时间范围内已经补录过，已跳过。")
+    if failed_count:
+        print(f"有 {failed_count} 条写入失败，原文已保存在 {ERROR_LOG}，请检查后重新补录。")
     print(f"成功补录 {success_count} 条记录！")
 
 if __name__ == "__main__":
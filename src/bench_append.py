@@ -0,0 +1,102 @@
+"""
+多进程并发追加的基准测试。
+
+    python src/bench_append.py --procs 1 2 4 8 --records 2000
+
+每一轮启动若干个进程，同时用 LogWriter 往同一个临时 daily_log.jsonl 追加记录，
+报告耗时和吞吐，并检查：每一行都是完整的 JSON、条数正确、序号 seq 没有重复且按文件顺序递增。
+加 --naive 对比不加锁、每条记录单独 open/write 的旧写法。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+import data_manager
+from data_manager import LogWriter, make_record
+from dedup import DEDUP_WINDOW
+
+# 单条记录的正文长度：长一点更容易暴露交错写入
+TEXT = "## 工作\n### 写代码\n@ 和计算机打交道\n“" + "并发追加测试，" * 40 + "”"
+
+
+def _append_worker(path, proc_id, n_records, durability, naive, dedup_window, start_event):
+    start_event.wait()
+    if naive:
+        for i in range(n_records):
+            record = make_record(f"{TEXT} #{proc_id}-{i}")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return
+    writer = LogWriter(path, durability=durability, dedup_window=dedup_window)
+    for i in range(n_records):
+        writer.append(make_record(f"{TEXT} #{proc_id}-{i}"))
+    writer.close()
+
+
+def check_log(path, expected):
+    """返回 (问题列表)；没有问题时为空"""
+    problems = []
+    seqs = []
+    n = 0
+    with open(path, "rb") as f:
+        for line in f:
+            n += 1
+            try:
+                seqs.append(json.loads(line).get("seq"))
+            except (ValueError, UnicodeDecodeError):
+                problems.append(f"第 {n} 行不是完整的 JSON")
+    if n != expected:
+        problems.append(f"行数 {n}，应为 {expected}")
+    if seqs and None not in seqs:
+        if len(set(seqs)) != len(seqs):
+            problems.append("序号有重复")
+        if any(b <= a for a, b in zip(seqs, seqs[1:])):
+            problems.append("序号没有按文件顺序递增")
+    return problems
+
+
+def run_round(n_procs, n_records, durability, naive, dedup_window=DEDUP_WINDOW):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "daily_log.jsonl")
+        start_event = multiprocessing.Event()
+        procs = [multiprocessing.Process(target=_append_worker,
+                                         args=(path, p, n_records, durability, naive, dedup_window, start_event))
+                 for p in range(n_procs)]
+        for p in procs:
+            p.start()
+        start = time.perf_counter()
+        start_event.set()
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+        return elapsed, check_log(path, n_procs * n_records)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="多进程并发追加 daily_log.jsonl 的基准测试")
+    arg_parser.add_argument("--procs", type=int, nargs="+", default=[1, 2, 4, 8], help="依次测试的进程数")
+    arg_parser.add_argument("--records", type=int, default=2000, help="每个进程追加的记录数")
+    arg_parser.add_argument("--durability", choices=data_manager.DURABILITY_MODES,
+                            default=data_manager.DURABILITY_BATCH)
+    arg_parser.add_argument("--naive", action="store_true", help="同时测试不加锁的旧写法")
+    arg_parser.add_argument("--no-dedup", action="store_true", help="关闭写入时的去重检查")
+    args = arg_parser.parse_args()
+
+    modes = [("LogWriter", False)] + ([("无锁直写", True)] if args.naive else [])
+    print(f"每进程 {args.records} 条，每条约 {len(TEXT)} 字，落盘策略: {args.durability}，"
+          f"去重: {'关' if args.no_dedup else '开'}")
+    print(f"{'写法':<10} {'进程':>4} {'耗时(s)':>8} {'条/秒':>10}  检查")
+    for name, naive in modes:
+        for n_procs in args.procs:
+            elapsed, problems = run_round(n_procs, args.records, args.durability, naive,
+                                          None if args.no_dedup else DEDUP_WINDOW)
+            total = n_procs * args.records
+            result = "通过" if not problems else "；".join(problems[:3])
+            print(f"{name:<10} {n_procs:>4} {elapsed:>8.2f} {total / elapsed:>10,.0f}  {result}")
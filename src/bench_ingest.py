@@ -0,0 +1,169 @@
+"""
+写入服务 (ingest_server) 的压测客户端。
+
+    python src/bench_ingest.py                                   # 自动在临时目录启动服务，Unix socket
+    python src/bench_ingest.py --transport http --conns 8 --batch 200 --total 200000
+    python src/bench_ingest.py --no-spawn --transport http --port 8765   # 压已经在运行的服务 (会写进真实数据!)
+
+每个连接循环发送一批记录并等待回复，报告客户端看到的吞吐和每批延迟；
+自己启动服务时，结束后等服务写完、退出，再用 bench_append.check_log 检查写出的文件
+(条数、每行完整、序号递增)。
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from bench_append import check_log
+from ingest_server import HOST, HTTP_PORT, SOCKET_PATH
+
+SERVER_SCRIPT = os.path.join(CURRENT_DIR, "ingest_server.py")
+
+
+def make_batch(conn_id, start, size):
+    # 内容各不相同，不会被去重跳过
+    return [f"## 工作\n### 压测\n@ 写入服务\n“第 {conn_id}-{i} 条”" for i in range(start, start + size)]
+
+
+async def _request_unix(reader, writer, payload):
+    writer.write(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+    return json.loads(await reader.readuntil(b"\n"))
+
+
+async def _request_http(reader, writer, payload, method="POST", path="/entries"):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {HOST}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.decode("latin-1").split("\r\n"):
+        if line.lower().startswith("content-length:"):
+            length = int(line.split(":", 1)[1])
+    return json.loads(await reader.readexactly(length))
+
+
+async def _open(transport, port, socket_path):
+    limit = 16 * 1024 * 1024
+    if transport == "unix":
+        return await asyncio.open_unix_connection(socket_path, limit=limit)
+    return await asyncio.open_connection(HOST, port, limit=limit)
+
+
+async def _client(conn_id, n_records, batch, transport, port, socket_path, latencies):
+    reader, writer = await _open(transport, port, socket_path)
+    request = _request_unix if transport == "unix" else _request_http
+    sent = 0
+    while sent < n_records:
+        size = min(batch, n_records - sent)
+        t0 = time.perf_counter()
+        reply = await request(reader, writer, make_batch(conn_id, sent, size))
+        latencies.append(time.perf_counter() - t0)
+        if reply.get("accepted") != size:
+            raise RuntimeError(f"服务拒绝了部分记录: {reply}")
+        sent += size
+    writer.close()
+
+
+async def fetch_stats(transport, port, socket_path):
+    reader, writer = await _open(transport, port, socket_path)
+    if transport == "unix":
+        stats = await _request_unix(reader, writer, {"cmd": "stats"})
+    else:
+        stats = await _request_http(reader, writer, None, "GET", "/stats")
+    writer.close()
+    return stats
+
+
+async def run_load(total, conns, batch, transport, port, socket_path):
+    latencies = []
+    per_conn = [total // conns + (1 if i < total % conns else 0) for i in range(conns)]
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(i, n, batch, transport, port, socket_path, latencies)
+                           for i, n in enumerate(per_conn)))
+    elapsed = time.perf_counter() - start
+
+    # 等服务把队列写完
+    while True:
+        stats = await fetch_stats(transport, port, socket_path)
+        if stats["queue_depth"] == 0:
+            break
+        await asyncio.sleep(0.05)
+    return elapsed, time.perf_counter() - start, sorted(latencies), stats
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(transport, port, socket_path, proc, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("服务启动失败")
+        try:
+            if transport == "unix":
+                with socket.socket(socket.AF_UNIX) as s:
+                    s.connect(socket_path)
+            else:
+                socket.create_connection((HOST, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("等待服务启动超时")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="ingest_server 压测")
+    arg_parser.add_argument("--transport", choices=("unix", "http"),
+                            default="unix" if hasattr(socket, "AF_UNIX") else "http")
+    arg_parser.add_argument("--total", type=int, default=100_000, help="总记录数")
+    arg_parser.add_argument("--conns", type=int, default=4, help="并发连接数")
+    arg_parser.add_argument("--batch", type=int, default=500, help="每次请求的记录数")
+    arg_parser.add_argument("--durability", default="batch", help="自己启动服务时的落盘策略")
+    arg_parser.add_argument("--no-spawn", action="store_true", help="不启动服务，压测已经在运行的服务")
+    arg_parser.add_argument("--port", type=int, default=HTTP_PORT)
+    arg_parser.add_argument("--socket", default=SOCKET_PATH)
+    args = arg_parser.parse_args()
+
+    tmp = None
+    proc = None
+    port, socket_path = args.port, args.socket
+    if not args.no_spawn:
+        tmp = tempfile.TemporaryDirectory()
+        log_file = os.path.join(tmp.name, "daily_log.jsonl")
+        port, socket_path = _free_port(), os.path.join(tmp.name, "ingest.sock")
+        proc = subprocess.Popen([sys.executable, SERVER_SCRIPT, "--port", str(port), "--socket", socket_path,
+                                 "--log-file", log_file, "--durability", args.durability],
+                                stdout=subprocess.DEVNULL)
+        _wait_ready(args.transport, port, socket_path, proc)
+
+    try:
+        sent_time, total_time, latencies, stats = asyncio.run(
+            run_load(args.total, args.conns, args.batch, args.transport, port, socket_path))
+    finally:
+        if proc is not None:
+            proc.terminate()  # 服务收到 SIGTERM 后写完剩余记录再退出
+            proc.wait()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"{args.transport}，{args.conns} 个连接，每批 {args.batch} 条，共 {args.total:,} 条")
+    print(f"发送完成 {sent_time:.2f} s ({args.total / sent_time:,.0f} 条/秒)，"
+          f"写完 {total_time:.2f} s ({args.total / total_time:,.0f} 条/秒)")
+    print(f"每批延迟 p50 {pct(0.5):.1f} ms，p99 {pct(0.99):.1f} ms，最大 {latencies[-1] * 1000:.1f} ms")
+    print(f"服务统计: {stats}")
+    if tmp is not None:
+        problems = check_log(log_file, args.total)
+        print("检查: " + ("通过" if not problems else "；".join(problems[:3])))
+        tmp.cleanup()
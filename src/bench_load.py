@@ -0,0 +1,149 @@
+"""
+统计大屏读取解析结果的基准测试：原来的读取方式、逐行 json.loads 和 bulk_load 批量读取对比。
+
+    python src/bench_load.py --rows 1000000
+    python src/bench_load.py --rows 1000000 --format rows     # 旧格式 parsed_logs.jsonl
+
+在临时目录生成一份合成的解析结果，每种读取方式在单独的子进程里运行一次，
+报告耗时和进程峰值内存 (Windows 上没有 resource 模块，不报告内存)。
+
+    原始  改动之前 app_stats.load_data 的写法 (见 legacy_load)，作为基线
+    逐行  app_stats.read_frame(bulk=False)：没装 pyarrow 时的退路
+    批量  app_stats.read_frame(bulk=True)：pyarrow 批量读取
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from gen_synthetic import ACTIONS, CATEGORIES, DOMAINS
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 读取方式 -> read_frame 的 bulk 参数 (None 为原来的写法)
+LOADERS = {"原始": None, "逐行": False, "批量": True}
+
+
+def make_parsed_file(path, n, fmt="normalized", seed=0):
+    """生成 n 条记录的解析结果 (rows 格式每条记录按 类别 x 领域 展开成多行)"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            cats = rng.sample(CATEGORIES, rng.randint(1, 2))
+            doms = rng.sample(DOMAINS, rng.randint(0, 3))
+            record = {
+                "timestamp": (start + timedelta(seconds=i * 61)).strftime("%Y-%m-%d %H:%M:%S"),
+                "raw_content": f"## {' '.join(cats)}\n“第 {i} 条碎碎念”",
+                "action": rng.choice(ACTIONS) if rng.random() < 0.8 else None,
+                "reference": f"参考材料{i % 100}" if rng.random() < 0.2 else None,
+                "thoughts": f"第 {i} 条碎碎念，今天也很开心" if rng.random() < 0.5 else None,
+            }
+            if fmt == "normalized":
+                f.write(json.dumps({**record, "categories": cats, "domains": doms}, ensure_ascii=False) + "\n")
+            else:
+                for cat in cats:
+                    for dom in doms or [None]:
+                        f.write(json.dumps({**record, "category": cat, "domain": dom}, ensure_ascii=False) + "\n")
+
+
+def legacy_load(path, rows=False):
+    """
+    改动之前 app_stats.load_data 的写法：逐行 json.loads、pd.DataFrame(list_of_dicts)、
+    不指定格式的 pd.to_datetime、逐列 fillna；旧格式再用当时的 aggregate_entries 按时间戳聚合，
+    得到与 read_frame 一样每条记录一行的结果。
+    """
+    import pandas as pd
+
+    data = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try: data.append(json.loads(line))
+            except ValueError: continue
+
+    if not data: return pd.DataFrame()
+    df = pd.DataFrame(data)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df['date'] = df['timestamp'].dt.date
+    for c in ['category', 'action', 'domain', 'reference', 'thoughts']:
+        if c in df.columns: df[c] = df[c].fillna("")
+    if not rows:
+        return df
+
+    def agg_set(x): return list(set([i for i in x if i]))
+    def agg_first(x): return next((i for i in x if i), "")
+    return df.groupby('timestamp').agg({
+        'category': agg_set, 'domain': agg_set, 'action': agg_first, 'thoughts': agg_first
+    }).reset_index()
+
+
+def _peak_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是字节
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def _run_child(path, fmt, bulk):
+    """子进程：读取一次，输出 JSON 结果"""
+    if bulk is None:
+        import pandas  # 导入不计时，与另外两种方式一致
+        read = lambda: legacy_load(path, rows=(fmt == "rows"))
+    else:
+        import logging
+        logging.disable(logging.WARNING)  # 不在 streamlit 里运行时的提示
+        import app_stats
+        read = lambda: app_stats.read_frame(path, rows=(fmt == "rows"), bulk=bulk)
+
+    base = _peak_mb()
+    start = time.perf_counter()
+    df = read()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"records": len(df), "seconds": elapsed, "base_mb": base, "peak_mb": _peak_mb()}))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="对比原来的读取方式、逐行读取与批量读取解析结果的耗时和内存")
+    arg_parser.add_argument("--rows", type=int, default=1_000_000, help="记录条数")
+    arg_parser.add_argument("--format", choices=("normalized", "rows"), default="normalized")
+    arg_parser.add_argument("--child", nargs=2, metavar=("PATH", "LOADER"), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.child:
+        _run_child(args.child[0], args.format, LOADERS[args.child[1]])
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "parsed.jsonl")
+        print(f"生成 {args.rows:,} 条记录 ({args.format})...")
+        make_parsed_file(path, args.rows, args.format)
+        print(f"文件大小: {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+        print(f"{'读取方式':<6} {'记录数':>10} {'耗时(s)':>8} {'峰值内存(MB)':>12} {'导入后(MB)':>10}")
+        results = {}
+        for name in LOADERS:
+            out = subprocess.run([sys.executable, __file__, "--format", args.format, "--child", path, name],
+                                 capture_output=True, text=True, check=True)
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            results[name] = r
+            mem = lambda v: f"{v:.0f}" if v is not None else "-"
+            print(f"{name:<6} {r['records']:>10,} {r['seconds']:>8.2f} {mem(r['peak_mb']):>12} {mem(r['base_mb']):>10}")
+
+        fast = results["批量"]
+        for name in ("原始", "逐行"):
+            r = results[name]
+            if r["records"] != fast["records"]:
+                print(f"警告：{name}读取与批量读取读到的记录数不同 ({r['records']} / {fast['records']})")
+            print(f"批量读取比{name}读取快 {r['seconds'] / fast['seconds']:.1f} 倍")
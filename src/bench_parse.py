@@ -0,0 +1,114 @@
+"""
+解析性能基准测试。
+
+    python src/bench_parse.py scaling --lines 2000000 --workers 1 2 4 8
+
+会在临时目录生成一份合成的 daily_log.jsonl (见 gen_synthetic)，然后分别用不同进程数全量解析，
+报告耗时、吞吐和相对串行的加速比，并校验输出与串行结果逐字节一致。
+
+    python src/bench_parse.py tokenizer --entries 100000
+
+对比 LogParser.scan (单遍扫描) 与旧的五个正则的耗时。
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+import process_logs
+from gen_synthetic import SyntheticLog, make_synthetic_log
+from parser import LogParser
+
+
+def _file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def run_scaling(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "daily_log.jsonl")
+        print(f"生成 {args.lines} 行合成日志...")
+        make_synthetic_log(input_file, args.lines)
+        size_mb = os.path.getsize(input_file) / 1024 / 1024
+        print(f"文件大小: {size_mb:.1f} MB, chunk: {args.chunk_size} MB")
+
+        baseline_time = None
+        baseline_hash = None
+        print(f"{'workers':>8} {'耗时(s)':>10} {'行/秒':>12} {'加速比':>8}  输出一致")
+        for workers in args.workers:
+            output_file = os.path.join(tmp, f"parsed_{workers}.jsonl")
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                process_logs.process_all_logs(
+                    incremental=False, workers=workers,
+                    chunk_size=int(args.chunk_size * 1024 * 1024),
+                    input_file=input_file, output_file=output_file)
+            elapsed = time.perf_counter() - start
+
+            digest = _file_hash(output_file)
+            if baseline_time is None:
+                baseline_time, baseline_hash = elapsed, digest
+            same = "是" if digest == baseline_hash else "否"
+            print(f"{workers:>8} {elapsed:>10.2f} {args.lines / elapsed:>12,.0f} "
+                  f"{baseline_time / elapsed:>8.2f}  {same}")
+            os.remove(output_file)
+
+
+LONG_THOUGHT = ("尝试制作我的 Happy Fruit 工具。\n"
+                "如果大模型写代码反复出错，就去自己阅读、找相应包的使用文档，而不是坚持和大模型聊天。\n"
+                "我才是项目经理和负责人，大模型只是我手底下一个提建议的。\n")
+
+
+def run_tokenizer(args):
+    log = SyntheticLog(seed=0)
+    workloads = {
+        "短记录": [log.text().strip() for _ in range(args.entries)],
+        "长碎碎念": [f"{log.text()}\n“{LONG_THOUGHT * 4}”".strip() for _ in range(args.entries)],
+    }
+    parser = LogParser()
+
+    for workload, texts in workloads.items():
+        print(f"[{workload}] 平均 {sum(map(len, texts)) / len(texts):.0f} 字")
+        results = {}
+        for name, fn in [("regex x5", parser._scan_regex), ("scan", parser.scan)]:
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                out = [fn(t) for t in texts]
+                best = min(best, time.perf_counter() - start)
+            results[name] = out
+            print(f"{name:>10}: {best * 1e6 / len(texts):6.2f} us/条  ({best:.3f}s / {len(texts)} 条)")
+
+        same = results["scan"] == results["regex x5"]
+        print(f"结果一致: {'是' if same else '否'}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="HappyFruit 解析性能基准测试")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+
+    p_scaling = sub.add_parser("scaling", help="多进程解析的扩展性")
+    p_scaling.add_argument("--lines", type=int, default=2_000_000)
+    p_scaling.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                           help="依次测试的进程数，第一个作为基准")
+    p_scaling.add_argument("--chunk-size", type=float, default=8, help="单位 MB")
+    p_scaling.set_defaults(func=run_scaling)
+
+    p_tok = sub.add_parser("tokenizer", help="单遍扫描 vs 五个正则")
+    p_tok.add_argument("--entries", type=int, default=100_000)
+    p_tok.add_argument("--repeat", type=int, default=3, help="重复次数，取最快一次")
+    p_tok.set_defaults(func=run_tokenizer)
+
+    args = arg_parser.parse_args()
+    args.func(args)
@@ -0,0 +1,265 @@
+"""
+端到端基准测试：在合成的原始日志 (见 gen_synthetic) 上测量各个环节的耗时和峰值内存，
+结果可以存成 JSON 基线，以后的运行与它对比。
+
+    python src/bench_suite.py                                        # 10k / 100k / 1M / 10M 条
+    python src/bench_suite.py --sizes 10000 100000 --save bench_baseline.json
+    python src/bench_suite.py --sizes 10000 100000 --compare bench_baseline.json
+
+环节：
+    parse              LogParser.parse 逐条解析 (不含读文件和 json.loads)
+    process_logs       process_all_logs 全量解析成规范化格式 (parsed_entries.jsonl)
+    process_logs_rows  process_all_logs 全量解析成旧格式 (parsed_logs.jsonl)
+    load_data          统计大屏读取规范化格式
+    aggregate_entries  旧格式逐行读到的 DataFrame 按时间戳聚合
+    heatmap            generate_perfect_heatmap，三张热力图，全部日期
+    vitality           generate_vitality_line，全部日期
+
+每个 (条数, 环节) 在单独的子进程里运行 (--repeat 次，取最快的一次)，准备数据 (比如先读出 DataFrame) 不计时。
+内存为子进程的峰值；“准备后”为开始计时前的峰值，两者之差约为这个环节新增的内存
+(Windows 上没有 resource 模块，不报告内存)。
+10M 条的原始日志约 1.6 GB。10M 这一档还没有实际跑过，按较小规模的结果推算，完整跑一遍需要十几 GB 内存和一个多小时。
+--data-dir 指定目录时，生成的日志和解析结果保留下来，下次直接复用 (同样的条数生成的文件完全相同)。
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+import process_logs
+from bench_load import _peak_mb
+from gen_synthetic import make_synthetic_log
+
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# 比基线慢这么多 (比例) 时标出来
+TOLERANCE = 0.1
+
+
+def data_files(workdir, n):
+    """n 条记录的原始日志和两种格式的解析结果"""
+    return {
+        "log": os.path.join(workdir, f"daily_log_{n}.jsonl"),
+        "entries": os.path.join(workdir, f"parsed_entries_{n}.jsonl"),
+        "rows": os.path.join(workdir, f"parsed_logs_{n}.jsonl"),
+    }
+
+
+def _process(files, fmt, workers):
+    output = files["entries"] if fmt == "normalized" else files["rows"]
+    with contextlib.redirect_stdout(io.StringIO()):
+        process_logs.process_all_logs(incremental=False, workers=workers, input_file=files["log"],
+                                      output_file=output, fmt=fmt)
+
+
+# === 各环节：setup(files, args) 准备 (不计时)，run(state, files, args) 计时，返回处理的记录数 ===
+
+def _setup_parse(files, args):
+    with open(files["log"], "r", encoding="utf-8") as f:
+        return [(r["raw_content"], r["timestamp"]) for r in map(json.loads, f)]
+
+
+def _run_parse(items, files, args):
+    from parser import LogParser
+    parser = LogParser()
+    for raw, ts in items:
+        parser.parse(raw, ts)
+    return len(items)
+
+
+def _run_process(fmt):
+    def run(state, files, args):
+        _process(files, fmt, args.workers)
+        return args.records
+    return run
+
+
+def _dashboard():
+    import logging
+    logging.disable(logging.WARNING)  # 不在 streamlit 里运行时的提示
+    import app_stats
+    return app_stats
+
+
+def _setup_load(files, args):
+    app_stats = _dashboard()
+    app_stats.ENTRIES_PATH = files["entries"]
+    app_stats.ROWS_PATH = files["rows"]
+    return app_stats
+
+
+def _run_load(app_stats, files, args):
+    return len(app_stats.load_data())
+
+
+def _setup_frame(files, args):
+    app_stats = _setup_load(files, args)
+    return app_stats, app_stats.load_data()
+
+
+def _setup_rows(files, args):
+    import pandas as pd
+    app_stats = _dashboard()
+    with open(files["rows"], "rb") as f:
+        return app_stats, pd.DataFrame(app_stats._parse_lines(f.read()))
+
+
+def _run_aggregate(state, files, args):
+    app_stats, df = state
+    return len(app_stats.aggregate_entries(df))
+
+
+def _run_heatmap(state, files, args):
+    app_stats, df = state
+    for col, color in app_stats.HEATMAP_COLORS.items():
+        app_stats.generate_perfect_heatmap(df, col, color)
+    return len(df)
+
+
+def _run_vitality(state, files, args):
+    app_stats, df = state
+    app_stats.generate_vitality_line(df)
+    return len(df)
+
+
+# 环节 -> (setup, run, 需要的解析结果)
+STAGES = {
+    "parse": (_setup_parse, _run_parse, None),
+    "process_logs": (None, _run_process("normalized"), None),
+    "process_logs_rows": (None, _run_process("rows"), None),
+    "load_data": (_setup_load, _run_load, "entries"),
+    "aggregate_entries": (_setup_rows, _run_aggregate, "rows"),
+    "heatmap": (_setup_frame, _run_heatmap, "entries"),
+    "vitality": (_setup_frame, _run_vitality, "entries"),
+}
+
+
+def _run_child(args):
+    """子进程：准备、计时运行一个环节，输出 JSON 结果"""
+    stage, workdir = args.child
+    setup, run, _ = STAGES[stage]
+    files = data_files(workdir, args.records)
+    state = setup(files, args) if setup else None
+    base = _peak_mb()
+    start = time.perf_counter()
+    records = run(state, files, args)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"records": records, "seconds": elapsed, "base_mb": base, "peak_mb": _peak_mb()}))
+
+
+def prepare(files, n, stages, workers):
+    """生成原始日志，以及后面的环节需要、但这次不测 process_logs 时缺少的解析结果"""
+    if not os.path.exists(files["log"]):
+        start = time.perf_counter()
+        make_synthetic_log(files["log"], n)
+        print(f"生成 {n:,} 条记录: {os.path.getsize(files['log']) / 1024 / 1024:.1f} MB, "
+              f"{time.perf_counter() - start:.1f}s")
+    for key, fmt, producer in (("entries", "normalized", "process_logs"), ("rows", "rows", "process_logs_rows")):
+        needed = any(STAGES[s][2] == key for s in stages)
+        if needed and producer not in stages and not os.path.exists(files[key]):
+            _process(files, fmt, workers)
+
+
+def run_stage(stage, workdir, n, workers):
+    env = dict(os.environ)
+    env.pop("HAPPYFRUIT_STORAGE", None)  # 统计大屏读 JSONL，不读 SQLite
+    cmd = [sys.executable, __file__, "--child", stage, workdir, "--records", str(n), "--workers", str(workers)]
+    out = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    if out.returncode != 0:
+        lines = (out.stderr or out.stdout).strip().splitlines()
+        return {"error": lines[-1] if lines else f"exit code {out.returncode}"}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=current_dir, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _mb(v):
+    return f"{v:.0f}" if v is not None else "-"
+
+
+def print_row(n, stage, r, base=None):
+    if "error" in r:
+        print(f"{n:>10,} {stage:<18} 失败: {r['error']}")
+        return
+    line = (f"{n:>10,} {stage:<18} {r['seconds']:>9.3f} {r['records'] / max(r['seconds'], 1e-9):>12,.0f} "
+            f"{_mb(r['peak_mb']):>8} {_mb(r['base_mb']):>8}")
+    if base is not None:
+        if "seconds" not in base:
+            line += f" {'-':>9}"
+        else:
+            ratio = r["seconds"] / max(base["seconds"], 1e-9)
+            mark = "  变慢" if ratio > 1 + TOLERANCE else ("  变快" if ratio < 1 - TOLERANCE else "")
+            line += f" {base['seconds']:>9.3f} {ratio:>6.2f}x{mark}"
+    print(line)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="HappyFruit 端到端基准测试 (耗时 + 峰值内存)")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="依次测试的记录条数")
+    arg_parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    arg_parser.add_argument("--workers", type=int, default=1, help="process_all_logs 的进程数")
+    arg_parser.add_argument("--repeat", type=int, default=1, help="重复次数，取最快一次")
+    arg_parser.add_argument("--data-dir", help="保留生成的数据的目录 (默认用临时目录，结束后删除)")
+    arg_parser.add_argument("--save", metavar="JSON", help="把结果存成基线")
+    arg_parser.add_argument("--compare", metavar="JSON", help="与之前存的基线对比耗时")
+    arg_parser.add_argument("--child", nargs=2, metavar=("STAGE", "DIR"), help=argparse.SUPPRESS)
+    arg_parser.add_argument("--records", type=int, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.child:
+        _run_child(args)
+        sys.exit(0)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        meta = baseline.get("meta", {})
+        print(f"对比基线: {args.compare} ({meta.get('time')}, commit {meta.get('commit')})")
+
+    report = {
+        "meta": {"time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "commit": _git_commit(),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "workers": args.workers, "repeat": args.repeat},
+        "results": {},
+    }
+    header = f"{'条数':>8} {'环节':<16} {'耗时(s)':>8} {'条/秒':>10} {'峰值(MB)':>7} {'准备后(MB)':>6}"
+    if baseline:
+        header += f" {'基线(s)':>7} {'倍数':>7}"
+
+    with contextlib.ExitStack() as stack:
+        workdir = args.data_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(workdir, exist_ok=True)
+        for n in args.sizes:
+            files = data_files(workdir, n)
+            prepare(files, n, args.stages, args.workers)
+            print(header)
+            results = report["results"].setdefault(str(n), {})
+            for stage in args.stages:
+                runs = [run_stage(stage, workdir, n, args.workers) for _ in range(args.repeat)]
+                r = min(runs, key=lambda x: x.get("seconds", float("inf")))
+                results[stage] = r
+                base = baseline["results"].get(str(n), {}).get(stage, {}) if baseline else None
+                print_row(n, stage, r, base)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        print(f"结果已保存至: {args.save}")
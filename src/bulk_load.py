@@ -0,0 +1,178 @@
+"""
+批量读取解析结果 (parsed_entries.jsonl / parsed_logs.jsonl)，供统计大屏使用。
+
+不再逐行 json.loads 再 pd.DataFrame(list_of_dicts)：
+- pyarrow.json 按大块 (BLOCK_SIZE) 读，固定 schema，多余字段直接忽略；
+- 时间按已知格式 TIME_FORMAT 解析 (向量化)；
+- 标签先字典编码，每个不同的词只查一次词表，编号数组直接拼成 list<int> 列 / Categorical；
+- 旧格式 (类别 x 领域 每个组合一行) 用 numpy 按时间戳聚合，结果与 app_stats.aggregate_entries 一致。
+
+得到的 DataFrame 与 app_stats 逐行读取的结果相同 (category / domain 为编号数组，action 为编号)，
+df.attrs['vocab'] 由调用方设置。
+
+pyarrow 是可选依赖 (streamlit 自带)；没装时 is_available() 返回 False，
+遇到不是合法 JSON 的行时 read_frame 返回 None，调用方都退回逐行读取。
+
+    python src/bench_load.py --rows 1000000    # 与逐行读取对比耗时和峰值内存
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.json as pa_json
+except ImportError:
+    pa = None
+    pc = None
+    pa_json = None
+
+# 每次交给 pyarrow 解析的字节数
+BLOCK_SIZE = 16 * 1024 * 1024
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+STRING_COLS = ("reference", "thoughts", "raw_content")
+
+# 没有标签时的编号 (与 vocab.NO_CODE 一致)
+NO_CODE = -1
+
+
+def is_available():
+    return pa is not None
+
+
+def _schema(rows):
+    """rows=True 为旧格式 (每个组合一行，标签是字符串)，否则为规范化格式 (标签是列表)"""
+    tag = pa.string() if rows else pa.list_(pa.string())
+    return pa.schema([
+        ("timestamp", pa.string()),
+        ("category" if rows else "categories", tag),
+        ("action", pa.string()),
+        ("domain" if rows else "domains", tag),
+        ("reference", pa.string()),
+        ("thoughts", pa.string()),
+        ("raw_content", pa.string()),
+    ])
+
+
+def read_table(source, rows=False):
+    """source 为文件路径或 bytes；不是合法 JSON 时返回 None"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    try:
+        return pa_json.read_json(
+            source,
+            read_options=pa_json.ReadOptions(block_size=BLOCK_SIZE),
+            parse_options=pa_json.ParseOptions(explicit_schema=_schema(rows),
+                                               unexpected_field_behavior="ignore"),
+        )
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+
+
+def _timestamps(strings):
+    """字符串时间 -> datetime64；个别不是标准格式时退回 pandas 自动识别"""
+    try:
+        ts = pc.strptime(strings, format=TIME_FORMAT, unit="s")
+        return pd.Series(ts.to_numpy(zero_copy_only=False)).astype("datetime64[ns]")
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return pd.to_datetime(pd.Series(strings.to_pylist()), format="mixed").astype("datetime64[ns]")
+
+
+def _encode(vocab, kind, strings):
+    """字符串数组 -> 编号数组 (int64，空值为 NO_CODE)；每个不同的词只查一次词表"""
+    if isinstance(strings, pa.ChunkedArray):
+        strings = strings.combine_chunks()
+    if len(strings) == 0:
+        return np.zeros(0, dtype=np.int64)
+    encoded = pc.dictionary_encode(strings)
+    table = np.array([vocab.code(kind, t) for t in encoded.dictionary.to_pylist()] + [NO_CODE],
+                     dtype=np.int64)
+    # 空值指向 table 最后一项 (NO_CODE)
+    indices = encoded.indices.fill_null(len(table) - 1).to_numpy(zero_copy_only=False)
+    return table[indices]
+
+
+def _list_column(codes, offsets):
+    """扁平的编号 + 每行的起止位置 -> 每行一个编号数组 (去掉 NO_CODE)"""
+    keep = codes != NO_CODE
+    if not keep.all():
+        kept_before = np.concatenate([[0], np.cumsum(keep)])
+        offsets = kept_before[offsets]
+        codes = codes[keep]
+    arr = pa.ListArray.from_arrays(pa.array(offsets, type=pa.int32()), pa.array(codes, type=pa.int64()))
+    return arr.to_pandas()
+
+
+def _strings(column):
+    return column.to_pandas().fillna("")
+
+
+def _frame_entries(table, vocab):
+    out = {"timestamp": _timestamps(table.column("timestamp"))}
+    for col, name, kind in (("category", "categories", "categories"), ("domain", "domains", "domains")):
+        lists = table.column(name).combine_chunks()
+        # 空列表和 null 都没有元素，offsets 可以直接用
+        offsets = lists.offsets.to_numpy()
+        if lists.offset:
+            offsets = offsets - offsets[0]
+        out[col] = _list_column(_encode(vocab, kind, pc.list_flatten(lists)), offsets)
+    out["action"] = _encode(vocab, "actions", table.column("action"))
+    for col in STRING_COLS:
+        out[col] = _strings(table.column(col))
+    return pd.DataFrame(out)
+
+
+def _first_truthy(group, values, n_groups):
+    """每组第一个非空值的行号，没有时为 -1"""
+    idx = np.flatnonzero(values)
+    first = np.full(n_groups, -1, dtype=np.int64)
+    # 倒序赋值，同一组最后写入的是最靠前的行
+    first[group[idx][::-1]] = idx[::-1]
+    return first
+
+
+def _frame_rows(table, vocab):
+    """旧格式：按时间戳聚合回每条记录一行 (与 aggregate_entries 相同：按时间排序，标签去重保序)"""
+    group, uniques = pd.factorize(table.column("timestamp").to_numpy(zero_copy_only=False), sort=True)
+    n_groups = len(uniques)
+    out = {"timestamp": _timestamps(pa.chunked_array([pa.array(uniques, type=pa.string())]))}
+
+    for col, kind in (("category", "categories"), ("domain", "domains")):
+        codes = _encode(vocab, kind, table.column(col))
+        pairs = pd.DataFrame({"g": group, "c": codes})
+        pairs = pairs[pairs["c"] != NO_CODE].drop_duplicates()
+        pairs = pairs.sort_values("g", kind="stable")
+        counts = np.bincount(pairs["g"].to_numpy(), minlength=n_groups)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        out[col] = _list_column(pairs["c"].to_numpy(), offsets)
+
+    for col in ("action",) + STRING_COLS:
+        values = _strings(table.column(col))
+        first = _first_truthy(group, (values != "").to_numpy(), n_groups)
+        picked = pd.Series(values.to_numpy()[np.maximum(first, 0)] if len(values) else [], dtype=object)
+        picked = picked.where(first >= 0, "")
+        if col == "action":
+            # 空字符串在词表里就是 NO_CODE
+            out[col] = _encode(vocab, "actions", pa.chunked_array([pa.array(picked.to_numpy(), type=pa.string())]))
+        else:
+            out[col] = picked.astype(str)
+    return pd.DataFrame(out)
+
+
+def read_frame(source, vocab, rows=False):
+    """
+    读取解析结果，返回每条记录一行的 DataFrame：
+    timestamp (datetime64) / category, domain (编号数组) / action (编号，没有为 -1) / 字符串列。
+    vocab 为 vocab.Vocabulary，没见过的词在内存里临时编号。
+    source 不是合法的 JSONL 时返回 None。
+    """
+    table = read_table(source, rows)
+    if table is None:
+        return None
+    if table.num_rows == 0:
+        return pd.DataFrame()
+    return _frame_rows(table, vocab) if rows else _frame_entries(table, vocab)
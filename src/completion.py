@@ -0,0 +1,194 @@
+"""
+输入框里的前缀补全：在 ## / ### / @ 后面输入几个字，弹出已有的 类别/动作/领域。
+
+每种标签一个有序数组 (按 casefold 后的词排序)，前缀匹配就是两次 bisect 找到一段连续区间，
+再按使用次数、最近使用时间 (来自 term_store) 取前几名：
+- 区间不大时，在区间里按名次 (整数) heapq.nsmallest；
+- 区间很大时 (前缀只有一两个字)，直接按预先排好的常用顺序往下找，很快就能凑够。
+10 万个词时每次补全都在 1 毫秒以内，自测：
+    python src/completion.py --terms 100000
+"""
+import argparse
+import heapq
+import random
+import time
+from bisect import bisect_left
+
+# 补全列表最多显示几项
+COMPLETION_LIMIT = 10
+
+# 匹配区间超过这么多个词时，改为按常用顺序扫描
+SCAN_LIMIT = 20000
+
+# 标记 -> 标签种类；### 要排在 ## 前面判断
+MARKERS = (("###", "actions"), ("##", "categories"), ("@", "domains"))
+
+_MAX_CHAR = chr(0x10FFFF)
+
+
+class PrefixIndex:
+    """
+    单一种类的前缀索引。stats 为 term_store 里的 {词: [次数, 最后使用秒数]}，直接引用。
+    add() 新词、或计数变化之后，调用一次 rerank() 更新常用顺序。
+
+    数组都放在 self.state 一个元组里，更新时先建好新数组再整体替换：
+    输入窗口的后台线程更新词库时，界面线程的 complete() 看到的总是一份完整的索引。
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        pairs = sorted((term.casefold(), term) for term in stats)
+        keys = [k for k, _ in pairs]
+        terms = [t for _, t in pairs]
+        self._set(keys, terms)
+
+    def _rank(self, term):
+        count, last_used = self.stats.get(term) or (0, 0)
+        return count, last_used or 0
+
+    def _set(self, keys, terms):
+        """
+        排出常用顺序，然后替换 state = (keys, terms, ranked, ranked_keys, pos)。
+        pos[i] 是 terms[i] 在常用顺序中的名次，区间内取前几名只需比较整数。
+        """
+        ranks = [self._rank(term) for term in terms]
+        order = sorted(range(len(ranks)), key=ranks.__getitem__, reverse=True)
+        ranked = [terms[i] for i in order]
+        ranked_keys = [keys[i] for i in order]
+        pos = [0] * len(order)
+        for rank, i in enumerate(order):
+            pos[i] = rank
+        self.state = (keys, terms, ranked, ranked_keys, pos)
+
+    @property
+    def ranked(self):
+        return self.state[2]
+
+    def rerank(self):
+        """重新排出常用顺序 (提交记录后调用，不在打字的路径上)"""
+        keys, terms = self.state[:2]
+        self._set(keys, terms)
+
+    def add(self, term):
+        """插入新词并重排常用顺序"""
+        self.add_many([term])
+
+    def add_many(self, new_terms):
+        """插入若干新词 (已有的忽略) 并重排常用顺序"""
+        keys, terms = list(self.state[0]), list(self.state[1])
+        for term in new_terms:
+            key = term.casefold()
+            i = bisect_left(keys, key)
+            while i < len(keys) and keys[i] == key:
+                if terms[i] == term:
+                    break
+                i += 1
+            else:
+                keys.insert(i, key)
+                terms.insert(i, term)
+        self._set(keys, terms)
+
+    def complete(self, prefix, limit=COMPLETION_LIMIT):
+        """返回以 prefix 开头 (不区分大小写) 的词，常用的在前"""
+        keys, terms, ranked, ranked_keys, pos = self.state
+        key = prefix.casefold()
+        if not key:
+            return ranked[:limit]
+        lo = bisect_left(keys, key)
+        hi = bisect_left(keys, key + _MAX_CHAR, lo)
+        if hi - lo <= SCAN_LIMIT:
+            return [ranked[r] for r in heapq.nsmallest(limit, pos[lo:hi])]
+        out = []
+        for rank, k in enumerate(ranked_keys):
+            if k.startswith(key):
+                out.append(ranked[rank])
+                if len(out) >= limit:
+                    break
+        return out
+
+
+class Completer:
+    """三种标签的前缀索引，数据来自 TermStore"""
+
+    def __init__(self, store):
+        self.store = store
+        self.indexes = {kind: PrefixIndex(store.terms[kind]) for _, kind in MARKERS}
+
+    def complete(self, kind, prefix, limit=COMPLETION_LIMIT):
+        return self.indexes[kind].complete(prefix, limit)
+
+    def complete_line(self, line, limit=COMPLETION_LIMIT):
+        """光标之前的一行文字 -> (正在输入的前缀, 候选词)；不在标签行上时候选词为空"""
+        ctx = context(line)
+        if ctx is None:
+            return "", []
+        return ctx[1], self.complete(*ctx, limit)
+
+    def refresh(self, used):
+        """
+        记录提交后 (store.record 之后) 调用，used 与 store.record 的参数相同：
+        新词插入有序数组，用到过的种类重新排常用顺序。
+        """
+        for kind, terms in used.items():
+            if terms:
+                self.indexes[kind].add_many(terms)
+
+
+def context(line):
+    """
+    光标所在行 (光标之前的部分) -> (种类, 正在输入的前缀)；不在标签行上时返回 None。
+    ## 和 @ 一行可以写多个词 (空格分开)，只补全最后一个；### 整行是一个动作。
+    """
+    stripped = line.lstrip()
+    for marker, kind in MARKERS:
+        if not stripped.startswith(marker):
+            continue
+        rest = stripped[len(marker):]
+        if kind == "categories" and rest.startswith("#"):
+            return None
+        if kind == "actions":
+            return kind, rest.strip()
+        if rest and rest[-1].isspace():
+            return kind, ""
+        words = rest.split()
+        return kind, words[-1] if words else ""
+    return None
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="前缀补全的延迟自测")
+    arg_parser.add_argument("--terms", type=int, default=100_000, help="词库大小")
+    arg_parser.add_argument("--queries", type=int, default=20_000, help="查询次数")
+    args = arg_parser.parse_args()
+
+    rng = random.Random(0)
+    # 常用汉字拼出 2~6 字的词，再混一些英文词，前缀分布和真实输入差不多
+    chars = [chr(c) for c in range(0x4E00, 0x4E00 + 800)]
+    stats = {}
+    while len(stats) < args.terms:
+        if rng.random() < 0.2:
+            term = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 10)))
+        else:
+            term = "".join(rng.choice(chars) for _ in range(rng.randint(2, 6)))
+        stats[term] = [int(rng.paretovariate(1.2)), 1_700_000_000 + rng.randint(0, 10 ** 7)]
+
+    start = time.perf_counter()
+    index = PrefixIndex(stats)
+    print(f"{args.terms:,} 个词，建索引 {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    terms = list(stats)
+    print(f"{'前缀长度':>8} {'平均(µs)':>10} {'p99(µs)':>10} {'最大(µs)':>10}")
+    for length in (0, 1, 2, 3):
+        times = []
+        for _ in range(args.queries):
+            prefix = rng.choice(terms)[:length]
+            t0 = time.perf_counter()
+            index.complete(prefix)
+            times.append(time.perf_counter() - t0)
+        times.sort()
+        print(f"{length:>8} {sum(times) / len(times) * 1e6:>10.1f} "
+              f"{times[int(len(times) * 0.99)] * 1e6:>10.1f} {times[-1] * 1e6:>10.1f}")
+
+    start = time.perf_counter()
+    index.add("新加的词")
+    print(f"新增一个词并重排常用顺序 {(time.perf_counter() - start) * 1000:.1f} ms")
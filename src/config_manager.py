@@ -1,10 +1,14 @@
 import json
 import os
 
+from completion import Completer
+from term_store import TermStore, KINDS
+
 # 定义配置文件路径
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "data")
-CONFIG_PATH = os.path.join(DATA_DIR, "hints_config.json")
+CONFIG_PATH = os.path.join(DATA_DIR, "hints_config.json")  # 旧版配置，只在第一次运行时导入
+TERMS_PATH = os.path.join(DATA_DIR, "hints_terms.json")    # 词库快照 (旁边是 hints_terms.journal)
 
 # 默认配置（如果文件不存在时使用）
 DEFAULT_CONFIG = {
@@ -13,72 +17,86 @@ DEFAULT_CONFIG = {
     "domains": ["统计", "心理学", "数学"]
 }
 
-class ConfigManager:
-    def __init__(self):
-        self.config = self.load_config()
+# 右侧提示每种标签最多显示几个常用词，其余的靠输入框里的补全
+HINT_LIMIT = 12
 
-    def load_config(self):
-        """加载配置，如果不存在则创建默认配置"""
-        if not os.path.exists(CONFIG_PATH):
-            self.save_config(DEFAULT_CONFIG)
-            return DEFAULT_CONFIG
-        
+def _legacy_config():
+    """旧的 hints_config.json；没有时用默认配置"""
+    if os.path.exists(CONFIG_PATH):
         try:
             with open(CONFIG_PATH, "r", encoding="utf-8") as f:
                 return json.load(f)
         except:
-            return DEFAULT_CONFIG
+            pass
+    return DEFAULT_CONFIG
+
+def read_terms():
+    """
+    只读地取出词库 {种类: [词, ...]} (按第一次出现的顺序)，与 ConfigManager().config 相同，
+    但不合并日志、不写任何文件、也不建补全索引 (process_logs 用它确定词表顺序)。
+    """
+    store = TermStore(TERMS_PATH)
+    if store.exists():
+        store.load(readonly=True)
+    else:
+        legacy = _legacy_config()
+        for kind in KINDS:
+            store.seed(kind, legacy.get(kind, []))
+    return {kind: store.first_seen(kind) for kind in KINDS}
+
+class ConfigManager:
+    def __init__(self):
+        self.store = TermStore(TERMS_PATH)
+        self.config = self.load_config()
+        self.completer = Completer(self.store)
+
+    def load_config(self):
+        """
+        加载词库，返回 {种类: [词, ...]} (按第一次出现的顺序)。
+        词库不存在时从旧的 hints_config.json 导入，没有旧配置则用默认配置。
+        """
+        if self.store.exists():
+            self.store.load()
+        else:
+            legacy = _legacy_config()
+            for kind in KINDS:
+                self.store.seed(kind, legacy.get(kind, []))
+            self.store.compact()
 
-    def save_config(self, config_data):
-        """保存配置到文件"""
-        # 确保目录存在
-        if not os.path.exists(DATA_DIR):
-            os.makedirs(DATA_DIR)
-            
-        with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-            json.dump(config_data, f, indent=4, ensure_ascii=False)
+        return {kind: self.store.first_seen(kind) for kind in KINDS}
 
     def update_from_entry(self, parsed_entries):
         """
-        根据解析出的条目自动更新配置。
+        根据解析出的条目自动更新词库：用到的词计数 +1，新词追加。
         parsed_entries 是 parser.parse 返回的 LogEntry 列表
         """
-        changed = False
-        
-        # 提取当前所有已知项（转为集合方便去重）
-        known_cats = set(self.config.get("categories", []))
-        known_acts = set(self.config.get("actions", []))
-        known_doms = set(self.config.get("domains", []))
+        # 笛卡尔积展开后同一个词会出现多次，每条记录只算一次
+        used = {
+            "categories": list(dict.fromkeys(e.category for e in parsed_entries if e.category)),
+            "actions": list(dict.fromkeys(e.action for e in parsed_entries if e.action)),
+            "domains": list(dict.fromkeys(e.domain for e in parsed_entries if e.domain)),
+        }
+        for kind, terms in used.items():
+            for term in terms:
+                if self.store.stats(kind, term) is None:
+                    self.config[kind].append(term)
 
-        for entry in parsed_entries:
-            # 更新类别
-            if entry.category and entry.category not in known_cats:
-                self.config["categories"].append(entry.category)
-                known_cats.add(entry.category)
-                changed = True
-            
-            # 更新动作
-            if entry.action and entry.action not in known_acts:
-                self.config["actions"].append(entry.action)
-                known_acts.add(entry.action)
-                changed = True
-                
-            # 更新领域
-            if entry.domain and entry.domain not in known_doms:
-                self.config["domains"].append(entry.domain)
-                known_doms.add(entry.domain)
-                changed = True
-
-        if changed:
-            self.save_config(self.config)
+        new_term = self.store.record(used)
+        self.completer.refresh(used)
+        if new_term:
             print("配置已自动更新！")
 
     def get_display_hints(self):
-        """生成 GUI 右侧显示的提示文本列表"""
-        # 将列表转为字符串，如 "学习 工作 游乐"
-        cat_str = " ".join(self.config.get("categories", []))
-        act_str = " ".join(self.config.get("actions", []))
-        dom_str = " ".join(self.config.get("domains", []))
+        """生成 GUI 右侧显示的提示文本列表 (常用的词排在前面)"""
+        # 将列表转为字符串，如 "学习 工作 游乐"；词太多时只显示前 HINT_LIMIT 个
+        def top(kind):
+            terms = self.completer.indexes[kind].ranked  # 已按使用次数、最近使用排好
+            more = f" …等 {len(terms)} 个" if len(terms) > HINT_LIMIT else ""
+            return " ".join(terms[:HINT_LIMIT]) + more
+
+        cat_str = top("categories")
+        act_str = top("actions")
+        dom_str = top("domains")
 
         return [
             f"## {cat_str}",
@@ -86,4 +104,4 @@ class ConfigManager:
             f"@ {dom_str}",
             "$$ 可以备注所涉及参考材料以备后用！",
             "“” 留下一句将来的自己也许可以看了会心一笑的话吧"
-        ]
\ No newline at end of file
+        ]
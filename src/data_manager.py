@@ -1,37 +1,339 @@
 # data_manager.py
+import atexit
 import json
 import os
+import queue
+import threading
 from datetime import datetime
 
+from dedup import DedupIndex, content_hash, to_epoch
+from file_lock import locked
+
 # 获取 data 文件夹的绝对路径
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 DATA_FILE = os.path.join(DATA_DIR, "daily_log.jsonl")
+ERROR_LOG = os.path.join(DATA_DIR, "error.log")
 
 # 确保 data 文件夹存在
 os.makedirs(DATA_DIR, exist_ok=True)
 
-def save_record(raw_text):
-    """
-    接收原始文本，打上时间戳，直接存入文件。
-    不进行解析，解析逻辑留给后续的展示端。
-    """
-    if not raw_text or not raw_text.strip():
-        return
+# 存储后端："jsonl" (默认，写 daily_log.jsonl) 或 "sqlite" (写 data/happyfruit.db，见 sqlite_store)
+STORAGE = os.environ.get("HAPPYFRUIT_STORAGE", "jsonl").lower()
+
+# 落盘策略
+DURABILITY_FLUSH = "flush"    # 只 flush 到操作系统，最快；断电可能丢最后几条
+DURABILITY_BATCH = "batch"    # 每批 fsync 一次 (默认)
+DURABILITY_RECORD = "record"  # 每条 fsync 一次，最稳也最慢
+DURABILITY_MODES = (DURABILITY_FLUSH, DURABILITY_BATCH, DURABILITY_RECORD)
+
+# append(callback=...) 收到的每条记录的结果
+WRITTEN = "written"   # 已写入
+SKIPPED = "skipped"   # 时间窗口内已有同样内容，跳过
+FAILED = "failed"     # 写入出错，记录转存在 error.log
 
-    record = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+_STOP = object()
+
+
+def log_error(msg):
+    """记录到 data/error.log (不依赖当前工作目录)"""
+    try:
+        with open(ERROR_LOG, "a", encoding="utf-8") as f:
+            f.write(f"{datetime.now()} - {msg}\n")
+    except OSError:
+        pass
+
+
+def make_record(raw_text, timestamp=None):
+    """打上时间戳，生成一条原始记录；空文本返回 None"""
+    if not raw_text or not raw_text.strip():
+        return None
+    return {
+        "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "raw_content": raw_text.strip(),
         # 预留字段，以后可以在这里扩展解析结果
-        "parsed": None 
+        "parsed": None
     }
-    
-    # encoding='utf-8' 防止中文乱码
-    # mode='a' 表示 append (追加模式)
+
+
+def seq_path(path=DATA_FILE):
+    """序号文件：记录最后分配的序号和当时数据文件的大小"""
+    return path + ".seq"
+
+
+def _last_seq(path, size):
+    """
+    返回 path 中最后分配的序号 (必须在持有锁时调用)。
+    序号文件之后如果还有记录 (写完数据、没来得及更新序号文件就崩溃了)，扫描这部分补上。
+    """
+    state = {"seq": 0, "size": 0}
     try:
-        with open(DATA_FILE, "a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
-    except Exception as e:
-        # 如果出错（极少情况），记录到错误日志
-        with open("error.log", "a", encoding="utf-8") as f:
-            f.write(f"{datetime.now()} - Error saving: {e}\n")
\ No newline at end of file
+        with open(seq_path(path), "r", encoding="utf-8") as f:
+            state.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+    seq = state["seq"]
+    if size == state["size"]:
+        return seq
+
+    # 文件被整理分段后会重新开始，此时从头扫描
+    start = state["size"] if size > state["size"] else 0
+    with open(path, "rb") as f:
+        f.seek(start)
+        for line in f:
+            try:
+                seq = max(seq, json.loads(line).get("seq") or 0)
+            except (ValueError, AttributeError):
+                continue
+    return seq
+
+
+def last_seq(path=DATA_FILE):
+    """path 中最后分配的序号 (要在持有锁时调用)"""
+    return _last_seq(path, os.path.getsize(path) if os.path.exists(path) else 0)
+
+
+def _save_seq(path, seq, size):
+    tmp_path = seq_path(path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"seq": seq, "size": size}, f)
+    os.replace(tmp_path, seq_path(path))
+
+
+def recover_torn_tail(path=DATA_FILE):
+    """
+    上次写到一半崩溃时，文件最后会留下没有换行符的半行。
+    把它截掉 (内容转存到 error.log)，保证新记录从完整的一行开始。
+    返回被截掉的字节数。
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return 0
+
+        # 往前找最后一个换行符
+        pos = size
+        keep = 0
+        while pos > 0:
+            start = max(0, pos - 65536)
+            f.seek(start)
+            idx = f.read(pos - start).rfind(b"\n")
+            if idx >= 0:
+                keep = start + idx + 1
+                break
+            pos = start
+
+        f.seek(keep)
+        fragment = f.read()
+        f.truncate(keep)
+    log_error(f"Recovered torn line in {path}: {fragment.decode('utf-8', errors='replace')!r}")
+    return size - keep
+
+
+class LogWriter:
+    """
+    后台写线程 + 有界队列，把追加请求攒成一批再写 (group commit)。
+    调用方 append() 只是入队，不碰磁盘；队列满时才会阻塞 (背压)。
+
+    多个进程 (输入窗口、batch_add……) 可以同时追加同一个文件：每批在文件锁
+    (见 file_lock) 内写入，每条记录一次 os.write，并分配一个递增的序号 "seq"。
+
+    去重是可选的 (默认不去重，重复的内容照常写入)：给了 dedup_window 时，这么多秒内已有同样内容的记录
+    会被跳过 (见 dedup)，跳过的条数记在 skipped。每条记录的结果 (WRITTEN / SKIPPED / FAILED)
+    在写完那一批后通过 append 的 callback 告诉调用方。
+
+    durability:
+        "flush"  每批写完只 flush
+        "batch"  每批 fsync 一次
+        "record" 每条 fsync 一次
+    """
+
+    def __init__(self, path=DATA_FILE, durability=DURABILITY_BATCH, max_queue=4096, max_batch=512,
+                 dedup_window=None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"未知的落盘策略: {durability}")
+        self.path = path
+        self.durability = durability
+        self.max_batch = max_batch
+        self.dedup_window = dedup_window
+        self.dedup = DedupIndex(path) if dedup_window is not None else None  # 第一次写入时才加载
+        self.skipped = 0
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.closed = False
+
+        self.thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+        self.thread.start()
+
+    def append(self, record, window=None, callback=None):
+        """
+        window 为 (最早, 最晚) 秒数 (见 dedup.to_epoch)：这段时间内已有同样内容就不写；
+        不给时为记录时间前后 dedup_window 秒。没有开启去重时忽略。
+        callback(record, result) 在后台线程里、这条记录所在的一批写完后调用，result 为 WRITTEN / SKIPPED / FAILED。
+        """
+        if self.closed:
+            raise RuntimeError("LogWriter 已关闭")
+        self.queue.put((record, window, callback))
+
+    def append_many(self, records):
+        for record in records:
+            self.append(record)
+
+    def flush(self):
+        """等待目前已入队的记录全部落盘"""
+        self.queue.join()
+
+    def close(self):
+        """写完队列里剩下的记录后退出后台线程"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            batch = []
+            stop = item is _STOP
+            if not stop:
+                batch.append(item)
+            # 把已经排队的记录一起带走
+            while not stop and len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                results = self._write(batch)
+                for (record, _, callback), result in zip(batch, results):
+                    if callback is not None:
+                        try:
+                            callback(record, result)
+                        except Exception as e:
+                            log_error(f"LogWriter callback failed: {e}")
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self.queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch):
+        """写入一批 [(record, window, callback)]，返回每条的结果"""
+        results = [FAILED] * len(batch)
+        index_lines = []
+        try:
+            with locked(self.path):
+                try:
+                    self._append_batch(batch, results, index_lines)
+                finally:
+                    # 索引晚于日志写入：中途崩溃时索引落后，下次 sync 会发现并重建。
+                    # 这批中途出错时，已经写进日志的记录也要登记进索引
+                    if index_lines:
+                        self.dedup.append_lines(index_lines)
+        except Exception as e:
+            # 如果出错（极少情况），把还没写进日志的记录原样留在错误日志里，避免丢失；
+            # 已经写进去的不再转存，否则从 error.log 恢复时会重复
+            failed = [record for (record, _, _), result in zip(batch, results) if result == FAILED]
+            log_error(f"Error saving: {e}\n" + "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in failed))
+        return results
+
+    def _append_batch(self, batch, results, index_lines):
+        """持有文件锁时调用：逐条追加，每条的结果填进 results，要追加的索引行放进 index_lines"""
+        # 别的进程写到一半崩溃留下的半行
+        recover_torn_tail(self.path)
+        # O_APPEND：每次 write 都追加在文件末尾；O_BINARY 防止 Windows 改写换行符
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            seq = _last_seq(self.path, os.fstat(fd).st_size)
+            if self.dedup is not None:
+                self.dedup.sync(seq)
+            for i, (record, window, _) in enumerate(batch):
+                digest = ts = None
+                if self.dedup is not None:
+                    digest, ts = content_hash(record["raw_content"]), to_epoch(record["timestamp"])
+                    if ts is not None:
+                        lo, hi = window or (ts - self.dedup_window, ts + self.dedup_window)
+                        if self.dedup.is_duplicate(digest, lo, hi):
+                            self.skipped += 1
+                            results[i] = SKIPPED
+                            continue
+                seq += 1
+                # encoding='utf-8' 防止中文乱码；整行一次写入
+                line = json.dumps({"seq": seq, **record}, ensure_ascii=False) + "\n"
+                os.write(fd, line.encode("utf-8"))
+                results[i] = WRITTEN
+                if ts is not None:
+                    index_lines.append(self.dedup.add(digest, ts, seq))
+                if self.durability == DURABILITY_RECORD:
+                    os.fsync(fd)
+            if self.durability == DURABILITY_BATCH:
+                os.fsync(fd)
+            _save_seq(self.path, seq, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+
+
+class SqliteLogWriter(LogWriter):
+    """同样的队列和批量写入，但写进 SQLite 的 entries 表，每批一个事务 (暂不去重)"""
+
+    def __init__(self, path=None, durability=DURABILITY_BATCH, max_queue=4096, max_batch=512):
+        import sqlite_store
+        self.conn = None  # 连接只能在创建它的线程里用，由后台线程打开
+        super().__init__(path or sqlite_store.DB_FILE, durability, max_queue, max_batch, dedup_window=None)
+
+    def _write(self, batch):
+        import sqlite_store
+        batch = [record for record, _, _ in batch]
+        try:
+            if self.conn is None:
+                self.conn = sqlite_store.connect(self.path, sqlite_store.SYNCHRONOUS[self.durability])
+            if self.durability == DURABILITY_RECORD:
+                for record in batch:
+                    sqlite_store.insert_entries(self.conn, [record])
+            else:
+                sqlite_store.insert_entries(self.conn, batch)
+            return [WRITTEN] * len(batch)
+        except Exception as e:
+            log_error(f"Error saving: {e}\n" + "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch))
+            return [FAILED] * len(batch)
+
+    def _run(self):
+        try:
+            super()._run()
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+
+
+_default_writer = None
+_default_lock = threading.Lock()
+
+
+def get_writer():
+    """进程内共享的后台写入器，退出时自动写完剩余记录"""
+    global _default_writer
+    with _default_lock:
+        if _default_writer is None:
+            _default_writer = SqliteLogWriter() if STORAGE == "sqlite" else LogWriter()
+            atexit.register(_default_writer.close)
+        return _default_writer
+
+
+def save_record(raw_text):
+    """
+    接收原始文本，打上时间戳，交给后台线程存入文件。
+    不进行解析，解析逻辑留给后续的展示端。
+    """
+    record = make_record(raw_text)
+    if record is None:
+        return
+    get_writer().append(record)
@@ -0,0 +1,246 @@
+"""
+原始记录去重。
+
+对规范化后的 raw_content 取哈希，保存在 daily_log.jsonl 旁边的 daily_log.jsonl.dedup 里，
+每条记录一行 "哈希 时间(秒) 序号"，只追加。LogWriter 第一次写入时才加载 (之后只读新增的行)，
+追加记录时在同一把文件锁里检查、更新：每条记录的检查是一次字典查找，
+加上在这段内容按时间排好序的出现时间里二分查找 (每天都写的内容，列表再长也是 O(log n))。
+
+写入时去重是可选的：LogWriter 默认照常写入重复的内容 (输入窗口、写入服务不会悄悄丢掉记录)，
+batch_add 开启去重，用补录条目自己的时间范围 (重复运行脚本不会重复添加)。
+同样的内容只在时间窗口内算重复，每天都写的 "## 生活 ### 睡觉" 不受影响。
+
+已有日志里的重复记录可以离线清理：
+    python src/dedup.py --dry-run            # 只列出重复记录
+    python src/dedup.py --window 600         # 删除 600 秒内内容相同的后一条
+    python src/dedup.py --any-time           # 不看时间，内容相同就只留第一条
+删除的记录保存在 data/duplicates.jsonl。
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+DATA_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "data")
+INBOX_FILE = os.path.join(DATA_DIR, "daily_log.jsonl")
+DUPLICATES_NAME = "duplicates.jsonl"  # 与收件箱放在同一目录
+
+# 默认的时间窗口：前后 10 分钟内内容相同视为重复 (LogWriter 开启去重、离线清理时用)
+DEDUP_WINDOW = 10 * 60
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+
+
+def index_path(path=INBOX_FILE):
+    return path + ".dedup"
+
+
+def normalize(text):
+    """
+    去掉每行首尾和行内多余的空白，丢掉空行。
+    (不做 NFKC：中文文本几乎都含全角标点，NFKC 每条要几十微秒，而重复提交的文本本来就逐字相同)
+    """
+    lines = (" ".join(line.split()) for line in (text or "").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def content_hash(text):
+    return hashlib.sha1(normalize(text).encode("utf-8")).hexdigest()[:16]
+
+
+def to_epoch(timestamp):
+    """'YYYY-mm-dd HH:MM:SS' -> 秒数；格式不对返回 None"""
+    if not isinstance(timestamp, str) or len(timestamp) != 19:
+        return None
+    try:
+        # fromisoformat 比 strptime 快得多，长度限定后与 TIME_FORMAT 等价
+        return int((datetime.fromisoformat(timestamp) - EPOCH).total_seconds())
+    except ValueError:
+        return None
+
+
+class DedupIndex:
+    """
+    哈希 -> 出现时间列表 (升序)。
+    sync / rebuild / append_lines 读写索引文件，要在持有 path 的文件锁 (file_lock.locked) 时调用。
+    """
+
+    def __init__(self, path=INBOX_FILE):
+        self.path = path
+        self.hashes = None   # 还没加载
+        self.offset = 0      # 已读到索引文件的哪个字节
+        self.max_seq = 0
+
+    def sync(self, last_seq):
+        """读入其它进程新追加的索引行；索引缺失或落后于日志 (写完日志没来得及写索引) 时重建"""
+        idx_file = index_path(self.path)
+        if not os.path.exists(idx_file):
+            self.rebuild(last_seq)
+            return
+        if self.hashes is None or os.path.getsize(idx_file) < self.offset:
+            self.hashes, self.offset, self.max_seq = {}, 0, 0
+        with open(idx_file, "rb") as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self.offset += len(line)
+                self._load_line(line)
+        if self.max_seq < last_seq:
+            self.rebuild(last_seq)
+
+    def _load_line(self, line):
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == b"seq":
+            # 重建时记下的序号：对应的记录可能已被删掉
+            self.max_seq = max(self.max_seq, int(parts[1]))
+            return
+        try:
+            digest, ts, seq = parts
+            ts, seq = int(ts), int(seq)
+        except ValueError:
+            return
+        bisect.insort(self.hashes.setdefault(digest.decode(), []), ts)
+        self.max_seq = max(self.max_seq, seq)
+
+    def rebuild(self, last_seq=0):
+        """扫描全部原始记录 (分段 + 收件箱) 重建索引文件，last_seq 为日志当前的最大序号"""
+        import segments
+
+        lines = [f"seq {last_seq}\n"]
+        for record in segments.iter_records(inbox=self.path):
+            ts = to_epoch(record.get("timestamp"))
+            if ts is not None and record.get("raw_content"):
+                lines.append(f"{content_hash(record['raw_content'])} {ts} {record.get('seq') or 0}\n")
+        tmp_path = index_path(self.path) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(tmp_path, index_path(self.path))
+
+        self.hashes, self.offset, self.max_seq = {}, 0, 0
+        for line in lines:
+            self._load_line(line.encode())
+        self.offset = os.path.getsize(index_path(self.path))
+
+    def is_duplicate(self, digest, lo, hi):
+        """[lo, hi] 秒内是否已有同样内容的记录 (二分查找第一个 >= lo 的时间)"""
+        times = self.hashes.get(digest)
+        if not times:
+            return False
+        i = bisect.bisect_left(times, lo)
+        return i < len(times) and times[i] <= hi
+
+    def add(self, digest, ts, seq):
+        """登记一条新记录，返回要追加到索引文件的一行"""
+        # 补录的旧记录不一定比已有的晚；按时间顺序追加时 insort 只是在末尾插入
+        bisect.insort(self.hashes.setdefault(digest, []), ts)
+        self.max_seq = max(self.max_seq, seq)
+        return f"{digest} {ts} {seq}\n"
+
+    def append_lines(self, lines):
+        if not lines:
+            return
+        with open(index_path(self.path), "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+        self.offset = os.path.getsize(index_path(self.path))
+
+
+# === 离线去重 ===
+
+def find_duplicates(records, window=DEDUP_WINDOW):
+    """
+    records 为按时间排好序的 [(哈希, 秒数)]，返回重复记录的下标集合。
+    window=None 时不看时间，只保留第一次出现的内容。
+    """
+    last_kept = {}
+    dup = set()
+    for i, (digest, ts) in enumerate(records):
+        prev = last_kept.get(digest)
+        if prev is not None and (window is None or ts - prev <= window):
+            dup.add(i)
+        else:
+            last_kept[digest] = ts
+    return dup
+
+
+def _read_file(path):
+    """返回 [(哈希, 秒数, 行字节)]，无法识别的行哈希为 None，原样保留"""
+    out = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                ts = to_epoch(record.get("timestamp"))
+                digest = content_hash(record.get("raw_content")) if ts is not None else None
+            except (ValueError, AttributeError):
+                ts, digest = None, None
+            out.append((digest, ts, line))
+    return out
+
+
+def dedup_logs(inbox=INBOX_FILE, window=DEDUP_WINDOW, dry_run=False):
+    """
+    删除已有日志 (分段 + 收件箱) 中的重复记录，返回被删除的行。
+    持有写入锁进行，删掉的记录追加到 duplicates.jsonl。
+    """
+    import segments
+    from data_manager import last_seq
+    from file_lock import locked
+
+    with locked(inbox):
+        files = segments.segment_paths(inbox) + ([inbox] if os.path.exists(inbox) else [])
+        contents = {path: _read_file(path) for path in files}
+
+        # 全部记录按时间排序后统一判断，同一秒内保持文件顺序
+        flat = [(path, i, digest, ts)
+                for path, rows in contents.items()
+                for i, (digest, ts, _) in enumerate(rows) if digest is not None]
+        flat.sort(key=lambda x: x[3])
+        dup_idx = find_duplicates([(d, t) for _, _, d, t in flat], window)
+        removed = {(flat[k][0], flat[k][1]) for k in dup_idx}
+        removed_lines = [contents[p][i][2] for p, i in sorted(removed, key=lambda x: (files.index(x[0]), x[1]))]
+        if dry_run or not removed:
+            return removed_lines
+
+        with open(os.path.join(os.path.dirname(os.path.abspath(inbox)), DUPLICATES_NAME), "ab") as f:
+            f.writelines(removed_lines)
+
+        for path, rows in contents.items():
+            keep = [line for i, (_, _, line) in enumerate(rows) if (path, i) not in removed]
+            if len(keep) == len(rows):
+                continue
+            if path == inbox:
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.writelines(keep)
+                os.replace(tmp_path, path)
+            else:
+                segments.rewrite_segment(inbox, path, keep)
+        segments.bump_version(inbox)
+        DedupIndex(inbox).rebuild(last_seq(inbox))
+    return removed_lines
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="删除原始日志中的重复记录")
+    arg_parser.add_argument("--window", type=int, default=DEDUP_WINDOW,
+                            help=f"相隔多少秒以内、内容相同算重复 (默认 {DEDUP_WINDOW})")
+    arg_parser.add_argument("--any-time", action="store_true", help="不看时间，内容相同就只保留第一条")
+    arg_parser.add_argument("--dry-run", action="store_true", help="只列出重复记录，不修改文件")
+    args = arg_parser.parse_args()
+
+    removed = dedup_logs(window=None if args.any_time else args.window, dry_run=args.dry_run)
+    for line in removed:
+        print(line.decode("utf-8", errors="replace").rstrip()[:100])
+    if args.dry_run:
+        print(f"共发现 {len(removed)} 条重复记录 (未修改)")
+    else:
+        print(f"已删除 {len(removed)} 条重复记录，备份在 {os.path.join(DATA_DIR, DUPLICATES_NAME)}")
+        print("下次运行 process_logs 时会自动全量重建解析结果")
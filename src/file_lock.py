@@ -0,0 +1,55 @@
+"""
+跨进程的建议锁 (advisory lock)。
+
+输入窗口、batch_add、process_logs --compact 等可能同时操作 daily_log.jsonl，
+追加和改名前都先拿同一把锁。锁加在旁边的 <文件>.lock 上而不是数据文件本身，
+这样数据文件被改名 (整理分段) 后锁依然有效。
+
+Windows 用 msvcrt.locking，其它系统用 fcntl.flock。
+"""
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+
+def lock_path(path):
+    return path + ".lock"
+
+
+@contextmanager
+def locked(path, timeout=None):
+    """
+    独占 path 对应的锁，with 块结束时释放。
+    timeout 为 None 时一直等待；超时抛出 TimeoutError。
+    """
+    fd = os.open(lock_path(path), os.O_RDWR | os.O_CREAT, 0o644)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                if msvcrt:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_EX | (fcntl.LOCK_NB if deadline else 0))
+                break
+            except OSError:
+                if deadline and time.monotonic() > deadline:
+                    raise TimeoutError(f"等待文件锁超时: {lock_path(path)}")
+                time.sleep(0.001)
+        try:
+            yield
+        finally:
+            if msvcrt:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
@@ -0,0 +1,193 @@
+"""
+生成合成的原始日志 (与 daily_log.jsonl 格式相同)，给基准测试和压测用。
+
+    python src/gen_synthetic.py --entries 1000000 --out D:\\tmp\\daily_log.jsonl
+    python src/gen_synthetic.py --entries 100000 --domains 500 --thoughts 0.7 --start 2020-01-01 --end 2025-12-31
+
+- 时间从 --start 到 --end 递增，没有重复 (同一秒的记录往后顺延)；
+  每天的活跃程度不同，约一成的日子没有记录，集中在白天；
+- 类别 / 动作 / 领域的种类数可以分别指定 (默认与 CATEGORIES 等内置列表一样多)，
+  超出内置列表的部分用随机的中文词补齐；按 Zipf 分布取，少数标签占大多数；
+- 一条记录可以有多个类别、多个领域 (--multi-tag 控制多标签的比例)；
+- 碎碎念由常用字组成的词拼成，长短不一，偶尔夹着英文、换行或是长篇。
+
+同样的参数和种子 (--seed) 生成的文件完全相同。
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+CATEGORIES = ["学习", "工作", "游乐", "想法", "生活"]
+ACTIONS = ["读论文", "数据处理", "写代码", "看书", "开会", "睡觉", "做饭"]
+DOMAINS = ["统计", "心理学", "数学", "和计算机打交道", "量子计算", "历史"]
+
+# 拼词用的常用字
+COMMON_CHARS = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所"
+    "民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那"
+    "社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通"
+    "并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区"
+    "强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清"
+    "美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群"
+    "广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往"
+)
+ENGLISH_WORDS = ["Python", "PyQt", "Gemini", "GPU", "arxiv", "bug", "debug", "paper", "demo", "OK"]
+
+# 内置词表之外的标签、碎碎念用词的长度范围
+WORD_LENGTH = (2, 4)
+
+
+def parse_time(text, end=False):
+    """
+    "YYYY-MM-DD HH:MM" 或 "YYYY-MM-DD" -> datetime；只写日期时，end=True 取当天最后一秒。
+    (与 batch_add 的写法相同，但不导入它：batch_add 会连带导入 data_manager，在 data/ 下建目录)
+    """
+    try:
+        return datetime.strptime(text, "%Y-%m-%d %H:%M")
+    except ValueError:
+        day = datetime.strptime(text, "%Y-%m-%d")
+        return day + timedelta(days=1, seconds=-1) if end else day
+
+
+def make_words(n, rng, base=(), reserved=()):
+    """base 在前，再用常用字随机组词补齐到 n 个 (互不相同，也不与 reserved 重复)"""
+    words = list(base[:n])
+    seen = set(words) | set(reserved)
+    while len(words) < n:
+        word = "".join(rng.choice(COMMON_CHARS) for _ in range(rng.randint(*WORD_LENGTH)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def zipf_cum_weights(n, s=1.1):
+    """第 k 个词的权重 ∝ 1 / k^s，返回累计权重 (给 random.choices 的 cum_weights)"""
+    return list(itertools.accumulate(1 / (k + 1) ** s for k in range(n)))
+
+
+class SyntheticLog:
+    """
+    按参数生成记录。text() 生成一条原始文本，records(n) 依次生成 n 条 {"timestamp", "raw_content"}，
+    write(path, n) 写成 JSONL。
+    """
+
+    def __init__(self, categories=len(CATEGORIES), actions=len(ACTIONS), domains=len(DOMAINS),
+                 multi_tag=0.3, thoughts=0.5, reference=0.2, start="2025-01-01", end="2025-12-31",
+                 vocabulary=5000, seed=0):
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        # 标签之间不重名，解析结果里不会把类别和领域混在一起
+        self.categories = make_words(categories, self.rng, CATEGORIES)
+        self.actions = make_words(actions, self.rng, ACTIONS, self.categories)
+        self.domains = make_words(domains, self.rng, DOMAINS, self.categories + self.actions)
+        self.words = make_words(vocabulary, self.rng)
+        self.weights = {name: zipf_cum_weights(len(getattr(self, name)))
+                        for name in ("categories", "actions", "domains", "words")}
+        self.multi_tag = multi_tag
+        self.thoughts = thoughts
+        self.reference = reference
+        self.start, self.end = parse_time(start), parse_time(end, end=True)
+
+    def _pick(self, name, k=1):
+        return self.rng.choices(getattr(self, name), cum_weights=self.weights[name], k=k)
+
+    def _n_tags(self, limit):
+        """1 个，按 multi_tag 的概率依次多一个，最多 limit 个"""
+        n = 1
+        while n < limit and self.rng.random() < self.multi_tag:
+            n += 1
+        return n
+
+    def sentence(self):
+        words = self._pick("words", self.rng.randint(2, 8))
+        if self.rng.random() < 0.1:
+            words.insert(self.rng.randrange(len(words) + 1), " " + self.rng.choice(ENGLISH_WORDS) + " ")
+        return "".join(words)
+
+    def thought(self):
+        if self.rng.random() < 0.03:
+            # 偶尔写一大段，分几行
+            lines = ("，".join(self.sentence() for _ in range(self.rng.randint(3, 6))) + "。"
+                     for _ in range(self.rng.randint(3, 8)))
+            return "\n".join(lines)
+        return "，".join(self.sentence() for _ in range(self.rng.randint(1, 3))) + self.rng.choice("。！？…")
+
+    def text(self):
+        rng = self.rng
+        parts = ["## " + " ".join(dict.fromkeys(self._pick("categories", self._n_tags(3))))]
+        if rng.random() < 0.8:
+            parts.append("### " + self._pick("actions")[0])
+        if rng.random() < 0.7:
+            parts.append("@ " + " ".join(dict.fromkeys(self._pick("domains", self._n_tags(4)))))
+        if rng.random() < self.reference:
+            parts.append(f"${self.sentence()}$")
+        if rng.random() < self.thoughts:
+            parts.append(f"“{self.thought()}”")
+        return "\n".join(parts)
+
+    def timestamps(self, n):
+        """n 个严格递增的时间戳 (字符串)"""
+        rng = self.np_rng
+        # 与 parsed_store 一样把本地时间按 UTC 折算成秒数，转回字符串时不受时区影响
+        start, end = (int(np.datetime64(t, "s").astype(np.int64)) for t in (self.start, self.end))
+        day0 = start // 86400
+        days = end // 86400 - day0 + 1
+        activity = rng.gamma(2.0, 1.0, days)
+        activity[rng.random(days) < 0.1] = 0  # 没记录的日子
+        if not activity.any():
+            activity[:] = 1
+        day = rng.choice(days, n, p=activity / activity.sum())
+        # 一天里的秒数：早上 6 点到半夜，下午最多
+        second = (6 * 3600 + rng.beta(2.5, 2.0, n) * (18 * 3600 - 1)).astype(np.int64)
+        ts = np.sort(np.maximum((day0 + day) * 86400 + second, start))
+        # 同一秒的记录往后顺延：ts[i] - i 单调不减即可
+        offset = np.arange(n)
+        ts = np.maximum.accumulate(ts - offset) + offset
+        return np.char.replace(ts.astype("datetime64[s]").astype(str), "T", " ")
+
+    def records(self, n):
+        for ts in self.timestamps(n):
+            yield {"timestamp": str(ts), "raw_content": self.text()}
+
+    def write(self, path, n):
+        with open(path, "w", encoding="utf-8") as f:
+            for batch in _batched(self.records(n), 10000):
+                f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch))
+        return path
+
+
+def _batched(iterable, size):
+    it = iter(iterable)
+    while batch := list(itertools.islice(it, size)):
+        yield batch
+
+
+def make_synthetic_log(path, n_lines, seed=0, **options):
+    """生成 n_lines 条记录写到 path (参数见 SyntheticLog)"""
+    return SyntheticLog(seed=seed, **options).write(path, n_lines)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="生成合成的原始日志 (daily_log.jsonl 格式)")
+    arg_parser.add_argument("--entries", type=int, default=100_000, help="记录条数")
+    arg_parser.add_argument("--out", required=True, help="输出文件 (会被覆盖)")
+    arg_parser.add_argument("--categories", type=int, default=len(CATEGORIES), help="类别的种类数")
+    arg_parser.add_argument("--actions", type=int, default=len(ACTIONS), help="动作的种类数")
+    arg_parser.add_argument("--domains", type=int, default=len(DOMAINS), help="领域的种类数")
+    arg_parser.add_argument("--multi-tag", type=float, default=0.3, help="每多一个类别 / 领域的概率")
+    arg_parser.add_argument("--thoughts", type=float, default=0.5, help="带碎碎念的记录比例")
+    arg_parser.add_argument("--start", default="2025-01-01", help="最早时间 (YYYY-MM-DD 或 YYYY-MM-DD HH:MM)")
+    arg_parser.add_argument("--end", default="2025-12-31", help="最晚时间 (只写日期时含当天)")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    make_synthetic_log(args.out, args.entries, seed=args.seed, categories=args.categories,
+                       actions=args.actions, domains=args.domains, multi_tag=args.multi_tag,
+                       thoughts=args.thoughts, start=args.start, end=args.end)
+    print(f"已生成 {args.entries:,} 条记录: {args.out} ({os.path.getsize(args.out) / 1024 / 1024:.1f} MB)")
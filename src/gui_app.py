@@ -1,44 +1,244 @@
+"""
+输入窗口。开机自启时越快注册好快捷键越好，所以启动时只导入 PyQt6、注册快捷键；
+keyboard 在监听线程里导入，窗口、解析器和词库等第一次按下快捷键时才创建。
+
+    python src/gui_app.py --profile-startup   # 打印各阶段耗时 (含第一次创建窗口)，然后退出
+"""
 import sys
 import os
 import datetime
+import queue
 import threading
+import time
+from contextlib import contextmanager
+
+_START = time.perf_counter()
+_phases = []  # [(阶段, 开始时刻, 耗时)]，都是相对 _START 的秒数
+
+
+@contextmanager
+def startup_phase(name):
+    """记录启动阶段的耗时 (--profile-startup 时打印)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, start - _START, time.perf_counter() - start))
+
+
+def print_startup_report():
+    print(f"{'阶段':<24} {'开始(ms)':>9} {'耗时(ms)':>9}")
+    for name, start, elapsed in sorted(_phases, key=lambda p: p[1]):
+        print(f"{name:<24} {start * 1000:>9.1f} {elapsed * 1000:>9.1f}")
+
 
 # --- 路径修复 ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 
 try:
-    import keyboard
-    from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, 
-                                 QPlainTextEdit, QLabel, QFrame, QLayout)
-    from PyQt6.QtCore import Qt, pyqtSignal, QObject, QPoint
-    from PyQt6.QtGui import QAction, QKeySequence, QShortcut, QMouseEvent
+    with startup_phase("导入 PyQt6"):
+        from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, 
+                                     QPlainTextEdit, QLabel, QFrame, QLayout, QCompleter)
+        from PyQt6.QtCore import Qt, pyqtSignal, QObject, QPoint, QStringListModel
+        from PyQt6.QtGui import QAction, QKeySequence, QShortcut, QMouseEvent, QTextCursor
 except ImportError as e:
     print(f"【严重错误】依赖包未安装: {e}")
     sys.exit(1)
 
-try:
-    from data_manager import save_record
-    from parser import LogParser
-    from config_manager import ConfigManager # <--- 新增导入
-except ImportError:
-    sys.exit(1)
-
 def log(msg):
     timestamp = datetime.datetime.now().strftime("%H:%M:%S")
     print(f"[{timestamp}] {msg}")
 
 class SignalBridge(QObject):
-    show_window_signal = pyqtSignal()
+    show_window_signal = pyqtSignal(float)  # 参数为按下快捷键的时刻 (perf_counter)
+    hotkey_ready_signal = pyqtSignal()
+    hotkey_failed_signal = pyqtSignal(str)
+
+
+class SubmitWorker(QObject):
+    """
+    后台线程：依次取出提交的文本，解析并更新词库 (ConfigManager)。
+    界面线程只负责入队，不等待；词库有变化时发 hints_changed 信号，
+    由 Qt 排队回到界面线程刷新右侧提示。
+    """
+    hints_changed = pyqtSignal()
+
+    def __init__(self, parser, config_mgr):
+        super().__init__()
+        self.parser = parser
+        self.config_mgr = config_mgr
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="SubmitWorker", daemon=True)
+        self.thread.start()
+
+    def submit(self, text):
+        self.queue.put(text)
+
+    def close(self, timeout=5):
+        """处理完已提交的文本后退出"""
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            text = self.queue.get()
+            if text is None:
+                return
+            start = time.perf_counter()
+            try:
+                # 解析 (时间戳用空，因为这里只为了提取元数据)
+                entries = self.parser.parse(text, "")
+                if entries:
+                    # 【核心】调用 ConfigManager 更新配置
+                    self.config_mgr.update_from_entry(entries)
+                    self.hints_changed.emit()
+                    log(f"解析成功，配置已检查更新 ({(time.perf_counter() - start) * 1000:.1f} ms)")
+            except Exception as e:
+                log(f"解析/更新配置失败: {e}")
+
+
+class CompletingTextEdit(QPlainTextEdit):
+    """
+    在 ## / ### / @ 后面输入时弹出已有的词 (前缀补全，常用的在前)。
+    Tab / Enter 选中，Esc 关闭列表，继续打字会实时更新。
+    """
+
+    def __init__(self, completer_index):
+        super().__init__()
+        self.completer_index = completer_index  # completion.Completer
+        self.prefix_len = 0
+        self.model = QStringListModel(self)
+        self.completer = QCompleter(self.model, self)
+        self.completer.setWidget(self)
+        # 候选词已经由前缀索引筛选、排好序，QCompleter 只负责显示
+        self.completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.completer.setMaxVisibleItems(8)
+        self.completer.activated.connect(self.insert_completion)
+        self.inserting = False
+        # 用 textChanged 而不是按键事件：中文输入法上屏不经过 keyPressEvent
+        self.textChanged.connect(self.update_completion)
+
+    def insert_completion(self, term):
+        cursor = self.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.Left, QTextCursor.MoveMode.KeepAnchor, self.prefix_len)
+        self.inserting = True
+        cursor.insertText(term)
+        self.inserting = False
+        self.setTextCursor(cursor)
+        self.completer.popup().hide()
+
+    def keyPressEvent(self, event):
+        popup = self.completer.popup()
+        if popup.isVisible() and event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter, Qt.Key.Key_Tab):
+            index = popup.currentIndex()
+            if not index.isValid():
+                index = self.model.index(0)
+            self.insert_completion(self.model.data(index))
+            return
+        if popup.isVisible() and event.key() == Qt.Key.Key_Escape:
+            popup.hide()
+            return
+
+        super().keyPressEvent(event)
+
+    def update_completion(self):
+        if self.inserting or not self.hasFocus():
+            return
+        cursor = self.textCursor()
+        line = cursor.block().text()[:cursor.positionInBlock()]
+        prefix, terms = self.completer_index.complete_line(line)
+        # 已经完整输入了唯一的候选词时不再弹出
+        if not terms or (len(terms) == 1 and terms[0] == prefix):
+            self.completer.popup().hide()
+            return
+
+        self.prefix_len = len(prefix)
+        self.model.setStringList(terms)
+        rect = self.cursorRect()
+        rect.setWidth(self.completer.popup().sizeHintForColumn(0)
+                      + self.completer.popup().verticalScrollBar().sizeHint().width())
+        self.completer.complete(rect)
+
+
+class AppController(QObject):
+    """
+    常驻对象：负责快捷键，窗口 (HappyLogApp) 第一次要显示时才创建。
+    profile=True 时注册好快捷键后立即创建一次窗口，打印各阶段耗时后退出。
+    """
+
+    def __init__(self, profile=False):
+        super().__init__()
+        self.profile = profile
+        self.window = None
+        self.setup_hotkey()
+
+    def setup_hotkey(self):
+        self.bridge = SignalBridge()
+        self.bridge.show_window_signal.connect(self.show_window)
+        self.bridge.hotkey_ready_signal.connect(self.on_hotkey_ready)
+        self.bridge.hotkey_failed_signal.connect(self.on_hotkey_failed)
+        def listen():
+            try:
+                with startup_phase("导入 keyboard"):
+                    import keyboard
+            except ImportError as e:
+                self.bridge.hotkey_failed_signal.emit(f"【严重错误】依赖包未安装: {e}")
+                return
+            log("开始监听快捷键 Ctrl+Space ...")
+            try:
+                with startup_phase("注册快捷键"):
+                    keyboard.add_hotkey('ctrl+space', lambda: self.bridge.show_window_signal.emit(time.perf_counter()))
+                self.bridge.hotkey_ready_signal.emit()
+                keyboard.wait()
+            except Exception as e:
+                log(f"快捷键监听失败: {e}")
+                if self.profile:
+                    self.bridge.hotkey_failed_signal.emit(f"快捷键监听失败: {e}")
+            
+        threading.Thread(target=listen, daemon=True).start()
+
+    def get_window(self):
+        if self.window is None:
+            with startup_phase("创建窗口 (首次使用)"):
+                self.window = HappyLogApp()
+        return self.window
+
+    def show_window(self, pressed_at):
+        self.get_window().show_window_safe(pressed_at)
+
+    def on_hotkey_ready(self):
+        log(f"快捷键已就绪 (启动后 {(time.perf_counter() - _START) * 1000:.0f} ms)")
+        if self.profile:
+            self.get_window()
+            print_startup_report()
+            QApplication.quit()
+
+    def on_hotkey_failed(self, msg):
+        print(msg)
+        if self.profile:
+            print_startup_report()
+        QApplication.exit(1)
+
+    def close(self):
+        if self.window is not None:
+            self.window.worker.close()
+
 
 class HappyLogApp(QWidget):
     def __init__(self):
         super().__init__()
-        self.parser = LogParser()
-        self.config_mgr = ConfigManager() # <--- 初始化配置管理器
+        with startup_phase("  导入解析 / 词库模块"):
+            from parser import LogParser
+            from config_manager import ConfigManager
+        with startup_phase("  加载词库"):
+            self.parser = LogParser()
+            self.config_mgr = ConfigManager() # <--- 初始化配置管理器
         self.old_pos = None
-        self.init_ui()
-        self.setup_hotkey()
+        with startup_phase("  构建界面"):
+            self.init_ui()
+        self.worker = SubmitWorker(self.parser, self.config_mgr)
+        self.worker.hints_changed.connect(self.refresh_hints)
 
     def init_ui(self):
         self.setWindowTitle("HappyFruit")
@@ -94,7 +294,7 @@ class HappyLogApp(QWidget):
         self.lbl_prompt.setContentsMargins(0, 20, 0, 15) 
 
         # 输入框
-        self.input_box = QPlainTextEdit()
+        self.input_box = CompletingTextEdit(self.config_mgr.completer)
         self.input_box.setPlaceholderText("在这里输入... \n(Enter 换行，Ctrl+S 保存)")
         self.input_box.setObjectName("InputBox")
         
@@ -141,8 +341,14 @@ class HappyLogApp(QWidget):
         self.right_layout.addWidget(line)
         self.right_layout.addSpacing(10)
 
-        # 从 ConfigManager 获取提示内容
-        self.refresh_hints()
+        # 从 ConfigManager 获取提示内容 (标签只创建一次，之后 refresh_hints 只改文字)
+        self.hint_labels = []
+        for h in self.config_mgr.get_display_hints():
+            lbl = QLabel(h)
+            lbl.setObjectName("HintLabel")
+            lbl.setWordWrap(False)
+            self.right_layout.addWidget(lbl)
+            self.hint_labels.append(lbl)
 
         # # 旧的固定备忘内容+自动调整宽度设计
         # hints = [
@@ -173,27 +379,10 @@ class HappyLogApp(QWidget):
         self.addAction(self.esc_action)
 
     def refresh_hints(self):
-        """刷新右侧提示文字（删除旧的，添加新的）"""
-        # 清除旧的 HintLabel (保留标题和分割线)
-        # 注意：Layout 中 item 的索引 0 是标题，1 是 spacing，2 是 line，3 是 spacing
-        # 所以我们从 index 4 开始清除
-        while self.right_layout.count() > 4:
-            item = self.right_layout.takeAt(4)
-            if item.widget():
-                item.widget().deleteLater()
-            elif item.spacerItem(): # 如果最后是 Stretch
-                self.right_layout.removeItem(item)
-
-        # 获取最新提示
-        hints = self.config_mgr.get_display_hints()
-        
-        for h in hints:
-            lbl = QLabel(h)
-            lbl.setObjectName("HintLabel")
-            lbl.setWordWrap(False) 
-            self.right_layout.addWidget(lbl)
-            
-        self.right_layout.addStretch()
+        """刷新右侧提示文字（只更新已有标签的文字，不再删掉重建）"""
+        for lbl, h in zip(self.hint_labels, self.config_mgr.get_display_hints()):
+            if lbl.text() != h:
+                lbl.setText(h)
 
     def apply_styles(self):
         self.setStyleSheet("""
@@ -268,20 +457,7 @@ class HappyLogApp(QWidget):
     def mouseReleaseEvent(self, event: QMouseEvent):
         self.old_pos = None
 
-    def setup_hotkey(self):
-        self.bridge = SignalBridge()
-        self.bridge.show_window_signal.connect(self.show_window_safe)
-        def listen():
-            log("开始监听快捷键 Ctrl+Space ...")
-            try:
-                keyboard.add_hotkey('ctrl+space', lambda: self.bridge.show_window_signal.emit())
-                keyboard.wait()
-            except Exception as e:
-                log(f"快捷键监听失败: {e}")
-            
-        threading.Thread(target=listen, daemon=True).start()
-
-    def show_window_safe(self):
+    def show_window_safe(self, pressed_at=None):
         # 显示前先让布局重新计算一次大小，适应内容
         self.adjustSize()
         self.show()
@@ -298,38 +474,39 @@ class HappyLogApp(QWidget):
                 self.move(x, y)
         self.input_box.setPlainText("")
         self.input_box.setFocus()
-        log("窗口已显示")
+        if pressed_at is None:
+            log("窗口已显示")
+        else:
+            log(f"窗口已显示 (快捷键到显示 {(time.perf_counter() - pressed_at) * 1000:.1f} ms)")
 
     def hide_window(self):
         self.hide()
         log("窗口已隐藏")
 
     def submit_data(self):
+        from data_manager import save_record
+
+        start = time.perf_counter()
         text = self.input_box.toPlainText().strip()
+        # 先隐藏窗口，解析和更新词库交给后台线程
+        self.hide()
         if text:
-            # 1. 保存原始记录
+            # 1. 保存原始记录 (只是入队，由 data_manager 的后台线程写盘)
             save_record(text)
-            log(f"已保存: {text[:20]}...")
-            
             # 2. 解析条目并更新配置
-            try:
-                # 解析 (时间戳用空，因为这里只为了提取元数据)
-                entries = self.parser.parse(text, "")
-                if entries:
-                    # 【核心】调用 ConfigManager 更新配置
-                    self.config_mgr.update_from_entry(entries)
-                    # 刷新界面显示
-                    self.refresh_hints()
-                    
-                    log(f"保存并解析成功，配置已检查更新")
-            except Exception as e:
-                log(f"解析/更新配置失败: {e}")
-                
-        self.hide_window()
+            self.worker.submit(text)
+        log(f"窗口已隐藏 (提交到隐藏 {(time.perf_counter() - start) * 1000:.1f} ms)")
+        if text:
+            log(f"已保存: {text[:20]}...")
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    profile = "--profile-startup" in sys.argv
+    if profile:
+        sys.argv.remove("--profile-startup")
+    with startup_phase("创建 QApplication"):
+        app = QApplication(sys.argv)
     app.setQuitOnLastWindowClosed(False)
-    window = HappyLogApp()
+    controller = AppController(profile)
+    app.aboutToQuit.connect(controller.close)
     log("HappyFruit v5.0 (动态配置版) 已启动")
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,286 @@
+"""
+本地写入服务：不用打开输入窗口，脚本和其它工具也能提交记录。
+
+    python src/ingest_server.py                       # HTTP 127.0.0.1:8765 + Unix socket data/ingest.sock
+    python src/ingest_server.py --port 9000 --report 5
+
+提交的内容可以是：
+    "## 学习\\n### 看书"                                  一条文本 (时间为收到的时刻)
+    {"raw_content": "...", "timestamp": "2026-01-01 12:00:00"}   带时间的一条
+    [ ... ]                                               以上两种的列表 (批量)
+
+HTTP：
+    POST /entries   请求体为上面的 JSON
+    GET  /stats     吞吐、队列长度等统计
+Unix socket (Windows 没有)：每行一个 JSON，每行回复一行 JSON；{"cmd": "stats"} 返回统计。
+
+每条文本先用 LogParser 解析 (只检查语法，原始记录的 parsed 字段仍为 None)，
+再交给 data_manager 的后台写入器 (LogWriter / SqliteLogWriter) 批量落盘，格式与输入窗口完全相同。
+写入队列满时服务会暂停读取请求 (背压)，而不是无限占用内存。
+
+压测见 bench_ingest.py。
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+import data_manager
+from data_manager import LogWriter, make_record
+from dedup import to_epoch
+from parser import LogParser
+
+DATA_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "data")
+SOCKET_PATH = os.path.join(DATA_DIR, "ingest.sock")
+HOST = "127.0.0.1"
+HTTP_PORT = 8765
+
+# 单个请求最大字节数
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+HTTP_STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large"}
+
+
+class IngestServer:
+    def __init__(self, writer):
+        self.writer = writer
+        self.parser = LogParser()
+        self.started = time.monotonic()
+        self.accepted = 0
+        self.rejected = 0
+        self.untagged = 0  # 没有解析出任何 类别/动作/领域 的记录 (多半是语法写错了)
+        self.requests = 0
+        self.connections = 0
+        self._last_report = (self.started, 0)
+
+    async def ingest(self, payload):
+        """处理一次提交，返回回复内容"""
+        self.requests += 1
+        single = not isinstance(payload, list)
+        items = [payload] if single else payload
+
+        accepted, errors, untagged = 0, [], 0
+        parsed = None
+        for i, item in enumerate(items):
+            if isinstance(item, str):
+                text, timestamp = item, None
+            elif isinstance(item, dict):
+                text, timestamp = item.get("raw_content"), item.get("timestamp")
+            else:
+                errors.append({"index": i, "error": "应为字符串或对象"})
+                continue
+            if not isinstance(text, str) or not text.strip():
+                errors.append({"index": i, "error": "raw_content 为空"})
+                continue
+            if timestamp is not None and to_epoch(timestamp) is None:
+                errors.append({"index": i, "error": "timestamp 格式应为 YYYY-mm-dd HH:MM:SS"})
+                continue
+
+            record = make_record(text, timestamp)
+            result = self.parser.parse_record(record["raw_content"], record["timestamp"])
+            if not (result.categories or result.action or result.domains):
+                untagged += 1
+            if single:
+                parsed = {"categories": result.categories, "action": result.action, "domains": result.domains}
+
+            # 写入队列满了就让出事件循环，等后台线程写完一批 (背压)
+            while self.writer.queue.full():
+                await asyncio.sleep(0.001)
+            self.writer.append(record)
+            accepted += 1
+
+        self.accepted += accepted
+        self.rejected += len(errors)
+        self.untagged += untagged
+        reply = {"ok": not errors, "accepted": accepted, "untagged": untagged}
+        if errors:
+            reply["errors"] = errors[:100]
+        if parsed is not None:
+            reply["parsed"] = parsed
+        return reply
+
+    def stats(self):
+        uptime = time.monotonic() - self.started
+        return {
+            "uptime": round(uptime, 1),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "untagged": self.untagged,
+            "skipped_duplicates": self.writer.skipped,
+            "requests": self.requests,
+            "connections": self.connections,
+            "queue_depth": self.writer.queue.qsize(),
+            "rate": round(self.accepted / uptime, 1) if uptime else 0.0,
+        }
+
+    def report(self):
+        """打印上次报告以来的吞吐和当前队列长度"""
+        now = time.monotonic()
+        last_time, last_accepted = self._last_report
+        self._last_report = (now, self.accepted)
+        if self.accepted == last_accepted:
+            return
+        rate = (self.accepted - last_accepted) / (now - last_time)
+        print(f"[ingest] {rate:,.0f} 条/秒，累计 {self.accepted:,} 条，"
+              f"队列 {self.writer.queue.qsize()}，重复跳过 {self.writer.skipped}，拒绝 {self.rejected}")
+
+    async def command(self, cmd):
+        if cmd == "stats":
+            return self.stats()
+        return {"ok": False, "error": f"未知命令: {cmd}"}
+
+    # --- Unix socket：每行一个 JSON ---
+
+    async def handle_stream(self, reader, stream):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    stream.write(json.dumps({"ok": False, "error": "请求太大"}, ensure_ascii=False).encode("utf-8") + b"\n")
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    payload = json.loads(line)
+                except ValueError:
+                    reply = {"ok": False, "error": "不是合法的 JSON"}
+                else:
+                    if isinstance(payload, dict) and "cmd" in payload:
+                        reply = await self.command(payload["cmd"])
+                    else:
+                        reply = await self.ingest(payload)
+                stream.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+                await stream.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            stream.close()
+
+    # --- HTTP (只实现需要的部分：Content-Length 请求体、keep-alive) ---
+
+    async def handle_http(self, reader, stream):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, _ = lines[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for h in lines[1:]:
+                    if ":" in h:
+                        k, v = h.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    break
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                if length > MAX_REQUEST_BYTES:
+                    status, reply, keep_alive = 413, {"ok": False, "error": "请求太大"}, False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, reply = await self.route(method, target.split("?", 1)[0], body)
+
+                data = json.dumps(reply, ensure_ascii=False).encode("utf-8")
+                stream.write(
+                    f"HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await stream.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            stream.close()
+
+    async def route(self, method, path, body):
+        if path == "/entries":
+            if method != "POST":
+                return 405, {"ok": False, "error": "请用 POST"}
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return 400, {"ok": False, "error": "不是合法的 JSON"}
+            reply = await self.ingest(payload)
+            return (200 if reply["accepted"] or not reply.get("errors") else 400), reply
+        if path == "/stats":
+            return 200, self.stats()
+        return 404, {"ok": False, "error": "只有 /entries 和 /stats"}
+
+
+async def serve(server, host=HOST, port=HTTP_PORT, socket_path=SOCKET_PATH, report_interval=0):
+    # SIGTERM 和 Ctrl+C 一样正常退出 (写完队列里的记录)；Windows 不支持时只能用 Ctrl+C
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except (NotImplementedError, AttributeError):
+        pass
+    servers = [await asyncio.start_server(server.handle_http, host, port, limit=MAX_REQUEST_BYTES)]
+    print(f"HTTP: http://{host}:{port}/entries")
+    if socket_path and hasattr(asyncio, "start_unix_server"):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # 上次没有正常退出留下的
+        servers.append(await asyncio.start_unix_server(server.handle_stream, socket_path, limit=MAX_REQUEST_BYTES))
+        print(f"Unix socket: {socket_path}")
+
+    try:
+        if report_interval:
+            while True:
+                await asyncio.sleep(report_interval)
+                server.report()
+        else:
+            await asyncio.Event().wait()
+    finally:
+        for s in servers:
+            s.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="HappyFruit 本地写入服务 (HTTP + Unix socket)")
+    arg_parser.add_argument("--host", default=HOST)
+    arg_parser.add_argument("--port", type=int, default=HTTP_PORT)
+    arg_parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket 路径，给空字符串则不开")
+    arg_parser.add_argument("--report", type=float, default=0, help="每隔几秒打印一次吞吐 (默认不打印)")
+    arg_parser.add_argument("--log-file", help="写到指定的 jsonl 文件而不是 data/daily_log.jsonl (压测用)")
+    arg_parser.add_argument("--durability", choices=data_manager.DURABILITY_MODES,
+                            default=data_manager.DURABILITY_BATCH)
+    args = arg_parser.parse_args()
+
+    if args.log_file:
+        writer = LogWriter(args.log_file, durability=args.durability, max_queue=16384)
+    elif data_manager.STORAGE == "sqlite":
+        writer = data_manager.SqliteLogWriter(durability=args.durability, max_queue=16384)
+    else:
+        writer = LogWriter(durability=args.durability, max_queue=16384)
+
+    server = IngestServer(writer)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.socket, args.report))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+        print(f"已写入 {server.accepted - writer.skipped:,} 条 (重复跳过 {writer.skipped})")
@@ -0,0 +1,261 @@
+"""
+按月分区的列式存储 (Parquet)。
+
+process_logs 在写 parsed_entries.jsonl 的同时，把同样的规范化记录写进
+data/parsed_store/YYYY-MM.parquet，统计大屏只读取与所选日期范围重叠的月份、
+只读需要的列，不用再逐行 json.loads 整个历史。
+
+列：
+    ts           int64，本地时间按 UTC 折算的秒数 (不做时区换算)
+    action       int32，词表编号 (见 vocab.py)，没有动作为 -1
+    categories   list<int32>，词表编号
+    domains      list<int32>，词表编号
+    reference / thoughts / raw_content   string
+
+标签编号由 data/vocab.json 解释，词表只追加不改号，所以分区里的编号始终有效。
+
+pyarrow 是可选依赖 (streamlit 自带)；没装时 is_available() 返回 False，
+调用方退回 JSONL。
+"""
+import json
+import os
+import shutil
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pc = None
+    pq = None
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "data")
+STORE_DIR = os.path.join(DATA_DIR, "parsed_store")
+META_FILE = os.path.join(STORE_DIR, "_meta.json")
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+
+# 存储格式版本：列的类型/含义变了就加一，旧存储会被整体重建
+STORE_FORMAT = 2
+
+# 攒够这么多行就先合并进分区文件，控制全量重建时的内存
+FLUSH_ROWS = 200_000
+
+STRING_COLS = ("reference", "thoughts", "raw_content")
+# 列名 -> 词表种类
+CODE_COLS = {"action": "actions"}
+LIST_COLS = {"categories": "categories", "domains": "domains"}
+
+
+def is_available():
+    return pa is not None
+
+
+def to_epoch(timestamp):
+    """'YYYY-mm-dd HH:MM:SS' -> 秒数；格式不对返回 None"""
+    try:
+        return int((datetime.strptime(timestamp, TIME_FORMAT) - EPOCH).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def from_epoch(ts):
+    return EPOCH + timedelta(seconds=ts)
+
+
+def month_of(ts):
+    d = from_epoch(ts)
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def _partition_path(month):
+    return os.path.join(STORE_DIR, f"{month}.parquet")
+
+
+def load_meta():
+    if not os.path.exists(META_FILE):
+        return None
+    try:
+        with open(META_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _save_meta(meta):
+    tmp_path = META_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, META_FILE)
+
+
+def _schema():
+    return pa.schema([
+        ("ts", pa.int64()),
+        ("action", pa.int32()),
+        ("categories", pa.list_(pa.int32())),
+        ("domains", pa.list_(pa.int32())),
+        ("reference", pa.string()),
+        ("thoughts", pa.string()),
+        ("raw_content", pa.string()),
+    ])
+
+
+class StoreWriter:
+    """
+    把规范化记录 (LogRecord.to_dict() 的结果) 按月写入分区，标签用 vocab 编码。
+    full=True 时先清空整个存储；否则与已有分区合并，只重写被新记录碰到的月份。
+    用 with 语句或者最后调用 close()；close() 会先保存词表再写 _meta.json。
+    """
+
+    def __init__(self, vocab, full=False, sync_state=None):
+        if not is_available():
+            raise RuntimeError("pyarrow 未安装，无法写列式存储")
+        if full and os.path.exists(STORE_DIR):
+            shutil.rmtree(STORE_DIR)
+        os.makedirs(STORE_DIR, exist_ok=True)
+
+        meta = None if full else load_meta()
+        self.meta = meta or {"format": STORE_FORMAT, "version": 0, "months": {}}
+        self.changed = full or meta is None
+        self.vocab = vocab
+        self.sync_state = sync_state
+        self.buffers = {}
+        self.buffered_rows = 0
+
+    def add(self, record):
+        ts = to_epoch(record.get("timestamp"))
+        if ts is None:
+            return
+        buf = self.buffers.get(month_of(ts))
+        if buf is None:
+            buf = self.buffers[month_of(ts)] = {name: [] for name in _schema().names}
+        buf["ts"].append(ts)
+        for c in STRING_COLS:
+            buf[c].append(record.get(c))
+        for c, kind in CODE_COLS.items():
+            buf[c].append(self.vocab.code(kind, record.get(c)))
+        for c, kind in LIST_COLS.items():
+            buf[c].append(self.vocab.codes(kind, record.get(c) or []))
+        self.buffered_rows += 1
+        if self.buffered_rows >= FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if self.buffers:
+            self.changed = True
+        for month, buf in self.buffers.items():
+            self._merge_month(month, pa.Table.from_pydict(buf, schema=_schema()))
+        self.buffers = {}
+        self.buffered_rows = 0
+
+    def _merge_month(self, month, table):
+        path = _partition_path(month)
+        if os.path.exists(path):
+            old = pq.read_table(path).cast(_schema())
+            table = pa.concat_tables([old, table])
+        # 分区内按时间排序 (稳定排序，同一秒的记录保持写入顺序)
+        table = table.take(pc.sort_indices(table, sort_keys=[("ts", "ascending")]))
+
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path, use_dictionary=True, compression="zstd")
+        os.replace(tmp_path, path)
+
+        ts = table.column("ts")
+        self.meta["months"][month] = {
+            "rows": table.num_rows,
+            "min_ts": pc.min(ts).as_py(),
+            "max_ts": pc.max(ts).as_py(),
+        }
+
+    def close(self):
+        self.flush()
+        # 词表必须先于 _meta.json 落盘，保证存储里出现的编号都能查到
+        self.vocab.save()
+        if self.changed:
+            self.meta["version"] += 1
+        self.meta["sync_state"] = self.sync_state
+        self.meta["vocab_sizes"] = self.vocab.sizes()
+        _save_meta(self.meta)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+def in_sync(checkpoint, vocab):
+    """存储是否与给定的解析断点同步，且用到的编号都在词表里"""
+    meta = load_meta()
+    if not meta or meta.get("format") != STORE_FORMAT or meta.get("sync_state") != checkpoint:
+        return False
+    sizes = vocab.sizes()
+    return all(sizes.get(kind, 0) >= n for kind, n in meta.get("vocab_sizes", {}).items())
+
+
+# === 读取 ===
+
+def is_ready():
+    """存储可用、格式是当前版本且至少写过一次"""
+    return is_available() and (load_meta() or {}).get("format") == STORE_FORMAT
+
+
+def version():
+    """存储的版本号，每次写入 +1，用作缓存键"""
+    meta = load_meta()
+    return meta["version"] if meta else -1
+
+
+def date_bounds():
+    """返回 (最早日期, 最晚日期)；没有数据时返回 None"""
+    meta = load_meta()
+    months = (meta or {}).get("months", {})
+    if not months:
+        return None
+    min_ts = min(m["min_ts"] for m in months.values())
+    max_ts = max(m["max_ts"] for m in months.values())
+    return from_epoch(min_ts).date(), from_epoch(max_ts).date()
+
+
+def _day_start(d):
+    return int((datetime(d.year, d.month, d.day) - EPOCH).total_seconds())
+
+
+def read_range(start: date, end: date, columns=None):
+    """
+    读取 [start, end] (含首尾两天) 的记录，返回 pyarrow.Table。
+    只打开时间范围重叠的月份分区，只读 columns 指定的列 (ts 总会读)。
+    """
+    meta = load_meta() or {"months": {}}
+    lo = _day_start(start)
+    hi = _day_start(end) + 86400  # 不含
+
+    if columns is not None:
+        columns = ["ts"] + [c for c in columns if c != "ts"]
+
+    tables = []
+    for month in sorted(meta["months"]):
+        info = meta["months"][month]
+        if info["max_ts"] < lo or info["min_ts"] >= hi:
+            continue
+        table = pq.read_table(_partition_path(month), columns=columns)
+        if info["min_ts"] < lo or info["max_ts"] >= hi:
+            # 分区内按 ts 排好序：二分查找首尾，切出连续的一段 (不复制)
+            ts = table.column("ts").to_numpy()
+            first, last = np.searchsorted(ts, [lo, hi], side="left")
+            table = table.slice(first, last - first)
+        tables.append(table)
+
+    if not tables:
+        schema = _schema()
+        names = columns or schema.names
+        return pa.schema([schema.field(n) for n in names]).empty_table()
+    return pa.concat_tables(tables)
@@ -18,6 +18,50 @@ class LogEntry:
     def to_dict(self):
         return asdict(self)
 
+@dataclass
+class LogRecord:
+    """一条原始记录解析后的规范化结果：标签是列表，不做笛卡尔积展开"""
+    timestamp: str            # 时间 (作为唯一ID)
+    raw_content: str          # 原始输入
+
+    categories: List[str]     # 所有类别 (已去重，保留出现顺序)
+    action: Optional[str]     # 单个动作
+    domains: List[str]        # 所有领域 (已去重，保留出现顺序)
+
+    reference: Optional[str]  # 参考材料
+    thoughts: Optional[str]   # 碎碎念
+
+    def to_dict(self):
+        return {
+            "timestamp": self.timestamp,
+            "raw_content": self.raw_content,
+            "categories": self.categories,
+            "action": self.action,
+            "domains": self.domains,
+            "reference": self.reference,
+            "thoughts": self.thoughts,
+        }
+
+    def to_entries(self) -> List[LogEntry]:
+        """展开成旧的 (类别 x 领域) 笛卡尔积格式"""
+        # 修正：动作(Action)通常是唯一的，所以我们只对 (Category x Domain) 做乘积
+        return [
+            LogEntry(
+                timestamp=self.timestamp,
+                raw_content=self.raw_content,
+                category=cat,
+                action=self.action, # 动作共享
+                domain=dom,
+                reference=self.reference, # 资源共享
+                thoughts=self.thoughts    # 碎碎念共享
+            )
+            for cat, dom in itertools.product(self.categories or [None], self.domains or [None])
+        ]
+
+# 碎碎念的引号 (中英文混用也能配对)
+_RE_QUOTE = re.compile(r'[“"”]')
+
+
 class LogParser:
     def __init__(self):
         flags = re.MULTILINE
@@ -40,60 +84,145 @@ class LogParser:
         # 5. “碎碎念”
         self.re_note = re.compile(r'[“"”](.*?)[”"“]', re.DOTALL)
 
-    def parse(self, raw_text: str, timestamp: str) -> List[LogEntry]:
-        if not raw_text:
-            return []
-        
-        text_process = raw_text.strip()
-
-        # 1. 提取所有类别 (List)
+    def _scan_regex(self, text_process: str):
+        """
+        旧的实现：五个正则各扫一遍全文。
+        保留下来只用于和 scan() 做一致性对照 (见文件末尾的自测代码)。
+        """
         cat_list = []
         for m in self.re_category.findall(text_process):
-            # 处理一行多个标签：## 学习 工作
             cat_list.extend(m.split())
-        cat_list = list(set(cat_list)) # 去重
-        if not cat_list: cat_list = [None]
 
-        # 2. 提取动作 (单数)
         action = None
         match = self.re_action.search(text_process)
-        if match: 
+        if match:
             action = match.group(1).strip()
 
-        # 3. 提取所有领域 (List)
         dom_list = []
         for m in self.re_domain.findall(text_process):
             dom_list.extend(m.split())
-        dom_list = list(set(dom_list))
-        if not dom_list: dom_list = [None]
 
-        # 4. 提取资源 (单数)
         reference = None
         match = self.re_ref_wrapped.search(text_process)
         if match: reference = match.group(1).strip()
 
-        # 5. 提取碎碎念
         thoughts = None
         match = self.re_note.search(text_process)
         if match: thoughts = match.group(1).strip()
 
-        # === 生成笛卡尔积 ===
-        # 修正：动作(Action)通常是唯一的，所以我们只对 (Category x Domain) 做乘积
-        entries = []
-        
-        for cat, dom in itertools.product(cat_list, dom_list):
-            entry = LogEntry(
-                timestamp=timestamp,
-                raw_content=raw_text,
-                category=cat,
-                action=action, # 动作共享
-                domain=dom,
-                reference=reference, # 资源共享
-                thoughts=thoughts    # 碎碎念共享
-            )
-            entries.append(entry)
-            
-        return entries
+        return cat_list, action, dom_list, reference, thoughts
+
+    def scan(self, text_process: str):
+        """
+        单遍逐行扫描，一次取出 类别/动作/领域/参考材料/碎碎念。
+        结果与上面五个正则完全一致，包括这些边角情况：
+        - 标记后面这一行是空的时，正则里的 \s* 会跨过空行，吃掉下一个非空行的内容
+          (比如 "##\n### 写代码" 的类别是 ["###", "写代码"])，被吃掉的那一行对同种标记不再生效
+        - $...$ 不跨行，取第一对
+        - 碎碎念可以跨行，三种引号可以混着配对
+        返回 (类别列表, 动作, 领域列表, 参考材料, 碎碎念)，列表未去重
+        """
+        # 碎碎念：第一个引号到下一个引号 (可以跨行)
+        thoughts = None
+        m = _RE_QUOTE.search(text_process)
+        if m:
+            close = _RE_QUOTE.search(text_process, m.end())
+            if close:
+                thoughts = text_process[m.end():close.start()].strip()
+
+        # 参考材料：同一行内的第一对 $
+        reference = None
+        i = text_process.find("$")
+        while i >= 0:
+            j = text_process.find("$", i + 1)
+            if j < 0:
+                break
+            if text_process.find("\n", i + 1, j) < 0:
+                reference = text_process[i + 1:j].strip()
+                break
+            i = j
+
+        # 标签：逐行看第一个非空白字符
+        cat_list = []
+        dom_list = []
+        action = None
+        # 标记后面是空的，等下一个非空行：(类别, 动作, 领域)
+        pending = None
+
+        for line in text_process.split("\n"):
+            c = line[:1]
+            if c != "#" and c != "@":
+                if pending is None and not c.isspace():
+                    continue
+                line = line.lstrip()
+                if not line:
+                    continue
+                c = line[0]
+
+            if pending is not None:
+                took_cat, took_act, took_dom = pending
+                pending = None
+                if took_cat:
+                    cat_list.extend(line.split())
+                if took_act:
+                    action = line.strip()
+                if took_dom:
+                    dom_list.extend(line.split())
+            else:
+                took_cat = took_act = took_dom = False
+
+            if c == "#":
+                if line.startswith("###"):
+                    # 动作 (只取第一个)
+                    if action is None and not took_act:
+                        rest = line[3:].strip()
+                        if rest:
+                            action = rest
+                        else:
+                            pending = (False, True, False)
+                elif line.startswith("##") and not took_cat:
+                    # 类别
+                    rest = line[2:].split()
+                    if rest:
+                        cat_list.extend(rest)
+                    else:
+                        pending = (True, False, False)
+            elif c == "@" and not took_dom:
+                # 领域
+                rest = line[1:].split()
+                if rest:
+                    dom_list.extend(rest)
+                else:
+                    pending = (False, False, True)
+
+        return cat_list, action, dom_list, reference, thoughts
+
+    def parse_record(self, raw_text: str, timestamp: str) -> Optional[LogRecord]:
+        """解析成一条规范化记录，空文本返回 None"""
+        if not raw_text:
+            return None
+
+        text_process = raw_text.strip()
+        cat_list, action, dom_list, reference, thoughts = self.scan(text_process)
+
+        return LogRecord(
+            timestamp=timestamp,
+            raw_content=raw_text,
+            # 处理一行多个标签：## 学习 工作
+            # 去重 (保留首次出现的顺序，保证多进程解析结果一致)
+            categories=list(dict.fromkeys(cat_list)),
+            action=action,
+            domains=list(dict.fromkeys(dom_list)),
+            reference=reference,
+            thoughts=thoughts,
+        )
+
+    def parse(self, raw_text: str, timestamp: str) -> List[LogEntry]:
+        """解析并生成 (类别 x 领域) 笛卡尔积，每个组合一条 LogEntry"""
+        record = self.parse_record(raw_text, timestamp)
+        if record is None:
+            return []
+        return record.to_entries()
 
 # === 自测代码 ===
 if __name__ == "__main__":
@@ -111,4 +240,36 @@ $PyQt$
     results = parser.parse(txt, timestamp)
     print(f"原始记录 1 条，拆分成了 {len(results)} 条：")
     for r in results:
-        print(f"类别:[{r.category}] | 动作:[{r.action}] | 领域:[{r.domain}]")
\ No newline at end of file
+        print(f"类别:[{r.category}] | 动作:[{r.action}] | 领域:[{r.domain}]")
+    print(f"规范化格式只有 1 条：{parser.parse_record(txt, timestamp).to_dict()}")
+
+    # === 与旧正则实现的一致性对照 ===
+    import random
+
+    cases = [
+        txt,
+        "## 学习\n### 写代码\n@统计",
+        "##\n### 写代码",           # ## 后面是空的，吃掉下一行
+        "###\n## 工作",
+        "@  \n\n  @ 数学 统计",
+        "#### 四个井号\n## a ## b",
+        "  ## 缩进 \t标签\u3000全角空格",
+        "$a\n$b$ $c$",
+        "“跨行的\n碎碎念”",
+        '"英文引号" 和 “中文引号”',
+        "“只有开引号",
+        "## a\r\n### b\r\n@ c\r\n",
+    ]
+    tokens = ["##", "###", "####", "@", "$", "“", "”", '"', " ", "\t", "\u3000",
+              "\n", "\n", "\r", "学习", "工作", "a", "b c"]
+    rng = random.Random(0)
+    for _ in range(20000):
+        cases.append("".join(rng.choice(tokens) for _ in range(rng.randint(0, 20))))
+
+    mismatches = 0
+    for case in cases:
+        text = case.strip()
+        if parser.scan(text) != parser._scan_regex(text):
+            mismatches += 1
+            print(f"不一致: {case!r}\n  scan : {parser.scan(text)}\n  regex: {parser._scan_regex(text)}")
+    print(f"一致性对照：{len(cases)} 条用例，{mismatches} 条不一致")
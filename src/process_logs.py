@@ -1,58 +1,387 @@
+import argparse
+import hashlib
 import json
 import os
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 # 确保能导入同级目录的 parser
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 
 from parser import LogParser
+import config_manager
+from vocab import Vocabulary
+import parsed_store
+import rollups
+import search_index
+import segments
+import sqlite_store
+from data_manager import STORAGE
 
 # 定义路径
 BASE_DIR = os.path.dirname(current_dir) # HappyFruit 根目录
 DATA_DIR = os.path.join(BASE_DIR, "data")
-INPUT_FILE = os.path.join(DATA_DIR, "daily_log.jsonl")
+INPUT_FILE = os.path.join(DATA_DIR, "daily_log.jsonl")  # 收件箱，整理过的历史在 raw_segments/ (见 segments)
 OUTPUT_FILE = os.path.join(DATA_DIR, "parsed_logs.jsonl")
+# 规范化格式：每条原始记录一行，标签为列表
+ENTRIES_FILE = os.path.join(DATA_DIR, "parsed_entries.jsonl")
 
-def process_all_logs():
-    print(f"开始处理日志...")
-    print(f"读取: {INPUT_FILE}")
-    
-    if not os.path.exists(INPUT_FILE):
-        print("错误：找不到原始日志文件。请先去记录几条数据！")
+# 输出格式 -> 默认输出文件
+OUTPUT_FORMATS = {
+    "rows": OUTPUT_FILE,         # 旧格式：(类别 x 领域) 笛卡尔积，每个组合一行
+    "normalized": ENTRIES_FILE,  # 规范化格式：每条记录一行
+}
+
+# 用原始日志开头和断点前最后一段字节的哈希来判断文件是否被改写过
+FINGERPRINT_BYTES = 4096
+
+# 并行解析时每个任务处理的字节数
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def checkpoint_path(output_file):
+    """断点文件：记录上次处理到原始日志的哪个字节/哪一行，和解析结果放在一起"""
+    return os.path.splitext(output_file)[0] + ".checkpoint.json"
+
+
+def _fingerprint(f, start, end):
+    """计算文件 [start, end) 字节区间的哈希"""
+    f.seek(start)
+    return hashlib.sha1(f.read(end - start)).hexdigest()
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def save_checkpoint(path, checkpoint):
+    # 先写临时文件再替换，避免写到一半断电留下坏的断点
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def make_checkpoint(f_in, offset, lines, output_size, segments_version=0):
+    """f_in 为以二进制方式打开的收件箱；segments_version 为分段清单的版本"""
+    tail_start = max(0, offset - FINGERPRINT_BYTES)
+    return {
+        "segments": segments_version,
+        "offset": offset,
+        "lines": lines,
+        "output_size": output_size,
+        "head": _fingerprint(f_in, 0, min(offset, FINGERPRINT_BYTES)),
+        "tail_start": tail_start,
+        "tail": _fingerprint(f_in, tail_start, offset),
+    }
+
+
+def checkpoint_is_valid(checkpoint, f_in, output_file, segments_version=0):
+    """
+    判断断点之前的内容是否原封未动。
+    原始日志被截断、被重写（比如手动删了几行）、分段被整理过或者解析结果文件被动过，都视为无效。
+    """
+    if not checkpoint:
+        return False
+    try:
+        if checkpoint.get("segments", 0) != segments_version:
+            return False
+        offset = checkpoint["offset"]
+        if os.fstat(f_in.fileno()).st_size < offset:
+            return False
+        if not os.path.exists(output_file) or os.path.getsize(output_file) < checkpoint["output_size"]:
+            return False
+        if _fingerprint(f_in, 0, min(offset, FINGERPRINT_BYTES)) != checkpoint["head"]:
+            return False
+        if _fingerprint(f_in, checkpoint["tail_start"], offset) != checkpoint["tail"]:
+            return False
+    except (KeyError, TypeError):
+        return False
+    return True
+
+
+def complete_end(f_in, start):
+    """
+    返回最后一个换行符之后的位置。
+    最后一行如果还没写完（没有换行符），留到下次再处理。
+    """
+    pos = os.fstat(f_in.fileno()).st_size
+    while pos > start:
+        block_start = max(start, pos - 65536)
+        f_in.seek(block_start)
+        idx = f_in.read(pos - block_start).rfind(b"\n")
+        if idx >= 0:
+            return block_start + idx + 1
+        pos = block_start
+    return start
+
+
+def split_ranges(f_in, start, end, chunk_size):
+    """把 [start, end) 切成按换行符对齐的若干字节区间"""
+    ranges = []
+    while start < end:
+        cut = min(start + chunk_size, end)
+        if cut < end:
+            f_in.seek(cut)
+            f_in.readline()  # 移到下一行开头
+            cut = min(f_in.tell(), end)
+        ranges.append((start, cut))
+        start = cut
+    return ranges
+
+
+_worker_parser = None
+
+
+def parse_range(input_file, start, end, fmt="rows", want_records=False):
+    """
+    解析 [start, end) 区间内的原始日志，fmt 为输出格式 (见 OUTPUT_FORMATS)。
+    串行和并行都走这个函数，保证输出完全一致。
+    返回 (输出文本, 原始行数, 写出条数, 无法解析的行, 规范化记录列表)
+    want_records=False 时最后一项为 None。
+    """
+    global _worker_parser
+    if _worker_parser is None:
+        _worker_parser = LogParser()
+    parser = _worker_parser
+
+    with open(input_file, "rb") as f:
+        f.seek(start)
+        lines = f.read(end - start).splitlines()
+
+    out = []
+    bad_lines = []
+    records = [] if want_records else None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            bad_lines.append(line.decode("utf-8", errors="replace"))
+            continue
+
+        timestamp = entry.get("timestamp", "")
+        raw_content = entry.get("raw_content", "")
+
+        record = parser.parse_record(raw_content, timestamp)
+        if record is None:
+            continue
+
+        if records is not None:
+            records.append(record.to_dict())
+        if fmt == "normalized":
+            out.append(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+        else:
+            # 这里的 to_entries() 是一个列表！遍历列表，写入多行
+            for item in record.to_entries():
+                out.append(json.dumps(item.to_dict(), ensure_ascii=False) + "\n")
+    return "".join(out), len(lines), len(out), bad_lines, records
+
+
+def _iter_results(ranges, workers, fmt, want_records):
+    """
+    ranges 为 [(文件, 起点, 终点)]，按顺序产出解析结果；
+    并行时最多同时挂起 workers*2 个任务，控制内存
+    """
+    if workers <= 1 or len(ranges) <= 1:
+        for path, start, end in ranges:
+            yield parse_range(path, start, end, fmt, want_records)
         return
 
-    parser = LogParser()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        todo = iter(ranges)
+        for path, start, end in todo:
+            pending.append(pool.submit(parse_range, path, start, end, fmt, want_records))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            yield pending.popleft().result()
+            nxt = next(todo, None)
+            if nxt:
+                pending.append(pool.submit(parse_range, *nxt, fmt, want_records))
+
+
+def process_sqlite(incremental=True):
+    """SQLite 存储：解析 entries 表里新增的原始记录，写入 records / tags 表"""
+    print(f"开始处理日志 (SQLite)...")
+    print(f"数据库: {sqlite_store.DB_FILE}")
+    count = sqlite_store.parse_pending(LogParser(), full=not incremental)
+    print(f"处理完成！")
+    print(f"共解析 {count} 条记录。")
+
+
+def process_all_logs(incremental=True, workers=1, chunk_size=DEFAULT_CHUNK_SIZE,
+                     input_file=INPUT_FILE, output_file=None, fmt="rows", columnar=False,
+                     compact=False, rollup=False, search=False):
+    """
+    原始日志 = 按月分段 (input_file 同目录的 raw_segments/) + 收件箱 input_file。
+    incremental=True 时只解析收件箱里上次断点之后新追加的记录；
+    原始日志被截断、改写或分段被整理过时自动退回全量重建。
+    compact=True 时先把收件箱整理进分段 (见 segments.compact)，随后会全量重建一次；
+    上次整理中断留下的 .compacting 文件总是先整理完。
+    workers > 1 时按换行符切块，用多进程并行解析，输出与串行完全一致。
+    fmt 为输出格式 (见 OUTPUT_FORMATS)，每种格式有自己的输出文件和断点。
+    columnar=True 时同时更新按月分区的列式存储 (见 parsed_store)。
+    rollup=True 时同时更新按天汇总的计数表 (见 rollups)，统计大屏的热力图直接用它。
+    search=True 时同时更新全文搜索索引 (见 search_index)。
+    """
+    if output_file is None:
+        output_file = OUTPUT_FORMATS[fmt]
+    if columnar and not parsed_store.is_available():
+        print("警告：未安装 pyarrow，跳过列式存储")
+        columnar = False
+
+    print(f"开始处理日志...")
+    print(f"读取: {input_file}")
+
+    if not compact and os.path.exists(segments.rotated_path(input_file)):
+        # 上次整理中断，留下了改名后的收件箱 (.compacting)，其中一部分月份可能已经并入分段。
+        # 不能直接把它当作输入 (会重复)，也不能忽略 (会漏掉)，先把这次整理做完
+        print("发现上次中断的整理，先继续整理...")
+        compact = True
+    if compact:
+        n = segments.compact(input_file)
+        print(f"已把收件箱中的 {n} 条记录整理进分段: {segments.segment_dir(input_file)}")
+
+    segment_files = segments.segment_paths(input_file)
+    if not os.path.exists(input_file):
+        if not segment_files:
+            print("错误：找不到原始日志文件。请先去记录几条数据！")
+            return
+        open(input_file, "ab").close()
+    segments_version = segments.version(input_file)
+
+    ckpt_file = checkpoint_path(output_file)
     processed_count = 0
-    
-    # 读取所有原始数据
-    raw_entries = []
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                try:
-                    raw_entries.append(json.loads(line))
-                except json.JSONDecodeError:
+
+    with open(input_file, "rb") as f_in:
+        checkpoint = load_checkpoint(ckpt_file) if incremental else None
+        if columnar or rollup:
+            # 词表初始顺序跟随语法提示词库 (只读，不与正开着的输入窗口争着改写词库文件)，之后遇到的新词追加在后面
+            vocab = Vocabulary()
+            vocab.sync_from_config(config_manager.read_terms())
+        if columnar and checkpoint and not parsed_store.in_sync(checkpoint, vocab):
+            # 列式存储和解析结果不同步 (比如第一次开启)，一起全量重建
+            print("列式存储需要重建...")
+            checkpoint = None
+        if rollup and checkpoint and not rollups.in_sync(checkpoint, vocab):
+            print("汇总表需要重建...")
+            checkpoint = None
+        if search and checkpoint and not search_index.in_sync(checkpoint):
+            print("搜索索引需要重建...")
+            checkpoint = None
+        if checkpoint_is_valid(checkpoint, f_in, output_file, segments_version):
+            offset, line_count = checkpoint["offset"], checkpoint["lines"]
+            print(f"增量模式：从第 {line_count} 行 (字节 {offset}) 继续")
+            mode = "r+b"
+        else:
+            if incremental and checkpoint:
+                if checkpoint.get("segments", 0) != segments_version:
+                    print("分段已重新整理，执行全量重建...")
+                else:
+                    print("原始日志被截断或改写，执行全量重建...")
+            offset, line_count = 0, 0
+            mode = "wb"
+
+        ranges = []
+        if mode == "wb":
+            # 全量重建：先按月份顺序解析各分段
+            for path in segment_files:
+                with open(path, "rb") as f_seg:
+                    end = complete_end(f_seg, 0)
+                    ranges += [(path, s, e) for s, e in split_ranges(f_seg, 0, end, chunk_size)]
+        new_offset = complete_end(f_in, offset)
+        ranges += [(input_file, s, e) for s, e in split_ranges(f_in, offset, new_offset, chunk_size)]
+
+        store = parsed_store.StoreWriter(vocab, full=(mode == "wb")) if columnar else None
+        cube = rollups.RollupWriter(vocab, full=(mode == "wb")) if rollup else None
+        index = search_index.IndexWriter(full=(mode == "wb")) if search else None
+
+        # 解析并写入（增量时追加）
+        with open(output_file, mode) as f_out:
+            if mode == "r+b":
+                # 上次写完结果但没来得及更新断点时，先丢掉那部分多写的结果
+                f_out.seek(checkpoint["output_size"])
+                f_out.truncate()
+            results = _iter_results(ranges, workers, fmt, want_records=columnar or rollup or search)
+            for text, n_lines, n_out, bad_lines, records in results:
+                for line in bad_lines:
                     print(f"警告：跳过一行无法解析的 JSON: {line}")
+                f_out.write(text.encode("utf-8"))
+                if store:
+                    for record in records:
+                        store.add(record)
+                if cube:
+                    for record in records:
+                        cube.add(record)
+                if index:
+                    for record in records:
+                        index.add(record)
+                line_count += n_lines
+                processed_count += n_out
+            output_size = f_out.tell()
 
-    # 解析并覆盖写入
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f_out:
-        for entry in raw_entries:
-            timestamp = entry.get("timestamp", "")
-            raw_content = entry.get("raw_content", "")
-            
-            # 这里的 parsed_entries 是一个列表！
-            parsed_entries = parser.parse(raw_content, timestamp)
-            
-            # 遍历列表，写入多行
-            for item in parsed_entries:
-                f_out.write(json.dumps(item.to_dict(), ensure_ascii=False) + "\n")
-                processed_count += 1
+        new_checkpoint = make_checkpoint(f_in, new_offset, line_count, output_size, segments_version)
+        if store:
+            # 记下存储对应的断点，下次据此判断两者是否同步
+            store.sync_state = new_checkpoint
+            store.close()
+            print(f"列式存储已更新: {parsed_store.STORE_DIR}")
+        if cube:
+            cube.sync_state = new_checkpoint
+            cube.close()
+            print(f"汇总表已更新: {rollups.ROLLUP_FILE}")
+        if index:
+            index.sync_state = new_checkpoint
+            index.close()
+            print(f"搜索索引已更新: {search_index.INDEX_FILE}")
+        save_checkpoint(ckpt_file, new_checkpoint)
 
     print(f"处理完成！")
     print(f"共解析 {processed_count} 条记录。")
-    print(f"结果已保存至: {OUTPUT_FILE}")
+    print(f"结果已保存至: {output_file}")
+
 
 if __name__ == "__main__":
-    process_all_logs()
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="解析原始日志，生成统计大屏所需的数据")
+    arg_parser.add_argument("--full", action="store_true", help="忽略断点，全量重建解析结果")
+    arg_parser.add_argument("--compact", action="store_true",
+                            help="先把收件箱 daily_log.jsonl 整理进按月分段 data/raw_segments (之后会全量重建一次)")
+    arg_parser.add_argument("--format", choices=sorted(OUTPUT_FORMATS), default="rows",
+                            help="rows: 每个 (类别, 领域) 组合一行 (parsed_logs.jsonl)；"
+                                 "normalized: 每条记录一行，标签为列表 (parsed_entries.jsonl)")
+    arg_parser.add_argument("--columnar", action="store_true",
+                            help="同时更新按月分区的列式存储 data/parsed_store (需要 pyarrow)")
+    arg_parser.add_argument("--rollups", action="store_true",
+                            help="同时更新按天汇总的计数表 data/rollups.npz (统计大屏的热力图用)")
+    arg_parser.add_argument("--search", action="store_true",
+                            help="同时更新全文搜索索引 data/search_index.db (统计大屏的搜索框用)")
+    arg_parser.add_argument("--storage", choices=["jsonl", "sqlite"], default=STORAGE,
+                            help="存储后端，默认取环境变量 HAPPYFRUIT_STORAGE (未设置时为 jsonl)")
+    arg_parser.add_argument("--workers", type=int, default=1,
+                            help="并行解析的进程数，0 表示使用全部 CPU 核心 (默认 1，即串行)")
+    arg_parser.add_argument("--chunk-size", type=float, default=DEFAULT_CHUNK_SIZE / 1024 / 1024,
+                            help="每个解析任务处理的数据量，单位 MB (默认 8)")
+    args = arg_parser.parse_args()
+    if args.storage == "sqlite":
+        process_sqlite(incremental=not args.full)
+    else:
+        process_all_logs(incremental=not args.full,
+                         workers=args.workers or os.cpu_count() or 1,
+                         chunk_size=max(1, int(args.chunk_size * 1024 * 1024)),
+                         fmt=args.format,
+                         columnar=args.columnar,
+                         compact=args.compact,
+                         rollup=args.rollups,
+                         search=args.search)
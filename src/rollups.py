@@ -0,0 +1,293 @@
+"""
+按天汇总的计数表 (物化的 日 x 标签 计数)，统计大屏的热力图和每日活力曲线直接用它。
+
+process_logs 解析时顺便累加 (--rollups)，增量解析只把新记录加进去：
+    entries         int64[天数]           每天的记录条数
+    category        int64[天数, 词表大小]  每天每个类别出现的次数 (列号即词表编号，见 vocab.py)
+    action / domain 同上
+
+统计大屏按日期范围切出几行，周 / 月 / 每两日 / 每四日的视图都由按天的计数求和得到，
+不用再对每条记录 groupby / pivot。没有汇总表 (或与解析结果不同步) 时，
+统计大屏用同样的 DayCube 从读到的记录现算 (app_stats.cube_from_frame)，结果一致。
+
+天数为本地时间按 UTC 折算的天数 (与 parsed_store 的 ts 一致，不做时区换算)。
+"""
+import json
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+from parsed_store import to_epoch
+from vocab import KIND_OF_COLUMN, NO_CODE, Vocabulary
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "data")
+ROLLUP_FILE = os.path.join(DATA_DIR, "rollups.npz")
+META_FILE = os.path.join(DATA_DIR, "rollups.json")
+
+# 格式版本：数组的含义变了就加一，旧汇总表会被整体重建
+ROLLUP_FORMAT = 1
+
+DAY_SECONDS = 86400
+EPOCH_DATE = date(1970, 1, 1)
+
+# DataFrame 列名 -> 规范化记录里的键
+RECORD_KEYS = {"category": "categories", "action": "action", "domain": "domains"}
+LIST_COLS = ("category", "domain")
+
+# 热力图的周期 -> 标题里的单位
+PERIOD_UNITS = {"M": "/每月", "W-MON": "/每周", "4D": "/每四日", "2D": "/每两日", "D": "/每日"}
+
+
+def day_number(d):
+    return (d - EPOCH_DATE).days
+
+
+def day_date(n):
+    return EPOCH_DATE + timedelta(days=int(n))
+
+
+def choose_period(days_span):
+    """日历天数 (含首尾) -> 热力图的周期"""
+    if days_span > 196:
+        return "M"
+    if days_span > 112:
+        return "W-MON"
+    if days_span > 56:
+        return "4D"
+    if days_span > 28:
+        return "2D"
+    return "D"
+
+
+def period_keys(days, freq):
+    """
+    每一天所属周期的编号 (单调不减)：
+    D 为天数本身；2D/4D 与 pandas floor 一样从 1970-01-01 起对齐；
+    W-MON 为周二开始、周一结束的一周的第一天；M 为 1970-01 起的月数。
+    """
+    if freq == "D":
+        return days
+    if freq in ("2D", "4D"):
+        step = int(freq[0])
+        return days // step * step
+    if freq == "W-MON":
+        return days - (days + 2) % 7  # 1970-01-01 是周四
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def period_label(key, freq):
+    if freq == "D":
+        return day_date(key).strftime("%m-%d")
+    if freq == "M":
+        return f"{1970 + key // 12:04d}-{key % 12 + 1:02d}"
+    return day_date(key).isoformat()
+
+
+class DayCube:
+    """
+    day0 起连续若干天的计数：entries[天]，counts[列名][天, 编号]。
+    terms 为 列名 -> 词表 (编号即下标)，渲染时换回字符串。
+    """
+
+    def __init__(self, day0, entries, counts, terms):
+        self.day0 = int(day0)
+        self.entries = entries
+        self.counts = counts
+        self.terms = terms
+
+    @classmethod
+    def empty(cls, terms=None):
+        terms = terms or {col: [] for col in RECORD_KEYS}
+        return cls(0, np.zeros(0, dtype=np.int64),
+                   {col: np.zeros((0, len(terms[col])), dtype=np.int64) for col in RECORD_KEYS}, terms)
+
+    @classmethod
+    def from_arrays(cls, days, tags, terms):
+        """
+        days 为每条记录的天数；tags 为 列名 -> (每次出现的天数, 编号)。
+        只覆盖 days 的最早到最晚一天。
+        """
+        if len(days) == 0:
+            return cls.empty(terms)
+        day0 = int(days.min())
+        n_days = int(days.max()) - day0 + 1
+        entries = np.bincount(days - day0, minlength=n_days)
+        counts = {}
+        for col in RECORD_KEYS:
+            tag_days, codes = tags[col]
+            width = len(terms[col])
+            flat = (tag_days - day0) * width + codes
+            counts[col] = np.bincount(flat, minlength=n_days * width).reshape(n_days, width)
+        return cls(day0, entries, counts, terms)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def days(self):
+        return np.arange(self.day0, self.day0 + len(self.entries))
+
+    def first_date(self):
+        return day_date(self.day0)
+
+    def last_date(self):
+        return day_date(self.day0 + len(self.entries) - 1)
+
+    def slice(self, start, end):
+        """[start, end] (date，含首尾) 内、从第一天有记录到最后一天有记录的部分；数组都是视图"""
+        lo = max(day_number(start) - self.day0, 0)
+        hi = min(day_number(end) - self.day0 + 1, len(self.entries))
+        active = np.flatnonzero(self.entries[lo:hi]) if hi > lo else []
+        if len(active) == 0:
+            return DayCube.empty(self.terms)
+        lo, hi = lo + active[0], lo + active[-1] + 1
+        return DayCube(self.day0 + lo, self.entries[lo:hi],
+                       {col: m[lo:hi] for col, m in self.counts.items()}, self.terms)
+
+    def by_period(self, col, freq):
+        """按周期求和：返回 (周期编号, 矩阵[周期, 编号])"""
+        keys = period_keys(self.days, freq)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        return keys[starts], np.add.reduceat(self.counts[col], starts, axis=0)
+
+    def merged(self, days, tags, widths):
+        """加上新记录 (参数同 from_arrays，widths 为 列名 -> 词表大小)，返回新的 DayCube"""
+        lo, hi = self.day0, self.day0 + len(self.entries)
+        if len(self.entries) == 0:
+            lo, hi = (int(days.min()), int(days.max()) + 1) if len(days) else (0, 0)
+        elif len(days):
+            lo, hi = min(lo, int(days.min())), max(hi, int(days.max()) + 1)
+        shift = self.day0 - lo if len(self.entries) else 0
+        n_days = hi - lo
+
+        entries = np.zeros(n_days, dtype=np.int64)
+        entries[shift:shift + len(self.entries)] = self.entries
+        if len(days):
+            entries += np.bincount(days - lo, minlength=n_days)
+        counts = {}
+        for col, old in self.counts.items():
+            width = max(widths[col], old.shape[1])
+            m = np.zeros((n_days, width), dtype=np.int64)
+            m[shift:shift + len(old), :old.shape[1]] = old
+            tag_days, codes = tags[col]
+            if len(codes):
+                m += np.bincount((tag_days - lo) * width + codes, minlength=n_days * width).reshape(n_days, width)
+            counts[col] = m
+        return DayCube(lo, entries, counts, self.terms)
+
+
+# === 持久化 ===
+
+def load_meta():
+    if not os.path.exists(META_FILE):
+        return None
+    try:
+        with open(META_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _save_meta(meta):
+    tmp_path = META_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, META_FILE)
+
+
+def is_ready():
+    return (load_meta() or {}).get("format") == ROLLUP_FORMAT and os.path.exists(ROLLUP_FILE)
+
+
+def version():
+    """汇总表的版本号，每次写入 +1，用作缓存键"""
+    meta = load_meta()
+    return meta["version"] if meta else -1
+
+
+def in_sync(checkpoint, vocab):
+    """汇总表是否与给定的解析断点同步，且用到的编号都在词表里"""
+    meta = load_meta()
+    if not meta or meta.get("format") != ROLLUP_FORMAT or meta.get("sync_state") != checkpoint:
+        return False
+    sizes = vocab.sizes()
+    return all(sizes.get(kind, 0) >= n for kind, n in meta.get("vocab_sizes", {}).items())
+
+
+def load(vocab=None):
+    """读取汇总表，返回 DayCube；没有或者格式不对时返回 None"""
+    if not is_ready():
+        return None
+    if vocab is None:
+        vocab = Vocabulary()
+    terms = {col: list(vocab.terms[kind]) for col, kind in KIND_OF_COLUMN.items()}
+    try:
+        with np.load(ROLLUP_FILE) as data:
+            counts = {col: data[col] for col in RECORD_KEYS}
+            return DayCube(int(data["day0"]), data["entries"], counts, terms)
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+class RollupWriter:
+    """
+    process_logs 用：把规范化记录 (LogRecord.to_dict() 的结果) 的计数累加进汇总表，标签用 vocab 编码。
+    full=True 时从空表开始；否则在已有的汇总表上累加。
+    记录先攒在列表里，close() 时一次性加进数组并写文件 (先保存词表)。
+    """
+
+    def __init__(self, vocab, full=False, sync_state=None):
+        meta = None if full else load_meta()
+        cube = None if full else load(vocab)
+        if cube is None:
+            meta = None
+            cube = DayCube.empty({col: [] for col in RECORD_KEYS})
+        self.meta = meta or {"format": ROLLUP_FORMAT, "version": 0}
+        self.changed = full or meta is None
+        self.cube = cube
+        self.vocab = vocab
+        self.sync_state = sync_state
+        self.days = []
+        self.tags = {col: ([], []) for col in RECORD_KEYS}
+
+    def add(self, record):
+        ts = to_epoch(record.get("timestamp"))
+        if ts is None:
+            return
+        day = ts // DAY_SECONDS
+        self.days.append(day)
+        for col, key in RECORD_KEYS.items():
+            kind = KIND_OF_COLUMN[col]
+            if col in LIST_COLS:
+                codes = self.vocab.codes(kind, record.get(key) or [])
+            else:
+                code = self.vocab.code(kind, record.get(key))
+                codes = [code] if code != NO_CODE else []
+            tag_days, tag_codes = self.tags[col]
+            tag_days.extend([day] * len(codes))
+            tag_codes.extend(codes)
+
+    def close(self):
+        if self.days:
+            self.changed = True
+            widths = {col: self.vocab.sizes()[KIND_OF_COLUMN[col]] for col in RECORD_KEYS}
+            tags = {col: (np.array(d, dtype=np.int64), np.array(c, dtype=np.int64))
+                    for col, (d, c) in self.tags.items()}
+            self.cube = self.cube.merged(np.array(self.days, dtype=np.int64), tags, widths)
+            self.days = []
+            self.tags = {col: ([], []) for col in RECORD_KEYS}
+
+        # 词表必须先于汇总表落盘，保证用到的编号都能查到
+        self.vocab.save()
+        if self.changed:
+            os.makedirs(DATA_DIR, exist_ok=True)
+            tmp_path = ROLLUP_FILE + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(f, day0=self.cube.day0, entries=self.cube.entries, **self.cube.counts)
+            os.replace(tmp_path, ROLLUP_FILE)
+            self.meta["version"] += 1
+        self.meta["sync_state"] = self.sync_state
+        self.meta["vocab_sizes"] = self.vocab.sizes()
+        _save_meta(self.meta)
@@ -0,0 +1,361 @@
+"""
+全文搜索：raw_content 和 thoughts 上的字 / 双字 (bigram) 倒排索引，存在 data/search_index.db (SQLite)。
+
+中文不分词也能搜：每段连续的文字 (字母、数字、汉字) 拆成单字和相邻两字，
+查询时把每个词拆成相邻两字 (一个字的词用单字)，取各自记录列表的交集，
+再对候选记录核对原文确实包含每个词 (两字都在但不相邻的排除掉)。
+
+索引里只有记录编号、没有词频，排序要读原文。为了让常见的词也能很快返回，
+默认只核对、排序最新的 VERIFY_LIMIT 条候选：候选更多时是 "最近的记录里最相关的"，
+不是全部记录里最相关的 (界面和命令行都会注明)；命令行加 --all 核对全部候选。
+
+表结构：
+    docs      被索引的记录   id (按写入顺序递增), ts, raw_content, thoughts
+    postings  倒排表         gram, block, ids   主键 (gram, block)
+    meta      键值对         format / version / next_id / blocks / sync_state ...
+
+ids 为一段递增的记录编号，差分后 zlib 压缩。process_logs (--search) 每批新记录
+给每个字写一个新的 block，增量解析不用改写已有的记录列表；block 积累到 MERGE_BLOCKS 个时
+合并成每个字一个 block。
+
+    python src/search_index.py 碎碎念 开心          # 命令行查询 (多个词同时包含)
+    python src/search_index.py 开心 --all          # 核对、排序全部候选 (常见的词会慢)
+    python src/search_index.py --stats
+"""
+import argparse
+import html
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import zlib
+from array import array
+from collections import defaultdict
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "data")
+INDEX_FILE = os.path.join(DATA_DIR, "search_index.db")
+
+# 格式版本：表结构或拆字方式变了就加一，旧索引会被整体重建
+INDEX_FORMAT = 1
+
+# 攒够这么多条记录写一批 (控制全量重建时的内存)
+FLUSH_DOCS = 50_000
+
+# 每个字的 block 超过这么多个时合并
+MERGE_BLOCKS = 32
+
+# 查询时默认最多核对多少条候选记录 (从最新的开始)，保证常见的词也能很快返回
+VERIFY_LIMIT = 5000
+VERIFY_BATCH = 500
+
+SEARCH_LIMIT = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id          INTEGER PRIMARY KEY,
+    ts          TEXT NOT NULL,
+    raw_content TEXT NOT NULL,
+    thoughts    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    gram        TEXT NOT NULL,
+    block       INTEGER NOT NULL,
+    ids         BLOB NOT NULL,
+    PRIMARY KEY (gram, block)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key         TEXT PRIMARY KEY,
+    value
+);
+"""
+
+_WORD = re.compile(r"\w+")
+
+
+def _runs(text):
+    """连续的文字段 (不区分大小写)；标点和空白把文字隔开"""
+    return _WORD.findall(text.casefold())
+
+
+def grams(text):
+    """文本的全部单字和相邻两字"""
+    out = set()
+    for run in _runs(text):
+        out.update(run)
+        out.update(run[i:i + 2] for i in range(len(run) - 1))
+    return out
+
+
+def query_grams(term):
+    """查询词 -> 需要同时出现的字 (每段文字的相邻两字；只有一个字时用单字)"""
+    out = set()
+    for run in _runs(term):
+        if len(run) == 1:
+            out.add(run)
+        else:
+            out.update(run[i:i + 2] for i in range(len(run) - 1))
+    return out
+
+
+def _pack(ids):
+    """递增的编号 -> 差分后压缩的字节"""
+    if len(ids) < 64:
+        # 大多数字只出现在几条记录里，短列表用 numpy 反而慢
+        deltas = array("I", [b - a for a, b in zip([0, *ids], ids)])
+        if sys.byteorder == "big":
+            deltas.byteswap()
+        return zlib.compress(deltas.tobytes(), 1)
+    arr = np.asarray(ids, dtype=np.int64)
+    return zlib.compress(np.diff(arr, prepend=0).astype("<u4").tobytes(), 1)
+
+
+def _unpack(blob):
+    return np.cumsum(np.frombuffer(zlib.decompress(blob), dtype="<u4"), dtype=np.int64)
+
+
+def connect(path=INDEX_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _read_meta(conn):
+    meta = {}
+    for key, value in conn.execute("SELECT key, value FROM meta"):
+        meta[key] = json.loads(value)
+    return meta
+
+
+def load_meta(path=INDEX_FILE):
+    if not os.path.exists(path):
+        return None
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+        try:
+            return _read_meta(conn)
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+
+def is_ready(path=INDEX_FILE):
+    return (load_meta(path) or {}).get("format") == INDEX_FORMAT
+
+
+def in_sync(checkpoint, path=INDEX_FILE):
+    """索引是否与给定的解析断点同步"""
+    meta = load_meta(path)
+    return bool(meta) and meta.get("format") == INDEX_FORMAT and meta.get("sync_state") == checkpoint
+
+
+class IndexWriter:
+    """
+    process_logs 用：add() 规范化记录 (LogRecord.to_dict() 的结果)，close() 写完并记下断点。
+    full=True 时先清空索引 (清空表，不删文件，统计大屏可能正开着它)。
+    """
+
+    def __init__(self, full=False, sync_state=None, path=INDEX_FILE):
+        self.conn = connect(path)
+        meta = _read_meta(self.conn)
+        if full or meta.get("format") != INDEX_FORMAT:
+            with self.conn:
+                self.conn.execute("DELETE FROM docs")
+                self.conn.execute("DELETE FROM postings")
+                self.conn.execute("DELETE FROM meta")
+            meta = {"format": INDEX_FORMAT, "version": meta.get("version", 0), "next_id": 0, "blocks": 0}
+        self.meta = meta
+        self.changed = False
+        self.sync_state = sync_state
+        self.docs = []
+        self.pending = defaultdict(list)
+
+    def add(self, record):
+        raw = record.get("raw_content") or ""
+        thoughts = record.get("thoughts") or ""
+        doc_id = self.meta["next_id"]
+        self.meta["next_id"] += 1
+        self.docs.append((doc_id, record.get("timestamp") or "", raw, thoughts))
+        for g in grams(raw + "\n" + thoughts):
+            self.pending[g].append(doc_id)
+        if len(self.docs) >= FLUSH_DOCS:
+            self.flush()
+
+    def flush(self):
+        if not self.docs:
+            return
+        block = self.meta["blocks"]
+        with self.conn:
+            self.conn.executemany("INSERT INTO docs VALUES (?, ?, ?, ?)", self.docs)
+            self.conn.executemany("INSERT INTO postings VALUES (?, ?, ?)",
+                                  ((g, block, _pack(ids)) for g, ids in self.pending.items()))
+        self.meta["blocks"] += 1
+        self.changed = True
+        self.docs = []
+        self.pending = defaultdict(list)
+
+    def merge(self):
+        """把每个字的全部 block 合并成一个"""
+        with self.conn:
+            self.conn.execute("DROP TABLE IF EXISTS postings_merged")
+            self.conn.execute("CREATE TABLE postings_merged (gram TEXT NOT NULL, block INTEGER NOT NULL, "
+                              "ids BLOB NOT NULL, PRIMARY KEY (gram, block)) WITHOUT ROWID")
+            rows = self.conn.execute("SELECT gram, ids FROM postings ORDER BY gram, block")
+            batch, current, parts = [], None, []
+            for gram, blob in rows:
+                if gram != current:
+                    if parts:
+                        batch.append((current, 0, _pack(np.concatenate(parts))))
+                    current, parts = gram, []
+                parts.append(_unpack(blob))
+                if len(batch) >= 10000:
+                    self.conn.executemany("INSERT INTO postings_merged VALUES (?, ?, ?)", batch)
+                    batch = []
+            if parts:
+                batch.append((current, 0, _pack(np.concatenate(parts))))
+            self.conn.executemany("INSERT INTO postings_merged VALUES (?, ?, ?)", batch)
+            self.conn.execute("DROP TABLE postings")
+            self.conn.execute("ALTER TABLE postings_merged RENAME TO postings")
+        self.meta["blocks"] = 1
+
+    def close(self):
+        self.flush()
+        if self.meta["blocks"] > MERGE_BLOCKS:
+            self.merge()
+        if self.changed:
+            self.meta["version"] += 1
+        self.meta["sync_state"] = self.sync_state
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                  ((k, json.dumps(v, ensure_ascii=False)) for k, v in self.meta.items()))
+        self.conn.close()
+
+
+# === 查询 ===
+
+def _ids(conn, gram):
+    blobs = [b for (b,) in conn.execute("SELECT ids FROM postings WHERE gram = ? ORDER BY block", (gram,))]
+    if not blobs:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate([_unpack(b) for b in blobs])
+
+
+def search(query, limit=SEARCH_LIMIT, path=INDEX_FILE, verify_limit=VERIFY_LIMIT):
+    """
+    返回 (结果, 匹配条数, 没有核对的候选条数)。
+    query 按空白分成几个词，结果需包含每一个词 (不区分大小写)。
+    结果按 (各词出现次数，碎碎念里出现的算两次) 从高到低、同分时新的在前排列，
+    每项为 {"ts", "raw_content", "thoughts", "score"}。
+    候选记录太多时只核对最新的 verify_limit 条，排序也只在这些里面进行：更早的候选不会出现在结果里，
+    其条数为第三项 (其中可能还有匹配的，真实的匹配条数 ≥ 第二项，见 describe_total)。
+    verify_limit=None 时核对全部候选。
+    """
+    terms = [t.casefold() for t in query.split() if _runs(t)]
+    if not terms or not os.path.exists(path):
+        return [], 0, 0
+    needed = set()
+    for t in terms:
+        needed |= query_grams(t)
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+    try:
+        # 从最短的列表开始求交集
+        lists = sorted((_ids(conn, g) for g in needed), key=len)
+        candidates = lists[0]
+        for ids in lists[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+
+        candidates = candidates[::-1]  # 新写入的在前
+        if verify_limit is not None:
+            unverified = max(len(candidates) - verify_limit, 0)
+            candidates = candidates[:verify_limit]
+        else:
+            unverified = 0
+        matches = []
+        for i in range(0, len(candidates), VERIFY_BATCH):
+            chunk = candidates[i:i + VERIFY_BATCH].tolist()
+            marks = ",".join("?" * len(chunk))
+            rows = conn.execute(f"SELECT ts, raw_content, thoughts FROM docs WHERE id IN ({marks})", chunk)
+            for ts, raw, thoughts in rows:
+                raw_f, thoughts_f = raw.casefold(), thoughts.casefold()
+                if all(t in raw_f or t in thoughts_f for t in terms):
+                    score = sum(raw_f.count(t) + 2 * thoughts_f.count(t) for t in terms)
+                    matches.append({"ts": ts, "raw_content": raw, "thoughts": thoughts, "score": score})
+    finally:
+        conn.close()
+
+    matches.sort(key=lambda m: (m["score"], m["ts"]), reverse=True)
+    return matches[:limit], len(matches), unverified
+
+
+def describe_total(total, unverified, verify_limit=VERIFY_LIMIT):
+    """
+    匹配条数的说明。有没核对的候选时，匹配条数只是下限，写成 "≥N"，
+    并注明结果只来自最新的 verify_limit 条候选 (更早的没有核对，也没有参与排序)。
+    """
+    if not unverified:
+        return f"{total} 条"
+    return (f"≥{total} 条 (只在最新的 {verify_limit:,} 条候选里核对、排序，"
+            f"更早的 {unverified:,} 条候选没有核对)")
+
+
+def highlight(text, query):
+    """转义成 HTML，并用 <mark> 标出查询词"""
+    terms = [re.escape(t) for t in query.split() if t]
+    if not terms:
+        return html.escape(text)
+    out = []
+    pos = 0
+    for m in re.finditer("|".join(terms), text, flags=re.IGNORECASE):
+        out.append(html.escape(text[pos:m.start()]))
+        out.append(f"<mark>{html.escape(m.group())}</mark>")
+        pos = m.end()
+    out.append(html.escape(text[pos:]))
+    return "".join(out)
+
+
+def stats(path=INDEX_FILE):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+    try:
+        docs = conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        n_grams, n_blocks = conn.execute("SELECT COUNT(DISTINCT gram), COUNT(*) FROM postings").fetchone()
+    finally:
+        conn.close()
+    return {"docs": docs, "grams": n_grams, "blocks": n_blocks, "bytes": os.path.getsize(path)}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="在 raw_content 和 thoughts 里全文搜索 (索引由 process_logs --search 建立)")
+    arg_parser.add_argument("query", nargs="*", help="要搜索的词，多个词表示同时包含")
+    arg_parser.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+    arg_parser.add_argument("--all", action="store_true",
+                            help=f"核对、排序全部候选 (默认只看最新的 {VERIFY_LIMIT} 条候选)")
+    arg_parser.add_argument("--stats", action="store_true", help="显示索引大小")
+    args = arg_parser.parse_args()
+
+    if not is_ready():
+        print("还没有搜索索引，请先运行: python src/process_logs.py --search")
+        sys.exit(1)
+    if args.stats:
+        s = stats()
+        print(f"{s['docs']:,} 条记录，{s['grams']:,} 个字/双字，{s['blocks']:,} 个 block，"
+              f"{s['bytes'] / 1024 / 1024:.1f} MB")
+    if args.query:
+        query = " ".join(args.query)
+        start = time.perf_counter()
+        results, total, unverified = search(query, args.limit, verify_limit=None if args.all else VERIFY_LIMIT)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"找到 {describe_total(total, unverified)}，用时 {elapsed:.1f} ms")
+        for r in results:
+            text = " ".join(r["raw_content"].split())
+            print(f"[{r['ts']}] ({r['score']}) {text}")
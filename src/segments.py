@@ -0,0 +1,311 @@
+"""
+按月分段的原始日志。
+
+输入窗口和 batch_add 仍然只往 data/daily_log.jsonl 追加 (收件箱)。
+整理 (compact) 时把收件箱里的记录按时间戳所在月份并入
+data/raw_segments/YYYY-MM.jsonl，段内按时间排序，补录的旧记录也会归到对应月份；
+整理完的收件箱被清空。
+
+data/raw_segments/_manifest.json 记录每段的时间范围、条数、字节数和 sha1：
+    {"version": 3, "segments": {"2026-01": {"min_ts": ..., "max_ts": ..., "records": ...,
+                                             "bytes": ..., "sha1": ..., "batch": ...}}}
+按日期读取时只打开时间范围重叠的段，不随历史总量变慢。
+
+时间戳无法识别的记录放在 undated 段。
+
+    python src/segments.py            # 整理收件箱
+    python src/segments.py --verify   # 校验各段的 sha1
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import date
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from data_manager import log_error
+from file_lock import locked
+
+DATA_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "data")
+INBOX_FILE = os.path.join(DATA_DIR, "daily_log.jsonl")
+
+# 段目录与收件箱放在同一目录下
+SEGMENT_DIRNAME = "raw_segments"
+MANIFEST_NAME = "_manifest.json"
+UNDATED = "undated"
+
+_RE_TIMESTAMP = re.compile(r"^(\d{4}-\d{2})-\d{2}")
+
+
+def segment_dir(inbox=INBOX_FILE):
+    return os.path.join(os.path.dirname(os.path.abspath(inbox)), SEGMENT_DIRNAME)
+
+
+def rotated_path(inbox=INBOX_FILE):
+    """整理时收件箱先改名为这个文件，新记录写进新的收件箱"""
+    return inbox + ".compacting"
+
+
+def _segment_path(seg_dir, month):
+    return os.path.join(seg_dir, f"{month}.jsonl")
+
+
+def month_of(timestamp):
+    m = _RE_TIMESTAMP.match(timestamp) if isinstance(timestamp, str) else None
+    return m.group(1) if m else UNDATED
+
+
+def _file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# === 清单 ===
+
+def load_manifest(inbox=INBOX_FILE):
+    path = os.path.join(segment_dir(inbox), MANIFEST_NAME)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            pass
+    return {"version": 0, "segments": {}}
+
+
+def _save_manifest(seg_dir, manifest):
+    path = os.path.join(seg_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def version(inbox=INBOX_FILE):
+    """清单版本号，每次整理 +1；解析断点据此判断分段是否变过"""
+    return load_manifest(inbox)["version"]
+
+
+def segment_paths(inbox=INBOX_FILE, start: date = None, end: date = None):
+    """
+    按月份顺序返回与 [start, end] (含首尾两天) 重叠的段文件；不给日期时返回全部。
+    undated 段只在不限日期时返回。
+    """
+    seg_dir = segment_dir(inbox)
+    segments = load_manifest(inbox)["segments"]
+    lo = start.isoformat() if start else None
+    hi = end.isoformat() if end else None
+
+    paths = []
+    for month in sorted(segments):
+        info = segments[month]
+        if month == UNDATED:
+            if lo or hi:
+                continue
+        else:
+            if lo and info["max_ts"] < lo:
+                continue
+            if hi and info["min_ts"][:10] > hi:
+                continue
+        paths.append(_segment_path(seg_dir, month))
+    return paths
+
+
+def iter_records(start: date = None, end: date = None, inbox=INBOX_FILE):
+    """
+    依次产出 [start, end] 内的原始记录 (dict)：先是重叠的各段，再是收件箱里还没整理的记录。
+    段内已按时间排序，收件箱里的记录保持写入顺序。
+    """
+    lo = start.isoformat() if start else None
+    hi = end.isoformat() if end else None
+
+    sources = segment_paths(inbox, start, end)
+    sources += [p for p in (rotated_path(inbox), inbox) if os.path.exists(p)]
+    for path in sources:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # 还没写完的最后一行
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                ts = record.get("timestamp")
+                if lo or hi:
+                    if not isinstance(ts, str) or (lo and ts < lo) or (hi and ts[:10] > hi):
+                        continue
+                yield record
+
+
+# === 整理 ===
+
+def _read_lines(path):
+    """返回 [(时间戳, 行字节)]，行字节带换行符；没有时间戳为 ""，整行无法解析为 None"""
+    out = []
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                line += b"\n"
+            if not line.strip():
+                continue
+            try:
+                ts = json.loads(line).get("timestamp")
+                ts = ts if isinstance(ts, str) else ""
+            except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                ts = None
+            out.append((ts, line))
+    return out
+
+
+def _merge_month(seg_dir, month, new_lines, manifest, batch_id):
+    info = manifest["segments"].get(month)
+    if info and info.get("batch") == batch_id:
+        return 0  # 上次整理到一半中断时已经并入过
+
+    path = _segment_path(seg_dir, month)
+    lines = _read_lines(path) if os.path.exists(path) else []
+    lines += new_lines
+    # 稳定排序：同一秒的记录保持原有顺序
+    lines.sort(key=lambda x: x[0] or "")
+    _write_segment(seg_dir, month, lines, manifest, batch_id)
+    return len(new_lines)
+
+
+def _write_segment(seg_dir, month, lines, manifest, batch_id):
+    """lines 为排好序的 [(时间戳, 行字节)]；写入后立即更新清单"""
+    path = _segment_path(seg_dir, month)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for _, line in lines:
+            f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    stamps = [ts for ts, _ in lines if ts]
+    manifest["segments"][month] = {
+        "min_ts": min(stamps) if stamps else "",
+        "max_ts": max(stamps) if stamps else "",
+        "records": len(lines),
+        "bytes": os.path.getsize(path),
+        "sha1": _file_sha1(path),
+        "batch": batch_id,
+    }
+    # 每并入一个月就更新清单，中断后重来不会重复并入
+    _save_manifest(seg_dir, manifest)
+
+
+def rewrite_segment(inbox, path, lines):
+    """用 lines (行字节，顺序不变) 替换某个段的内容，比如删掉重复记录之后"""
+    seg_dir = segment_dir(inbox)
+    month = os.path.splitext(os.path.basename(path))[0]
+    manifest = load_manifest(inbox)
+    ts_lines = []
+    for line in lines:
+        try:
+            ts = json.loads(line).get("timestamp")
+        except (ValueError, AttributeError):
+            ts = None
+        ts_lines.append((ts if isinstance(ts, str) else "", line))
+    _write_segment(seg_dir, month, ts_lines, manifest, None)
+
+
+def bump_version(inbox=INBOX_FILE):
+    """分段内容变了：清单版本 +1，解析断点随之失效"""
+    manifest = load_manifest(inbox)
+    manifest["version"] += 1
+    os.makedirs(segment_dir(inbox), exist_ok=True)
+    _save_manifest(segment_dir(inbox), manifest)
+
+
+def compact(inbox=INBOX_FILE, resort=False):
+    """
+    把收件箱并入各月份段并清空收件箱，返回并入的记录数。
+    resort=True 时即使没有新记录，也把所有段重新排序并刷新校验和 (手动改过段文件后用)。
+    """
+    seg_dir = segment_dir(inbox)
+    os.makedirs(seg_dir, exist_ok=True)
+    rotated = rotated_path(inbox)
+
+    if not os.path.exists(rotated):
+        if not os.path.exists(inbox) or os.path.getsize(inbox) == 0:
+            if resort:
+                _resort_all(inbox, load_manifest(inbox))
+            return 0
+        try:
+            # 持有写入锁时改名，不会截断正在写的记录；之后的写入会进入新的收件箱
+            with locked(inbox):
+                os.replace(inbox, rotated)
+                open(inbox, "ab").close()
+        except PermissionError:
+            # Windows 上文件正被写入时无法改名，下次再整理
+            print("收件箱正在被写入，稍后再整理")
+            return 0
+
+    manifest = load_manifest(inbox)
+    batch_id = _file_sha1(rotated)
+
+    by_month = {}
+    for ts, line in _read_lines(rotated):
+        if ts is None:
+            log_error(f"Skipped unreadable line while compacting: {line!r}")
+            continue
+        by_month.setdefault(month_of(ts), []).append((ts, line))
+
+    merged = 0
+    for month in sorted(by_month):
+        merged += _merge_month(seg_dir, month, by_month[month], manifest, batch_id)
+
+    if resort:
+        _resort_all(inbox, manifest, skip=by_month)
+    else:
+        manifest["version"] += 1
+        _save_manifest(seg_dir, manifest)
+    os.remove(rotated)
+    return merged
+
+
+def _resort_all(inbox, manifest, skip=()):
+    """重新排序所有段 (skip 中的月份刚整理过，跳过)，最后更新清单版本"""
+    seg_dir = segment_dir(inbox)
+    for name in sorted(os.listdir(seg_dir)):
+        month, ext = os.path.splitext(name)
+        if ext != ".jsonl" or month in skip:
+            continue
+        manifest["segments"].pop(month, None)
+        _merge_month(seg_dir, month, [], manifest, None)
+    manifest["version"] += 1
+    _save_manifest(seg_dir, manifest)
+
+
+def verify(inbox=INBOX_FILE):
+    """返回校验和或大小与清单不符的段 (月份列表)"""
+    seg_dir = segment_dir(inbox)
+    bad = []
+    for month, info in sorted(load_manifest(inbox)["segments"].items()):
+        path = _segment_path(seg_dir, month)
+        if (not os.path.exists(path) or os.path.getsize(path) != info["bytes"]
+                or _file_sha1(path) != info["sha1"]):
+            bad.append(month)
+    return bad
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="把收件箱 daily_log.jsonl 整理进按月分段的原始日志")
+    arg_parser.add_argument("--verify", action="store_true", help="只校验各段与清单是否一致")
+    arg_parser.add_argument("--resort", action="store_true", help="重新排序所有段并刷新清单")
+    args = arg_parser.parse_args()
+
+    if args.verify:
+        bad = verify()
+        print("全部一致" if not bad else f"与清单不符的段: {', '.join(bad)}")
+    else:
+        n = compact(resort=args.resort)
+        print(f"整理完成，并入 {n} 条记录: {segment_dir()}")
@@ -0,0 +1,341 @@
+"""
+可选的 SQLite 存储 (WAL 模式)。
+
+设置环境变量 HAPPYFRUIT_STORAGE=sqlite 后：
+    data_manager.save_record  写入 entries 表 (原始记录)
+    process_logs              解析新增的原始记录，写入 records / tags 表
+    app_stats                 按日期范围查询，标签计数直接在 SQL 里完成
+
+表结构：
+    entries  原始记录        id, ts, raw_content                      索引: ts
+    records  解析结果        entry_id, ts, action, reference, thoughts  索引: ts, (action, ts)
+    tags     类别/领域标签   entry_id, kind, tag, ts                   索引: (kind, ts), (kind, tag, ts)
+    meta     键值对          parsed_upto (已解析到的 entries.id), version (每次解析 +1)
+
+时间戳保存为 'YYYY-mm-dd HH:MM:SS' 字符串，按字典序比较即按时间比较。
+
+表在第一次以写入方式打开时创建 (PRAGMA user_version 记录表结构版本)，查询用普通连接，不再改设置、建表。
+
+第一次使用前从现有 JSONL 迁移 (parsed_entries.jsonl 或 parsed_logs.jsonl 里已有的解析结果一并导入)：
+    python src/sqlite_store.py --migrate
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import date
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+DATA_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "data")
+DB_FILE = os.path.join(DATA_DIR, "happyfruit.db")
+PARSED_ENTRIES_FILE = os.path.join(DATA_DIR, "parsed_entries.jsonl")
+PARSED_ROWS_FILE = os.path.join(DATA_DIR, "parsed_logs.jsonl")
+
+# 表结构的版本，记在 PRAGMA user_version 里；比它旧的库打开时 (重新) 执行 SCHEMA
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id          INTEGER PRIMARY KEY,
+    ts          TEXT NOT NULL,
+    raw_content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_ts ON entries(ts);
+
+CREATE TABLE IF NOT EXISTS records (
+    entry_id    INTEGER PRIMARY KEY REFERENCES entries(id),
+    ts          TEXT NOT NULL,
+    action      TEXT,
+    reference   TEXT,
+    thoughts    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_ts ON records(ts);
+CREATE INDEX IF NOT EXISTS idx_records_action ON records(action, ts);
+
+CREATE TABLE IF NOT EXISTS tags (
+    entry_id    INTEGER NOT NULL REFERENCES entries(id),
+    kind        TEXT NOT NULL,
+    tag         TEXT NOT NULL,
+    ts          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tags_kind_ts ON tags(kind, ts);
+CREATE INDEX IF NOT EXISTS idx_tags_kind_tag ON tags(kind, tag, ts);
+CREATE INDEX IF NOT EXISTS idx_tags_entry ON tags(entry_id);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key         TEXT PRIMARY KEY,
+    value
+);
+"""
+
+# 落盘策略 (data_manager.DURABILITY_*) -> PRAGMA synchronous
+SYNCHRONOUS = {"flush": "OFF", "batch": "NORMAL", "record": "FULL"}
+
+
+def connect(path=DB_FILE, synchronous="NORMAL"):
+    """以写入方式打开数据库 (不存在则创建)；第一次打开时建表并开启 WAL"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        # WAL 模式记在库文件里，之后的连接不用再设
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return conn
+
+
+def _connect_read(path=DB_FILE):
+    """查询用的普通连接；库还不存在时先建好 (空库)"""
+    if not os.path.exists(path):
+        connect(path).close()
+    return sqlite3.connect(path, timeout=30)
+
+
+def get_meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, value))
+
+
+def version(path=DB_FILE):
+    """解析结果的版本号，每次 process_logs 写入后 +1，用作缓存键"""
+    if not os.path.exists(path):
+        return -1
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        return get_meta(conn, "version", 0)
+    finally:
+        conn.close()
+
+
+# === 写入 ===
+
+def insert_entries(conn, records):
+    """records 为 data_manager.make_record 的结果 (dict)；在一个事务里写入"""
+    with conn:
+        conn.executemany(
+            "INSERT INTO entries(ts, raw_content) VALUES (?, ?)",
+            [(r["timestamp"], r["raw_content"]) for r in records])
+
+
+def _write_record(conn, entry_id, record):
+    """写入一条解析结果 (LogRecord)，先删掉这条原始记录以前的结果"""
+    conn.execute("DELETE FROM tags WHERE entry_id = ?", (entry_id,))
+    conn.execute(
+        "INSERT OR REPLACE INTO records(entry_id, ts, action, reference, thoughts) VALUES (?, ?, ?, ?, ?)",
+        (entry_id, record.timestamp, record.action, record.reference, record.thoughts))
+    conn.executemany(
+        "INSERT INTO tags(entry_id, kind, tag, ts) VALUES (?, ?, ?, ?)",
+        [(entry_id, "category", t, record.timestamp) for t in record.categories]
+        + [(entry_id, "domain", t, record.timestamp) for t in record.domains])
+
+
+def parse_pending(parser, path=DB_FILE, full=False, batch=10000):
+    """
+    解析 parsed_upto 之后的原始记录，返回解析条数。
+    full=True 时清空解析结果，从头开始。
+    """
+    conn = connect(path)
+    try:
+        with conn:
+            if full:
+                conn.execute("DELETE FROM tags")
+                conn.execute("DELETE FROM records")
+                set_meta(conn, "parsed_upto", 0)
+        upto = get_meta(conn, "parsed_upto", 0)
+        count = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, ts, raw_content FROM entries WHERE id > ? ORDER BY id LIMIT ?",
+                (upto, batch)).fetchall()
+            if not rows:
+                break
+            # 一批一个事务，中断后从 parsed_upto 继续
+            with conn:
+                for entry_id, ts, raw_content in rows:
+                    record = parser.parse_record(raw_content, ts)
+                    if record is not None:
+                        _write_record(conn, entry_id, record)
+                        count += 1
+                upto = rows[-1][0]
+                set_meta(conn, "parsed_upto", upto)
+        if count or full:
+            with conn:
+                set_meta(conn, "version", get_meta(conn, "version", 0) + 1)
+            # 更新统计信息，让查询规划器选对索引
+            conn.execute("PRAGMA optimize")
+        return count
+    finally:
+        conn.close()
+
+
+# === 迁移 ===
+
+def migrate(path=DB_FILE, inbox=None, parsed_file=None):
+    """
+    一次性把现有 JSONL 导入数据库：原始记录 (分段 + 收件箱，见 segments) 写入 entries，
+    parsed_file 里已有的解析结果按 (时间戳, 原文) 对应到原始记录写入 records / tags。
+    parsed_file 可以是规范化格式 (parsed_entries.jsonl) 或旧格式 (parsed_logs.jsonl)，
+    不给时优先用 parsed_entries.jsonl，没有再用 parsed_logs.jsonl。
+    数据库里已经有原始记录时拒绝执行，返回 (导入原始记录数, 导入解析结果数)。
+    """
+    import segments
+    from parser import LogRecord
+
+    conn = connect(path)
+    try:
+        if conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]:
+            raise RuntimeError(f"数据库已有数据，不再迁移: {path}")
+
+        ids = {}  # (时间戳, 原文) -> 这样的原始记录的 id 列表 (内容完全相同的记录可能有好几条)
+        n_entries = 0
+        with conn:
+            cur = conn.cursor()
+            for r in segments.iter_records(inbox=inbox or segments.INBOX_FILE):
+                ts, raw = r.get("timestamp"), r.get("raw_content")
+                if not ts or not raw:
+                    continue
+                cur.execute("INSERT INTO entries(ts, raw_content) VALUES (?, ?)", (ts, raw))
+                ids.setdefault((ts, raw), []).append(cur.lastrowid)
+                n_entries += 1
+
+        if parsed_file is None:
+            parsed_file = next((p for p in (PARSED_ENTRIES_FILE, PARSED_ROWS_FILE) if os.path.exists(p)), None)
+        # 规范化格式每条记录一行 (标签为列表)；旧格式每个 (类别, 领域) 组合一行，按 (时间戳, 原文) 聚合回一条记录
+        parsed = {}
+        if parsed_file and os.path.exists(parsed_file):
+            with open(parsed_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    key = (row.get("timestamp"), row.get("raw_content"))
+                    if key not in ids:
+                        continue
+                    rec = parsed.get(key)
+                    if rec is None:
+                        rec = parsed[key] = LogRecord(
+                            timestamp=key[0], raw_content=key[1], categories=[], action=row.get("action"),
+                            domains=[], reference=row.get("reference"), thoughts=row.get("thoughts"))
+                    for col, list_col, tags in (("category", "categories", rec.categories),
+                                                ("domain", "domains", rec.domains)):
+                        values = row.get(list_col) if list_col in row else [row.get(col)]
+                        for tag in values or ():
+                            if tag and tag not in tags:
+                                tags.append(tag)
+
+        with conn:
+            # 时间戳和原文都相同的记录解析结果也相同，每一条都写上
+            for key, rec in parsed.items():
+                for entry_id in ids[key]:
+                    _write_record(conn, entry_id, rec)
+            # 从第一条没有解析结果的原始记录开始，留给 process_logs 补上
+            done = {entry_id for k in parsed for entry_id in ids[k]}
+            upto = 0
+            for entry_id in sorted(i for same in ids.values() for i in same):
+                if entry_id not in done:
+                    break
+                upto = entry_id
+            set_meta(conn, "parsed_upto", upto)
+            set_meta(conn, "version", 1)
+        return n_entries, len(done)
+    finally:
+        conn.close()
+
+
+# === 查询 ===
+
+def _range_args(start: date, end: date):
+    """[start, end] (含首尾两天) -> (lo, hi)，hi 不含"""
+    return start.isoformat(), date.fromordinal(end.toordinal() + 1).isoformat()
+
+
+def date_bounds(path=DB_FILE):
+    """返回 (最早日期, 最晚日期)；没有数据时返回 None"""
+    conn = _connect_read(path)
+    try:
+        lo, hi = conn.execute("SELECT MIN(ts), MAX(ts) FROM records").fetchone()
+    finally:
+        conn.close()
+    if lo is None:
+        return None
+    return date.fromisoformat(lo[:10]), date.fromisoformat(hi[:10])
+
+
+def read_range(start: date = None, end: date = None, path=DB_FILE):
+    """
+    读取 [start, end] 的解析结果，不给日期时读取全部。
+    返回 (记录列表, {entry_id: {"category": [...], "domain": [...]}})，
+    记录为 (entry_id, ts, action, reference, thoughts, raw_content)，按时间排序。
+    """
+    where, args = "", ()
+    if start and end:
+        where, args = "WHERE r.ts >= ? AND r.ts < ?", _range_args(start, end)
+    conn = _connect_read(path)
+    try:
+        rows = conn.execute(
+            "SELECT r.entry_id, r.ts, r.action, r.reference, r.thoughts, e.raw_content "
+            f"FROM records r JOIN entries e ON e.id = r.entry_id {where} ORDER BY r.ts, r.entry_id",
+            args).fetchall()
+        tags = {}
+        where_t = where.replace("r.ts", "ts")
+        # rowid 顺序即写入顺序，保持每条记录里标签的原有顺序
+        for entry_id, kind, tag in conn.execute(
+                f"SELECT entry_id, kind, tag FROM tags {where_t} ORDER BY rowid", args):
+            tags.setdefault(entry_id, {}).setdefault(kind, []).append(tag)
+    finally:
+        conn.close()
+    return rows, tags
+
+
+def tag_counts(kind, start: date, end: date, path=DB_FILE):
+    """[start, end] 内某种标签的出现次数，返回 [(标签, 次数)]，按次数降序。kind 可以是 action"""
+    lo, hi = _range_args(start, end)
+    if kind == "action":
+        sql = ("SELECT action, COUNT(*) AS n FROM records WHERE ts >= ? AND ts < ? AND action IS NOT NULL "
+               "GROUP BY action ORDER BY n DESC")
+        args = (lo, hi)
+    else:
+        sql = "SELECT tag, COUNT(*) AS n FROM tags WHERE kind = ? AND ts >= ? AND ts < ? GROUP BY tag ORDER BY n DESC"
+        args = (kind, lo, hi)
+    conn = _connect_read(path)
+    try:
+        return conn.execute(sql, args).fetchall()
+    finally:
+        conn.close()
+
+
+def count_range(start: date, end: date, path=DB_FILE):
+    """[start, end] 内的 (记录数, 有记录的天数)"""
+    conn = _connect_read(path)
+    try:
+        return conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT substr(ts, 1, 10)) FROM records WHERE ts >= ? AND ts < ?",
+            _range_args(start, end)).fetchone()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="HappyFruit 的 SQLite 存储")
+    arg_parser.add_argument("--migrate", action="store_true",
+                            help="把现有的原始日志和解析结果导入数据库 (只能执行一次)")
+    arg_parser.add_argument("--parsed", metavar="JSONL",
+                            help="导入的解析结果 (parsed_entries.jsonl 或 parsed_logs.jsonl，默认优先前者)")
+    args = arg_parser.parse_args()
+
+    if args.migrate:
+        n_entries, n_parsed = migrate(parsed_file=args.parsed)
+        print(f"迁移完成：原始记录 {n_entries} 条，已有解析结果 {n_parsed} 条")
+        print(f"数据库: {DB_FILE}")
+        print("设置环境变量 HAPPYFRUIT_STORAGE=sqlite 后即可使用，剩余记录运行 process_logs 解析")
+    else:
+        arg_parser.print_help()
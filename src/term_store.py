@@ -0,0 +1,141 @@
+"""
+语法提示用的词库：每个 类别/动作/领域 记下使用次数和最后使用时间。
+
+    data/hints_terms.json      快照 {"gen": 3, "terms": {"categories": {"学习": [次数, 最后使用秒数]}, ...}}
+    data/hints_terms.journal   日志，第一行 {"gen": 3}，之后每用到一个词追加一行 ["categories", "学习", 秒数]
+
+提交一条记录只追加几行日志 (一次写入)，不再整个重写配置文件；启动时读快照再重放日志。
+日志超过 COMPACT_LINES 行时合并进快照 (先写 gen+1 的快照，再换新日志)：
+中途崩溃时旧日志的 gen 与快照对不上，不会被重复计数。
+
+词的顺序 (first_seen) 与第一次出现的顺序一致，vocab.py 的编号依赖这个顺序；
+提示面板用 ranked() 按使用次数、最近使用排序。
+"""
+import json
+import os
+import time
+
+KINDS = ("categories", "actions", "domains")
+
+# 日志攒到这么多行就合并进快照
+COMPACT_LINES = 1000
+
+
+class TermStore:
+    def __init__(self, snapshot_path, journal_path=None):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.gen = 0
+        # kind -> {term: [次数, 最后使用秒数]}，dict 保持第一次出现的顺序
+        self.terms = {kind: {} for kind in KINDS}
+        self.journal_lines = 0
+
+    def exists(self):
+        return os.path.exists(self.snapshot_path)
+
+    def load(self, readonly=False):
+        """
+        读快照，再重放同一代的日志，O(词数 + 日志行数)。
+        readonly=True 时只读不写 (不合并日志)，给 process_logs 等其它进程用，不与输入窗口抢着改写文件。
+        """
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.gen = data.get("gen", 0)
+            for kind in KINDS:
+                self.terms[kind] = {t: list(v) for t, v in data.get("terms", {}).get(kind, {}).items()}
+        except (OSError, ValueError):
+            pass
+
+        self.journal_lines = 0
+        torn = False
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+                if not isinstance(header, dict) or header.get("gen") != self.gen:
+                    return  # 已经合并进快照的旧日志
+                for line in f:
+                    try:
+                        kind, term, ts = json.loads(line)
+                        self._touch(kind, term, ts)
+                    except (ValueError, KeyError):
+                        # 写到一半的最后一行：合并一次，换个干净的日志继续追加
+                        torn = True
+                        continue
+                    self.journal_lines += 1
+        except (OSError, ValueError):
+            pass
+
+        if not readonly and (torn or self.journal_lines >= COMPACT_LINES):
+            self.compact()
+
+    def _touch(self, kind, term, ts):
+        stat = self.terms[kind].get(term)
+        if stat is None:
+            self.terms[kind][term] = [1, ts]
+        else:
+            stat[0] += 1
+            stat[1] = max(stat[1] or 0, ts)
+
+    def seed(self, kind, terms):
+        """登记已知的词 (次数为 0)，已有的词不变；之后需要 compact() 落盘"""
+        for term in terms:
+            self.terms[kind].setdefault(term, [0, None])
+
+    def record(self, used):
+        """
+        used 为 {kind: [词, ...]}，每个词计数 +1。
+        返回是否出现了新词。每次调用只追加一次日志。
+        """
+        ts = int(time.time())
+        lines = []
+        new_term = False
+        for kind, terms in used.items():
+            for term in terms:
+                if not term:
+                    continue
+                new_term = new_term or term not in self.terms[kind]
+                self._touch(kind, term, ts)
+                lines.append(json.dumps([kind, term, ts], ensure_ascii=False) + "\n")
+        if not lines:
+            return False
+
+        if not os.path.exists(self.journal_path):
+            self._new_journal()
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+        self.journal_lines += len(lines)
+        if self.journal_lines >= COMPACT_LINES:
+            self.compact()
+        return new_term
+
+    def compact(self):
+        """把日志合并进新的快照 (gen+1)，然后换一个空日志"""
+        self.gen += 1
+        os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"gen": self.gen, "terms": self.terms}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.snapshot_path)
+        self._new_journal()
+
+    def _new_journal(self):
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"gen": self.gen}) + "\n")
+        os.replace(tmp_path, self.journal_path)
+        self.journal_lines = 0
+
+    def first_seen(self, kind):
+        """按第一次出现的顺序"""
+        return list(self.terms[kind])
+
+    def ranked(self, kind):
+        """按使用次数、最近使用时间从高到低"""
+        items = self.terms[kind].items()
+        return [t for t, _ in sorted(items, key=lambda x: (x[1][0], x[1][1] or 0), reverse=True)]
+
+    def stats(self, kind, term):
+        """返回 (次数, 最后使用秒数)；没有这个词时返回 None"""
+        stat = self.terms[kind].get(term)
+        return tuple(stat) if stat else None
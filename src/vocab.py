@@ -0,0 +1,86 @@
+"""
+标签词表：给每个 类别/动作/领域 分配一个稳定的整数编号。
+
+编号只增不改 (新词追加在末尾)，所以已经写进列式存储的编号永远有效。
+初始顺序与语法提示词库 (ConfigManager，第一次出现的顺序) 一致，之后由 process_logs
+在解析时把遇到的新词补进来。统计大屏里标签以编号 / pandas Categorical 的形式
+参与计算，只在渲染时才换回字符串。
+"""
+import json
+import os
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "data")
+VOCAB_FILE = os.path.join(DATA_DIR, "vocab.json")
+
+# 与语法提示词库 (term_store) 中的键一致
+KINDS = ("categories", "actions", "domains")
+
+# DataFrame 列名 -> 词表种类
+KIND_OF_COLUMN = {"category": "categories", "action": "actions", "domain": "domains"}
+
+# 没有标签时使用的编号 (与 pandas Categorical 的缺失值编号一致)
+NO_CODE = -1
+
+
+class Vocabulary:
+    def __init__(self, path=VOCAB_FILE):
+        self.path = path
+        self.terms = {kind: [] for kind in KINDS}
+        self.index = {kind: {} for kind in KINDS}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        for kind in KINDS:
+            for term in data.get(kind, []):
+                self._add(kind, term)
+
+    def save(self):
+        """有新词时才写文件；先写临时文件再替换"""
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.terms, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def _add(self, kind, term):
+        code = len(self.terms[kind])
+        self.terms[kind].append(term)
+        self.index[kind][term] = code
+        return code
+
+    def code(self, kind, term):
+        """返回 term 的编号，新词自动追加；term 为空 (或 pandas 的缺失值) 时返回 NO_CODE"""
+        if not term or not isinstance(term, str):
+            return NO_CODE
+        code = self.index[kind].get(term)
+        if code is None:
+            code = self._add(kind, term)
+            self.dirty = True
+        return code
+
+    def codes(self, kind, terms):
+        return [self.code(kind, t) for t in terms if t and isinstance(t, str)]
+
+    def term(self, kind, code):
+        return self.terms[kind][code] if code >= 0 else None
+
+    def sizes(self):
+        return {kind: len(self.terms[kind]) for kind in KINDS}
+
+    def sync_from_config(self, config):
+        """把 ConfigManager 已知的词按原顺序登记进来 (已有的不变)"""
+        for kind in KINDS:
+            for term in config.get(kind, []):
+                self.code(kind, term)
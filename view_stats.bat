@@ -3,7 +3,7 @@ echo [1/3] Activating Virtual Environment...
 call .venv\Scripts\activate
 
 echo [2/3] Processing Logs (Updating Data)...
-.venv\Scripts\python.exe src\process_logs.py
+.venv\Scripts\python.exe src\process_logs.py --format normalized --columnar --rollups --search
 
 echo [3/3] Launching Streamlit Dashboard...
 .venv\Scripts\python.exe -m streamlit run src\app_stats.py